@@ -0,0 +1,98 @@
+import featureflow as ff
+import argparse
+import timeit
+
+
+class Chunks(ff.Node):
+    """
+    Emit many small chunks of bytes
+    """
+    def __init__(self, chunksize=8, needs=None):
+        super(Chunks, self).__init__(needs=needs)
+        self._chunksize = chunksize
+
+    def _process(self, data):
+        for i in range(0, len(data), self._chunksize):
+            yield data[i: i + self._chunksize]
+
+
+class PassThrough(ff.Node):
+    """
+    Do (almost) nothing, so that scheduling overhead dominates
+    """
+    def __init__(self, needs=None):
+        super(PassThrough, self).__init__(needs=needs)
+
+
+class Length(ff.Aggregator, ff.Node):
+    """
+    Count the total number of bytes seen
+    """
+    def __init__(self, needs=None):
+        super(Length, self).__init__(needs=needs)
+        self._cache = 0
+
+    def _enqueue(self, data, pusher):
+        self._cache += len(data)
+
+
+def build_graph(depth, branches):
+    g = ff.Graph()
+    g['raw'] = Chunks()
+    for b in range(branches):
+        previous = g['raw']
+        for d in range(depth):
+            key = 'pass_{b}_{d}'.format(**locals())
+            g[key] = PassThrough(needs=previous)
+            previous = g[key]
+        g['length_{b}'.format(**locals())] = Length(needs=previous)
+    return g
+
+
+def run(compiled, data, depth, branches, threads=None):
+    graph = build_graph(depth, branches)
+    if compiled:
+        graph = graph.compile(threads=threads)
+    graph.process(raw=data)
+
+
+example = '''example:
+
+python graph_benchmark.py --size 100000 --depth 8 --branches 2
+'''
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        epilog=example, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '--size', help='bytes of input', type=int, default=100000)
+    parser.add_argument(
+        '--depth', help='nodes per branch', type=int, default=8)
+    parser.add_argument(
+        '--branches', help='branches hanging off the root', type=int,
+        default=2)
+    parser.add_argument(
+        '--threads', help='also time a ThreadedGraph with this many threads',
+        type=int, default=None)
+    parser.add_argument(
+        '--repeat', help='number of runs to time', type=int, default=5)
+    args = parser.parse_args()
+
+    data = b'x' * args.size
+
+    for compiled in (False, True):
+        seconds = min(timeit.repeat(
+            lambda: run(compiled, data, args.depth, args.branches),
+            number=1,
+            repeat=args.repeat))
+        print('{name}: {seconds:.4f} seconds'.format(
+            name='CompiledGraph.process' if compiled else 'Graph.process',
+            seconds=seconds))
+
+    if args.threads:
+        seconds = min(timeit.repeat(
+            lambda: run(True, data, args.depth, args.branches, args.threads),
+            number=1,
+            repeat=args.repeat))
+        print('ThreadedGraph.process: {seconds:.4f} seconds'.format(
+            seconds=seconds))
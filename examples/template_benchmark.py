@@ -0,0 +1,61 @@
+import featureflow as ff
+import argparse
+import timeit
+
+
+class PassThrough(ff.Node):
+    """
+    Do (almost) nothing
+    """
+    def __init__(self, needs=None):
+        super(PassThrough, self).__init__(needs=needs)
+
+
+def build_model(features):
+    attrs = dict(raw=ff.Feature(PassThrough, store=True))
+    previous = attrs['raw']
+    for i in range(features):
+        f = ff.Feature(PassThrough, needs=previous, store=i % 2 == 0)
+        attrs['feature_{i}'.format(**locals())] = f
+        previous = f
+
+    settings = ff.PersistenceSettings.clone(
+        database=ff.InMemoryDatabase(key_builder=ff.StringDelimitedKeyBuilder()))
+    return type('Document', (ff.BaseModel, settings), attrs)
+
+
+def build_from_scratch(model):
+    graph = model._build_extractor('id')
+    graph.remove_dead_nodes(model.features.values())
+    return graph
+
+
+def build_from_template(model):
+    return model.graph_template().build('id')
+
+
+example = '''example:
+
+python template_benchmark.py --features 32
+'''
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        epilog=example, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '--features', help='features in the model', type=int, default=32)
+    parser.add_argument(
+        '--number', help='graphs to build per run', type=int, default=100)
+    parser.add_argument(
+        '--repeat', help='number of runs to time', type=int, default=5)
+    args = parser.parse_args()
+
+    model = build_model(args.features)
+
+    for name, build in [
+            ('BaseModel._build_extractor', build_from_scratch),
+            ('GraphTemplate.build', build_from_template)]:
+        seconds = min(timeit.repeat(
+            lambda: build(model), number=args.number, repeat=args.repeat))
+        print('{name}: {ms:.4f} ms per document'.format(
+            name=name, ms=seconds / args.number * 1000))
@@ -6,25 +6,29 @@ import re
 import hashlib
 
 
-class Tokenizer(ff.Node):
+class Tokenizer(ff.BufferedNode):
     """
     Tokenize a stream of text into individual, normalized (lowercase)
     words/tokens
     """
+    buffer_class = ff.TextBuffer
+
     def __init__(self, needs=None):
         super(Tokenizer, self).__init__(needs=needs)
-        self._cache = ''
         self._pattern = re.compile('(?P<word>[a-zA-Z]+)\W+')
-
-    def _enqueue(self, data, pusher):
-        self._cache += data.decode()
-
-    def _dequeue(self):
-        matches = list(self._pattern.finditer(self._cache))
-        if not matches:
+        self._searched = 0
+
+    def _take(self, buf):
+        # words are only complete once they're followed by whitespace.  Only
+        # text appended since the last search is searched for it, so the
+        # buffer is never re-joined just to find out there's nothing to do
+        end = max(
+            buf.rfind(' ', self._searched), buf.rfind('\n', self._searched))
+        if end == -1:
+            self._searched = len(buf)
             raise ff.NotEnoughData()
-        last_boundary = matches[-1].end()
-        self._cache = self._cache[last_boundary:]
+        matches = list(self._pattern.finditer(buf.consume(end + 1)))
+        self._searched = len(buf)
         return matches
 
     def _process(self, data):
@@ -1,18 +1,20 @@
 __version__ = '3.0.3'
 
-from .model import BaseModel, ModelExistsError
+from .model import BaseModel, ModelExistsError, ProcessResult
 
 from .feature import Feature, JSONFeature, TextFeature, CompressedFeature, \
-    PickleFeature, ClobberPickleFeature, ClobberJSONFeature
+    PickleFeature, ClobberPickleFeature, ClobberJSONFeature, ComputePlan
 
-from .extractor import Node, Graph, Aggregator, NotEnoughData
+from .extractor import Node, Graph, CompiledGraph, ThreadedGraph, BoundedGraph, \
+    Aggregator, SpillingAggregator, Batching, Unbatch, NotEnoughData, \
+    GraphStats, NodeStats
 
 from .bytestream import ByteStream, ByteStreamFeature, ZipWrapper, iter_zip
 
 from .data import \
     IdProvider, UuidProvider, UserSpecifiedIdProvider, StaticIdProvider, \
     KeyBuilder, StringDelimitedKeyBuilder, Database, FileSystemDatabase, \
-    InMemoryDatabase
+    InMemoryDatabase, WriteBatch
 
 from .datawriter import DataWriter
 
@@ -32,10 +34,19 @@ from .iteratornode import IteratorNode
 
 from .eventlog import EventLog, RedisChannel, InMemoryChannel
 
+from .trace import TraceRecorder
+
+from .cache import FeatureCache
+
+from .buffers import ByteBuffer, TextBuffer, BufferedNode
+
+from .template import GraphTemplate
+
 from .var import Var
 
 try:
     from .nmpy import NumpyEncoder, PackedNumpyEncoder, StreamingNumpyDecoder, \
-        BaseNumpyDecoder, NumpyMetaData, NumpyFeature
+        BaseNumpyDecoder, NumpyMetaData, NumpyFeature, ArrayBuffer, \
+        WindowedNode
 except ImportError:
     pass
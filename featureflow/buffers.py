@@ -0,0 +1,247 @@
+import codecs
+from .extractor import Node, NotEnoughData
+
+
+class ByteBuffer(object):
+    """
+    A growable buffer of bytes.  Appending is amortized constant time per
+    byte, and consuming a prefix of the buffer does not copy the bytes that
+    remain, so nodes that accumulate a stream chunk-by-chunk don't do
+    quadratic work on long streams
+    """
+
+    def __init__(self, data=b''):
+        super(ByteBuffer, self).__init__()
+        # bytearray over-allocates on append, and deleting a prefix only
+        # advances its internal start offset
+        self._buf = bytearray(data)
+
+    def __len__(self):
+        return len(self._buf)
+
+    def append(self, data):
+        self._buf.extend(data)
+
+    def find(self, sub, start=0):
+        return self._buf.find(sub, start)
+
+    def rfind(self, sub, start=0):
+        return self._buf.rfind(sub, start)
+
+    def view(self):
+        """
+        Return a zero-copy view of the buffered bytes.  The view must be
+        released before the buffer is appended to or consumed
+        """
+        return memoryview(self._buf)
+
+    def consume(self, n=None):
+        """
+        Remove and return (as bytes) the first n bytes of the buffer, or all
+        of them if n is not specified
+        """
+        n = len(self._buf) if n is None else n
+        data = bytes(self._buf[:n])
+        del self._buf[:n]
+        return data
+
+    def close(self):
+        pass
+
+    def clear(self):
+        del self._buf[:]
+
+
+class TextBuffer(object):
+    """
+    A growable buffer of text.  Appended chunks are kept as separate pieces,
+    which `find()` and `rfind()` search in place, so they're only joined once
+    they're consumed, or the buffer's `value` is read.  Consuming a prefix
+    just advances an offset into the joined text, which is compacted lazily.
+    Bytes are decoded incrementally, so a multi-byte character split across
+    two chunks is decoded correctly
+    """
+
+    def __init__(self, text='', encoding='utf-8', errors='strict'):
+        super(TextBuffer, self).__init__()
+        # the buffer starts at self._start, within self._text, and continues
+        # with any pieces that haven't been joined yet
+        self._text = text
+        self._start = 0
+        self._pieces = []
+        self._length = len(text)
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+
+    def __len__(self):
+        return self._length
+
+    def append(self, data):
+        if not isinstance(data, str):
+            data = self._decoder.decode(data)
+        if not data:
+            return
+        self._pieces.append(data)
+        self._length += len(data)
+
+    def close(self):
+        """
+        Decode any bytes held back as the start of an incomplete character,
+        which raises for a truncated character, unless `errors` says otherwise
+        """
+        self.append(self._decoder.decode(b'', final=True))
+
+    def _parts(self, start):
+        """
+        Return (index, text, lo) for the joined text, and each piece, that
+        extend past `start`, where `index` is the buffer index of `text[0]`,
+        and `lo` is the index within `text` to search from
+        """
+        parts = []
+        index = -self._start
+        for text in [self._text] + self._pieces:
+            if index + len(text) > start:
+                parts.append((index, text, max(0, start - index)))
+            index += len(text)
+        return parts
+
+    @staticmethod
+    def _tail(parts, n):
+        """
+        Return the buffer index and text of the last n characters (or fewer)
+        of the parts
+        """
+        tail = ''
+        for index, text, lo in reversed(parts):
+            tail = text[max(lo, len(text) - (n - len(tail))):] + tail
+            if len(tail) >= n:
+                break
+        index, text, _ = parts[-1]
+        return index + len(text) - len(tail), tail
+
+    def find(self, sub, start=0):
+        """
+        Return the lowest index of sub in the buffer, at or after `start`, or
+        -1 if it isn't found.  Nothing is joined or copied to search, so a
+        node searching a growing buffer from where its last search ended
+        only does work proportional to the text appended since
+        """
+        parts = self._parts(start)
+        for i, (index, text, lo) in enumerate(parts):
+            if i and len(sub) > 1:
+                # matches straddling the previous part
+                tail_index, tail = self._tail(parts[:i], len(sub) - 1)
+                found = (tail + text[:len(sub) - 1]).find(sub)
+                if -1 < found < len(tail):
+                    return tail_index + found
+            found = text.find(sub, lo)
+            if found != -1:
+                return index + found
+        return -1
+
+    def rfind(self, sub, start=0):
+        """
+        Return the highest index of sub in the buffer, at or after `start`,
+        or -1 if it isn't found.  See `find()`
+        """
+        parts = self._parts(start)
+        for i in range(len(parts) - 1, -1, -1):
+            index, text, lo = parts[i]
+            found = text.rfind(sub, lo)
+            if found != -1:
+                return index + found
+            if i and len(sub) > 1:
+                # matches straddling the previous part
+                tail_index, tail = self._tail(parts[:i], len(sub) - 1)
+                found = (tail + text[:len(sub) - 1]).rfind(sub)
+                if found != -1:
+                    return tail_index + found
+        return -1
+
+    def _join(self, n):
+        """
+        Join just enough pieces onto the text that its first n buffered
+        characters are contiguous
+        """
+        count = 0
+        available = len(self._text) - self._start
+        while available < n:
+            available += len(self._pieces[count])
+            count += 1
+        if not count:
+            return
+
+        text = self._text
+        if self._start > len(text) // 2:
+            # the consumed prefix is more than half of the text, so drop it
+            text = text[self._start:]
+            self._start = 0
+        self._text = ''.join([text] + self._pieces[:count])
+        del self._pieces[:count]
+
+    @property
+    def value(self):
+        """
+        The buffered text, as a single string
+        """
+        self._join(self._length)
+        if self._start:
+            self._text = self._text[self._start:]
+            self._start = 0
+        return self._text
+
+    def consume(self, n=None):
+        """
+        Remove and return the first n characters of the buffer, or all of them
+        if n is not specified
+        """
+        n = self._length if n is None else min(n, self._length)
+        self._join(n)
+        data = self._text[self._start: self._start + n]
+        self._start += n
+        self._length -= n
+        if self._start == len(self._text):
+            self._text = ''
+            self._start = 0
+        return data
+
+    def clear(self):
+        self._text = ''
+        self._start = 0
+        self._pieces = []
+        self._length = 0
+        self._decoder.reset()
+
+
+class BufferedNode(Node):
+    """
+    A base class for stateful nodes that accumulate incoming chunks in a
+    growable buffer, rather than concatenating them onto `_cache`.  Subclasses
+    choose the buffer via `buffer_class`, and override `_take()` to consume
+    as much of the buffer as they're ready to process, raising
+    `NotEnoughData` if there isn't enough yet
+    """
+
+    buffer_class = ByteBuffer
+
+    def __init__(self, needs=None):
+        super(BufferedNode, self).__init__(needs=needs)
+        self._cache = self._buffer()
+
+    def _buffer(self):
+        return self.buffer_class()
+
+    def _enqueue(self, data, pusher):
+        self._cache.append(data)
+
+    def _finalize(self, pusher):
+        # nothing more will be appended, so e.g. text buffers can decode any
+        # bytes they've held back
+        self._cache.close()
+
+    def _dequeue(self):
+        if not len(self._cache):
+            raise NotEnoughData()
+        return self._take(self._cache)
+
+    def _take(self, buf):
+        return buf.consume()
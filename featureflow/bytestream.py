@@ -1,22 +1,158 @@
 from .extractor import Node
 from .decoder import Decoder
 from .feature import Feature
-from .util import chunked
+from .util import chunked, chunked_into, read_ahead
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from threading import Lock
+from http.cookiejar import DefaultCookiePolicy
 import os
+import mmap
 import struct
 import zipfile
 
 
+class HttpSessionPool(object):
+    """
+    A pool of keep-alive HTTP connections, shared by all the `ByteStream` nodes
+    that use it, so that documents fetched from the same hosts don't each pay
+    for TCP and TLS setup.
+
+    Each process gets its own `requests.Session`, so a pool can safely be
+    shared with worker processes, e.g. by `BaseModel.process_many`.
+
+    Args:
+        pool_connections (int): The number of hosts for which connections are
+            kept
+        pool_maxsize (int): The maximum number of connections kept per host.
+            This should be at least as large as the `connections` argument of
+            any `ByteStream` performing ranged downloads
+        max_retries (int): The number of times failed connections are retried
+        keep_alive (bool): When False, connections are closed after each
+            request
+    """
+
+    def __init__(
+            self,
+            pool_connections=10,
+            pool_maxsize=10,
+            max_retries=0,
+            keep_alive=True):
+
+        super(HttpSessionPool, self).__init__()
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.keep_alive = keep_alive
+        self._sessions = dict()
+        self._lock = Lock()
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=self.max_retries)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        # documents shouldn't affect one another, so cookies set by responses
+        # aren't kept
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        return session
+
+    @property
+    def session(self):
+        pid = os.getpid()
+        try:
+            return self._sessions[pid]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if pid not in self._sessions:
+                # sessions inherited from a parent process are never used
+                self._sessions = {pid: self._build_session()}
+            return self._sessions[pid]
+
+    def close(self):
+        with self._lock:
+            session = self._sessions.pop(os.getpid(), None)
+        if session is not None:
+            session.close()
+
+
 class ByteStream(Node):
-    def __init__(self, chunksize=4096, needs=None):
+    # the connection pool used by ByteStream instances that aren't given
+    # their own
+    session_pool = HttpSessionPool()
+
+    def __init__(
+            self,
+            chunksize=4096,
+            zero_copy=False,
+            read_ahead=0,
+            memory_map=False,
+            connections=1,
+            range_size=1024 * 1024,
+            session_pool=None,
+            needs=None):
+        """
+        Args:
+            chunksize (int): The size of each chunk of bytes produced
+            zero_copy (bool): When True, and the underlying stream supports
+                `readinto()`, chunks are read directly into newly allocated
+                `BufferWithTotalLength` instances (mutable `bytearray`s),
+                rather than being read into, and then copied out of, `bytes`
+                objects
+            read_ahead (int): When greater than zero, chunks are read by a
+                background thread, up to this many chunks ahead of the graph,
+                so that I/O overlaps with downstream processing
+            memory_map (bool): When True, local files are memory-mapped, and
+                chunks are read-only `memoryview` slices of the mapped file,
+                rather than `bytes`, so no copies or read system calls are
+                made per chunk.  Use `total_length()` to get the length of the
+                whole file from such a chunk
+            connections (int): When greater than one, and an HTTP server
+                advertises support for byte range requests, a GET is split
+                into ranges of `range_size` bytes, which are fetched over this
+                many concurrent connections, and reassembled in order
+            range_size (int): The size, in bytes, of each range fetched when
+                `connections` is greater than one
+            session_pool (HttpSessionPool): The pool of HTTP connections to
+                use.  Defaults to `ByteStream.session_pool`, which is shared
+                by all instances
+            needs (Node): Processing nodes on which this one depends
+        """
         super(ByteStream, self).__init__(needs=needs)
         self._chunksize = int(chunksize)
+        self._zero_copy = zero_copy
+        self._read_ahead = read_ahead
+        self._memory_map = memory_map
+        self._connections = connections
+        self._range_size = int(range_size)
+        self._session_pool = session_pool
+
+    def _session(self):
+        return (self._session_pool or ByteStream.session_pool).session
 
     def _generator(self, stream, content_length):
         if not content_length:
             raise ValueError('content_length should be greater than zero')
+
+        if self._zero_copy and hasattr(stream, 'readinto'):
+            chunks = chunked_into(
+                stream,
+                chunksize=self._chunksize,
+                allocate=lambda n: BufferWithTotalLength(n, content_length))
+            for chunk in chunks:
+                yield chunk
+            return
+
         for chunk in chunked(stream, chunksize=self._chunksize):
             yield BytesWithTotalLength(chunk, content_length)
 
@@ -28,17 +164,90 @@ class ByteStream(Node):
     def _handle_simple_get(self, data):
         parsed = urlparse(data)
         if parsed.scheme and parsed.netloc:
-            resp = requests.get(data, stream=True)
+            if self._connections > 1:
+                return self._handle_ranged_get(requests.Request('GET', data))
+            resp = self._session().get(data, stream=True)
             return self._from_http_response(resp)
         else:
             raise ValueError
 
     def _handle_http_request(self, data):
-        s = requests.Session()
-        prepped = data.prepare()
+        if self._connections > 1 and (data.method or '').upper() == 'GET':
+            return self._handle_ranged_get(data)
+        s = self._session()
+        prepped = s.prepare_request(data)
         resp = s.send(prepped, stream=True)
         return self._from_http_response(resp)
 
+    def _handle_ranged_get(self, request):
+        session = self._session()
+        prepped = session.prepare_request(request)
+
+        # lengths and ranges must refer to the bytes as stored, rather than
+        # to a compressed encoding of them
+        head = prepped.copy()
+        head.method = 'HEAD'
+        head.headers['Accept-Encoding'] = 'identity'
+        resp = session.send(head, allow_redirects=True)
+        accepts_ranges = resp.headers.get('Accept-Ranges', '') == 'bytes'
+        content_length = int(resp.headers.get('Content-Length', 0))
+
+        if not (resp.ok and accepts_ranges and content_length):
+            # fall back to a single, streaming request.  Some servers, e.g.
+            # those issuing pre-signed URLs, refuse HEAD requests outright
+            resp = session.send(prepped, stream=True)
+            return self._from_http_response(resp)
+
+        return self._ranged_generator(session, prepped, content_length)
+
+    def _fetch_range(self, session, prepped, start, stop):
+        ranged = prepped.copy()
+        ranged.headers['Range'] = 'bytes={start}-{stop}'.format(**locals())
+        ranged.headers['Accept-Encoding'] = 'identity'
+        resp = session.send(ranged)
+        resp.raise_for_status()
+        if resp.status_code != 206 or len(resp.content) != stop - start + 1:
+            raise ValueError(
+                'The server did not honor the range request for bytes '
+                '{start}-{stop}'.format(**locals()))
+        return resp.content
+
+    def _ranged_generator(self, session, prepped, content_length):
+        ranges = deque(
+            (start, min(start + self._range_size, content_length) - 1)
+            for start in range(0, content_length, self._range_size))
+
+        # ranges may complete out of order, so bound the number that are
+        # either in flight, or waiting to be yielded
+        max_pending = 2 * self._connections
+        pending = deque()
+        remainder = b''
+        chunksize = self._chunksize
+
+        with ThreadPoolExecutor(self._connections) as pool:
+            try:
+                while ranges or pending:
+                    while ranges and len(pending) < max_pending:
+                        start, stop = ranges.popleft()
+                        pending.append(pool.submit(
+                            self._fetch_range, session, prepped, start, stop))
+
+                    # yield chunks of exactly chunksize bytes, carrying any
+                    # remainder over into the next range
+                    data = remainder + pending.popleft().result()
+                    view = memoryview(data)
+                    usable = len(data) - (len(data) % chunksize)
+                    for i in range(0, usable, chunksize):
+                        yield BytesWithTotalLength(
+                            view[i: i + chunksize], content_length)
+                    remainder = data[usable:]
+
+                if remainder:
+                    yield BytesWithTotalLength(remainder, content_length)
+            finally:
+                for future in pending:
+                    future.cancel()
+
     def _handle_file_like_object(self, data):
         content_length = data.seek(0, 2)
         data.seek(0)
@@ -53,6 +262,26 @@ class ByteStream(Node):
             for chunk in self._generator(f, content_length):
                 yield chunk
 
+    def _handle_mapped_file(self, data):
+        content_length = int(os.path.getsize(data))
+        if not content_length:
+            raise ValueError('content_length should be greater than zero')
+
+        with open(data, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        except AttributeError:
+            # madvise isn't available on this platform
+            pass
+
+        # the mapping is closed once it's been garbage collected, i.e., once
+        # no chunks remain in use
+        view = memoryview(mapped)
+        for i in range(0, content_length, self._chunksize):
+            yield view[i: i + self._chunksize]
+
     def _get_strategy(self, data):
         if isinstance(data, ZipWrapper):
             return self._handle_zip_file
@@ -61,7 +290,11 @@ class ByteStream(Node):
         if isinstance(data, str):
             parsed = urlparse(data)
             is_url = parsed.netloc and parsed.scheme
-            return self._handle_simple_get if is_url else self._handle_file
+            if is_url:
+                return self._handle_simple_get
+            if self._memory_map:
+                return self._handle_mapped_file
+            return self._handle_file
         return self._handle_file_like_object
 
     def _process(self, data):
@@ -70,7 +303,10 @@ class ByteStream(Node):
         except AttributeError:
             pass
         strategy = self._get_strategy(data)
-        for chunk in strategy(data):
+        chunks = strategy(data)
+        if self._read_ahead:
+            chunks = read_ahead(chunks, depth=self._read_ahead)
+        for chunk in chunks:
             yield chunk
 
 
@@ -114,6 +350,30 @@ class BytesWithTotalLength(bytes):
         return BytesWithTotalLength(other + bytes(self), self.total_length)
 
 
+class BufferWithTotalLength(bytearray):
+    """
+    A mutable chunk of bytes, along with the total length of the stream it was
+    read from.  Unlike `BytesWithTotalLength`, it can be filled in place, and
+    viewed with `memoryview` without copying
+    """
+
+    def __init__(self, source, total_length):
+        super(BufferWithTotalLength, self).__init__(source)
+        self.total_length = int(total_length)
+
+
+def total_length(chunk):
+    """
+    Return the total length of the stream a chunk produced by `ByteStream` was
+    read from
+    """
+    try:
+        return chunk.total_length
+    except AttributeError:
+        # the chunk is a memoryview slice of a memory-mapped file
+        return len(chunk.obj)
+
+
 class BytesWithTotalLengthEncoder(Node):
     content_type = 'application/octet-stream'
 
@@ -123,7 +383,7 @@ class BytesWithTotalLengthEncoder(Node):
 
     def _process(self, data):
         if not self._metadata_written:
-            yield struct.pack('I', data.total_length)
+            yield struct.pack('I', total_length(data))
             self._metadata_written = True
         yield data
 
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+from threading import Lock
+import sys
+
+
+def sizeof(value, _seen=None):
+    """
+    Estimate the size of a decoded feature value in bytes.  The contents of
+    containers, e.g., the dicts and lists decoded by `JSONFeature`, and the
+    attributes of objects, e.g., those decoded by `PickleFeature`, are
+    counted too, and objects reachable more than once are only counted once
+    """
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+
+    _seen = set() if _seen is None else _seen
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    try:
+        return value.nbytes
+    except AttributeError:
+        pass
+
+    size = sys.getsizeof(value)
+
+    if isinstance(value, dict):
+        size += sum(
+            sizeof(k, _seen) + sizeof(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sizeof(v, _seen) for v in value)
+
+    try:
+        size += sizeof(vars(value), _seen)
+    except TypeError:
+        # the value has no __dict__
+        pass
+
+    return size
+
+
+class FeatureCache(object):
+    """
+    A process-wide, least-recently-used cache of decoded feature values, keyed
+    by `(_id, feature key, version, database)`.  Values are evicted,
+    least-recently-used first, once their total size exceeds `max_bytes`.
+
+    Only values that can safely be read more than once are cached, so streams
+    and iterators produced by lazy decoders are never cached.
+
+    Install a cache for a model by setting the `feature_cache` attribute of its
+    `PersistenceSettings`
+    """
+
+    def __init__(self, max_bytes=100 * 1024 * 1024, sizeof=sizeof):
+        super(FeatureCache, self).__init__()
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._values = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __getitem__(self, key):
+        with self._lock:
+            try:
+                value, _ = self._values[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self._values.move_to_end(key)
+            self.hits += 1
+            return value
+
+    @staticmethod
+    def cacheable(value):
+        return not (hasattr(value, 'read') or hasattr(value, '__next__'))
+
+    def add(self, key, value):
+        """
+        Cache a value, returning true if it was cached.  Values that can't be
+        read more than once, or that are larger than the cache, are not
+        """
+        if not self.cacheable(value):
+            return False
+
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            self._remove(key)
+            self._values[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._values.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+        return True
+
+    def _remove(self, key):
+        try:
+            _, size = self._values.pop(key)
+            self.size -= size
+        except KeyError:
+            pass
+
+    def invalidate(self, _id):
+        """
+        Discard all cached values for a single document
+        """
+        with self._lock:
+            for key in [k for k in self._values if k[0] == _id]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self.size = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
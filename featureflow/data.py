@@ -1,5 +1,6 @@
 from io import StringIO, BytesIO
 from uuid import uuid4
+from contextlib import closing
 import os
 
 
@@ -74,11 +75,49 @@ class StringDelimitedKeyBuilder(KeyBuilder):
         return composed.split(self._seperator)
 
 
+class WriteBatch(object):
+    """
+    Groups writes to a database, so that they can be committed together when
+    the batch exits.  Everything other than writing and deleting keys is
+    passed through to the database.  This base implementation doesn't group
+    anything; writes go straight to the database
+    """
+
+    def __init__(self, database):
+        super(WriteBatch, self).__init__()
+        self.database = database
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, value, traceback):
+        self.commit()
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    def write_stream(self, key, content_type):
+        return self.database.write_stream(key, content_type)
+
+    def __contains__(self, key):
+        return key in self.database
+
+    def __delitem__(self, key):
+        del self.database[key]
+
+    def commit(self):
+        pass
+
+
 class Database(object):
     """
     Marker class for a datastore
     """
 
+    # False for databases that live in a single process's memory, so that
+    # writes made by other processes, e.g., forked workers, are never seen
+    shared_across_processes = True
+
     def __init__(self, key_builder=None):
         super(Database, self).__init__()
         self.key_builder = key_builder
@@ -93,6 +132,14 @@ class Database(object):
     def read_stream(self, key):
         raise NotImplementedError()
 
+    def read_view(self, key):
+        """
+        Return a context manager over a read stream that's only valid until
+        the context exits, so that databases able to do so can expose the
+        stored value without copying it
+        """
+        return closing(self.read_stream(key))
+
     def random(self):
         """
         Return the read stream of a random key
@@ -114,6 +161,27 @@ class Database(object):
     def __delitem__(self, key):
         raise NotImplementedError()
 
+    def batch(self):
+        """
+        Return a `WriteBatch` that groups writes to this database
+        """
+        return WriteBatch(self)
+
+    def after_commit(self, callback):
+        """
+        Call `callback` once everything written so far is visible to readers.
+        Writes to a plain database are visible as soon as their stream is
+        closed, so it's called right away
+        """
+        callback()
+
+    def reopen(self):
+        """
+        Re-acquire any handles that can't safely be shared with a parent
+        process, e.g., after a fork
+        """
+        pass
+
 
 class IOWithLength(BytesIO):
     def __init__(self, content):
@@ -125,6 +193,8 @@ class IOWithLength(BytesIO):
 
 
 class InMemoryDatabase(Database):
+    shared_across_processes = False
+
     def __init__(self, key_builder=None):
         super(InMemoryDatabase, self).__init__(key_builder=key_builder)
         self._dict = dict()
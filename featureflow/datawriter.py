@@ -1,6 +1,7 @@
 from io import StringIO, BytesIO
 from .extractor import Node
 import json
+import inspect
 
 
 class BaseDataWriter(Node):
@@ -43,7 +44,7 @@ class DataWriter(BaseDataWriter):
 
     def _close_stream(self):
         try:
-            self._stream.close()
+            return self._stream.close()
         except (IOError, ValueError):
             pass
 
@@ -57,12 +58,14 @@ class DataWriter(BaseDataWriter):
         if self.event_log is None:
             return
 
-        self.event_log.append(
-            json.dumps({
-                '_id': self._id,
-                'name': self.feature_name,
-                'version': self.feature_version
-            }))
+        event = json.dumps({
+            '_id': self._id,
+            'name': self.feature_name,
+            'version': self.feature_version
+        })
+        # subscribers may read the feature as soon as they hear about it, so
+        # the event must wait until the feature has been committed
+        self.database.after_commit(lambda: self.event_log.append(event))
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self._close_stream()
@@ -71,6 +74,17 @@ class DataWriter(BaseDataWriter):
             return
         self._log_events()
 
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        # streams from asynchronous databases may need to be awaited while
+        # closing
+        closed = self._close_stream()
+        if inspect.isawaitable(closed):
+            await closed
+        if exc_type:
+            self._cleanup_after_error()
+            return
+        self._log_events()
+
     def _process(self, data):
         try:
             data = data.encode()
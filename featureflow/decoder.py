@@ -8,9 +8,15 @@ from io import StringIO
 
 class Decoder(object):
     """
-    The simplest possible decoder takes a file-like object and returns it
+    The simplest possible decoder takes a file-like object and returns it.
+
+    Decoders that copy everything they return out of the stream set `copies`,
+    so that they can be handed a view of the stored value that's only valid
+    until they return
     """
 
+    copies = False
+
     def __init__(self):
         super(Decoder, self).__init__()
 
@@ -39,6 +45,8 @@ class GreedyDecoder(Decoder):
     A decoder that reads the entire file contents into memory
     """
 
+    copies = True
+
     def __init__(self):
         super(GreedyDecoder, self).__init__()
 
@@ -50,6 +58,8 @@ class GreedyDecoder(Decoder):
 
 
 class GreedyTextDecoder(TextDecoder):
+    copies = True
+
     def __init__(self):
         super().__init__()
 
@@ -1,22 +1,82 @@
 import http.server
+import gzip
+import re
 import sys
 
 
-def handler_class(static_content):
+def handler_class(
+        static_content, accept_ranges=False, allow_head=True, gzip_ok=False):
     class DummyHandler(http.server.BaseHTTPRequestHandler):
-        def do_GET(self):
+        def _range(self):
+            try:
+                match = re.match(r'bytes=(\d+)-(\d+)', self.headers['Range'])
+            except TypeError:
+                return None
+            return int(match.group(1)), int(match.group(2))
+
+        def _gzip(self):
+            return gzip_ok and \
+                'gzip' in self.headers.get('Accept-Encoding', '')
+
+        def _entity(self):
+            # like servers that store pre-compressed content, ranges apply to
+            # the compressed bytes
+            if self._gzip():
+                return gzip.compress(static_content.encode(), mtime=0)
+            return static_content.encode()
+
+        def _send_encoding(self):
+            if self._gzip():
+                self.send_header('Content-Encoding', 'gzip')
+
+        def do_HEAD(self):
+            if not allow_head:
+                self.send_response(403)
+                self.send_header('Content-Length', 0)
+                self.end_headers()
+                return
+
             self.send_response(200)
-            self.send_header('Content-Length', len(static_content))
+            self._send_encoding()
+            self.send_header('Content-Length', len(self._entity()))
+            self.send_header('Content-Type', 'text/plain')
+            if accept_ranges:
+                self.send_header('Accept-Ranges', 'bytes')
+            self.end_headers()
+
+        def do_GET(self):
+            requested = self._range() if accept_ranges else None
+            if requested is None:
+                self.send_response(200)
+                self.send_header('Content-Length', len(static_content))
+                self.send_header('Content-Type', 'text/plain')
+                self.end_headers()
+                self.wfile.write(content.encode())
+                return
+
+            start, stop = requested
+            body = self._entity()[start: stop + 1]
+            self.send_response(206)
+            self._send_encoding()
+            self.send_header('Content-Length', len(body))
             self.send_header('Content-Type', 'text/plain')
+            self.send_header(
+                'Content-Range',
+                'bytes {0}-{1}/{2}'.format(start, stop, len(static_content)))
             self.end_headers()
-            self.wfile.write(content.encode())
+            self.wfile.write(body)
 
     return DummyHandler
 
 if __name__ == '__main__':
     port = int(sys.argv[1])
     content = sys.argv[2]
-    server = http.server.HTTPServer(
+    flags = set(sys.argv[3:])
+    server = http.server.ThreadingHTTPServer(
             ('localhost', port),
-            handler_class(content))
+            handler_class(
+                content,
+                accept_ranges='ranges' in flags,
+                allow_head='noheads' not in flags,
+                gzip_ok='gzip' in flags))
     server.serve_forever()
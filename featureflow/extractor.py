@@ -1,27 +1,39 @@
 from itertools import zip_longest
-from contextlib import ExitStack
-from collections import deque, defaultdict
+from contextlib import ExitStack, AsyncExitStack
+from collections import deque, defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock
+from tempfile import SpooledTemporaryFile
 import inspect
+import time
 from .util import dictify
 from hashlib import md5
 
 
 class InvalidProcessMethod(Exception):
     """
-    Exception thrown when the _process method of an Node is not a generator
+    Exception thrown when the _process method of an Node is not a generator or
+    an asynchronous generator
     """
 
     def __init__(self, cls):
-        msg = '{name}._process method must be a generator' \
-            .format(name=cls.__name__)
+        msg = '{name}._process method must be a generator or an asynchronous ' \
+              'generator'.format(name=cls.__name__)
         super(InvalidProcessMethod, self).__init__(msg)
 
 
 class Node(object):
+    # classes whose _process method has already been checked
+    _valid_classes = set()
+
     def __init__(self, needs=None):
         super(Node, self).__init__()
-        if not inspect.isgeneratorfunction(self._process):
-            raise InvalidProcessMethod(self.__class__)
+        cls = self.__class__
+        if cls not in Node._valid_classes:
+            if not (inspect.isgeneratorfunction(self._process)
+                    or inspect.isasyncgenfunction(self._process)):
+                raise InvalidProcessMethod(cls)
+            Node._valid_classes.add(cls)
 
         self._cache = None
         self._listeners = []
@@ -57,10 +69,24 @@ class Node(object):
     def __exit__(self, t, value, traceback):
         pass
 
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, t, value, traceback):
+        return self.__exit__(t, value, traceback)
+
     @property
     def version(self):
         return self.__class__.__name__
 
+    @property
+    def is_async(self):
+        """
+        Return true if this node's _process method is an asynchronous
+        generator, meaning that it can only be run by `Graph.aprocess()`
+        """
+        return inspect.isasyncgenfunction(self._process)
+
     @property
     def needs(self):
         return self._needs
@@ -241,6 +267,128 @@ class Aggregator(object):
         return super(Aggregator, self)._dequeue()
 
 
+class SpillingAggregator(Aggregator):
+    """
+    An `Aggregator` mixin for Node-derived classes whose (bytes-like) input may
+    be too large to hold in memory.
+
+    Input is buffered in memory until it exceeds `spill_bytes`, and then
+    written to a temporary file.  Once all input has been received, `_process`
+    is passed a readable file-like object positioned at the beginning of all
+    the input, which can be read incrementally, e.g. with `util.chunked`
+    """
+
+    def __init__(self, spill_bytes=10 * 1024 * 1024, needs=None):
+        super(SpillingAggregator, self).__init__(needs=needs)
+        self.spill_bytes = spill_bytes
+        self._spool = SpooledTemporaryFile(max_size=spill_bytes)
+        self._cache = self._spool
+
+    @property
+    def spilled(self):
+        """
+        True if input has been written to disk
+        """
+        return self._spool._rolled
+
+    def _enqueue(self, data, pusher):
+        self._cache.write(data)
+
+    def _dequeue(self):
+        if not self._finalized:
+            raise NotEnoughData()
+
+        if self._cache is None:
+            raise NotEnoughData()
+
+        v, self._cache = self._cache, None
+        v.seek(0)
+        return v
+
+    def __exit__(self, t, value, traceback):
+        self._spool.close()
+        return super(SpillingAggregator, self).__exit__(t, value, traceback)
+
+
+class Batching(object):
+    """
+    A mixin for Node-derived classes that amortizes per-chunk overhead by
+    gathering incoming chunks into batches.  `_process` is passed a list of
+    chunks once the batch holds `batch_size` chunks, or `batch_bytes` bytes,
+    or once a chunk arrives `batch_timeout` seconds or more after the first
+    chunk in the batch.  Any partial batch is passed to `_process` once all
+    input has been received.
+
+    Chunks from all dependencies are gathered into a single batch, in the
+    order they arrive.  Pair with `Unbatch` to turn batches back into
+    individual chunks downstream
+    """
+
+    def __init__(
+            self,
+            batch_size=None,
+            batch_bytes=None,
+            batch_timeout=None,
+            needs=None,
+            **kwargs):
+
+        super(Batching, self).__init__(needs=needs, **kwargs)
+        if batch_size is None and batch_bytes is None and batch_timeout is None:
+            raise ValueError(
+                'at least one of batch_size, batch_bytes or batch_timeout '
+                'must be specified')
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.batch_timeout = batch_timeout
+        self._cache = []
+        self._batched_bytes = 0
+        self._batch_started = None
+
+    def _enqueue(self, data, pusher):
+        if not self._cache:
+            self._batch_started = time.perf_counter()
+        self._cache.append(data)
+        if self.batch_bytes is not None:
+            self._batched_bytes += _size_in_bytes(data)
+
+    def _batch_is_full(self):
+        if self.batch_size is not None \
+                and len(self._cache) >= self.batch_size:
+            return True
+
+        if self.batch_bytes is not None \
+                and self._batched_bytes >= self.batch_bytes:
+            return True
+
+        return self.batch_timeout is not None \
+            and time.perf_counter() - self._batch_started >= self.batch_timeout
+
+    def _dequeue(self):
+        if not self._cache:
+            raise NotEnoughData()
+
+        if not (self._finalized or self._batch_is_full()):
+            raise NotEnoughData()
+
+        batch, self._cache = self._cache, []
+        self._batched_bytes = 0
+        return batch
+
+
+class Unbatch(Node):
+    """
+    Push each item of every batch (or other iterable) received downstream as
+    an individual chunk, e.g. to undo batching performed by a `Batching` node
+    """
+
+    def __init__(self, needs=None):
+        super(Unbatch, self).__init__(needs=needs)
+
+    def _process(self, data):
+        for item in data:
+            yield item
+
+
 class KeySelector(object):
     """
     A mixin for Node-derived classes that allows the extractor to process a
@@ -273,6 +421,210 @@ class NotEnoughData(Exception):
     pass
 
 
+def _size_in_bytes(data):
+    try:
+        return data.nbytes
+    except AttributeError:
+        pass
+
+    try:
+        return len(data)
+    except TypeError:
+        return 0
+
+
+class NodeStats(object):
+    """
+    Timing and throughput statistics for a single node.  All times are in
+    seconds, and CPU time is measured for the thread running the node
+    """
+
+    FIELDS = [
+        'wall_time',
+        'cpu_time',
+        'enqueue_time',
+        'dequeue_time',
+        'chunks_in',
+        'bytes_in',
+        'chunks_out',
+        'bytes_out',
+        'stalls'
+    ]
+
+    def __init__(self):
+        super(NodeStats, self).__init__()
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def __iadd__(self, other):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        return self
+
+    def to_dict(self):
+        return dict((field, getattr(self, field)) for field in self.FIELDS)
+
+    def __repr__(self):
+        return '{cls}({fields})'.format(
+            cls=self.__class__.__name__,
+            fields=', '.join(
+                '{k}={v}'.format(k=k, v=getattr(self, k))
+                for k in self.FIELDS))
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class GraphStats(OrderedDict):
+    """
+    A mapping from graph keys to `NodeStats`.  Statistics from many graphs
+    (e.g. one per processed document) can be accumulated using `merge()`
+    """
+
+    def merge(self, other):
+        for k, v in other.items():
+            try:
+                self[k] += v
+            except KeyError:
+                self[k] = NodeStats()
+                self[k] += v
+        return self
+
+    def to_dict(self):
+        return dict((k, v.to_dict()) for k, v in self.items())
+
+    def hot_spots(self):
+        """
+        Return graph keys, ordered by the wall time spent in each node's
+        _process method, descending
+        """
+        return sorted(self, key=lambda k: self[k].wall_time, reverse=True)
+
+
+def _iter_unwrapped(node, process, wrapper, last_chunk):
+    """
+    Iterate over a node's last chunks with its `_process` wrapper removed.
+    Nodes may produce their last chunks by calling their own `_process`, and
+    those chunks must not be counted, or traced, a second time
+    """
+    chunks = None
+    while True:
+        node._process = process
+        try:
+            if chunks is None:
+                chunks = iter(last_chunk())
+            d = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            node._process = wrapper
+        yield d
+
+
+def _instrument(node):
+    """
+    Shadow a node's processing methods with versions that record timing and
+    throughput statistics
+    """
+    stats = NodeStats()
+    enqueue = node._enqueue
+    dequeue = node._dequeue
+    process = node._process
+    last_chunk = node._last_chunk
+    clock = time.perf_counter
+    cpu_clock = time.thread_time
+
+    def _enqueue(data, pusher):
+        stats.chunks_in += 1
+        stats.bytes_in += _size_in_bytes(data)
+        start = clock()
+        try:
+            enqueue(data, pusher)
+        finally:
+            stats.enqueue_time += clock() - start
+
+    def _dequeue():
+        start = clock()
+        try:
+            return dequeue()
+        except NotEnoughData:
+            stats.stalls += 1
+            raise
+        finally:
+            stats.dequeue_time += clock() - start
+
+    def _timed(generator):
+        while True:
+            start, cpu_start = clock(), cpu_clock()
+            try:
+                d = next(generator)
+            except StopIteration:
+                return
+            finally:
+                stats.wall_time += clock() - start
+                stats.cpu_time += cpu_clock() - cpu_start
+            stats.chunks_out += 1
+            stats.bytes_out += _size_in_bytes(d)
+            yield d
+
+    async def _async_timed(generator):
+        while True:
+            start, cpu_start = clock(), cpu_clock()
+            try:
+                d = await generator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                stats.wall_time += clock() - start
+                stats.cpu_time += cpu_clock() - cpu_start
+            stats.chunks_out += 1
+            stats.bytes_out += _size_in_bytes(d)
+            yield d
+
+    if node.is_async:
+        async def _process(data):
+            async for d in _async_timed(process(data)):
+                yield d
+    else:
+        def _process(data):
+            for d in _timed(process(data)):
+                yield d
+
+    def _last_chunk():
+        return _timed(_iter_unwrapped(node, process, _process, last_chunk))
+
+    node._enqueue = _enqueue
+    node._dequeue = _dequeue
+    node._process = _process
+    node._last_chunk = _last_chunk
+    node._stats = stats
+
+
+def dead_keys(dependencies, removable):
+    """
+    Given a mapping from the key of each node in a graph to the keys of the
+    nodes it depends on, return the keys of the nodes that can be pruned.
+    Starting from the leaves, a node is dead if `removable(key)` is true, and
+    nothing but dead nodes consume its output
+    """
+    listeners = dict((k, set()) for k in dependencies)
+    for key, needs in dependencies.items():
+        for dependency in needs:
+            listeners[dependency].add(key)
+
+    dead = set()
+    keys = deque(k for k, v in listeners.items() if not v)
+    while keys:
+        key = keys.pop()
+        keys.extendleft(dependencies[key])
+        if key in dead or listeners[key] or not removable(key):
+            continue
+        dead.add(key)
+        for dependency in dependencies[key]:
+            listeners[dependency].discard(key)
+    return dead
+
+
 class Graph(dict):
     def __init__(self, **kwargs):
         super(Graph, self).__init__(**kwargs)
@@ -291,25 +643,122 @@ class Graph(dict):
         return subscriptions
 
     def remove_dead_nodes(self, features):
-        # starting from the leaves, remove any nodes that are not stored, and 
+        # starting from the leaves, remove any nodes that are not stored, and
         # have no stored consuming nodes
-        mapping = dict((self[f.key], f) for f in features)
-        nodes = deque(list(self.leaves().values()))
-        while nodes:
-            extractor = nodes.pop()
-            nodes.extendleft(extractor.dependencies)
-            try:
-                feature = mapping[extractor]
-            except KeyError:
-                continue
-            if extractor.is_leaf and not feature.store:
-                extractor.disconnect()
-                try:
-                    del self[feature.key]
-                except KeyError:
-                    pass
+        unstored = set(f.key for f in features if not f.store)
+        keys = dict((id(node), key) for key, node in self.items())
+        dependencies = dict(
+            (key, [keys[id(d)] for d in node.dependencies if id(d) in keys])
+            for key, node in self.items())
+        for key in dead_keys(dependencies, lambda k: k in unstored):
+            self[key].disconnect()
+            del self[key]
+
+    def topological_sort(self):
+        """
+        Return this graph's nodes ordered such that every node appears after
+        all of the nodes it depends on
 
-    def process(self, **kwargs):
+        Raises:
+            ValueError: when the graph contains a cycle
+        """
+        nodes = list(self.values())
+        node_ids = set(id(n) for n in nodes)
+        subscriptions = self.subscriptions()
+        in_degree = dict(
+            (id(n), len([d for d in n.dependencies if id(d) in node_ids]))
+            for n in nodes)
+        ready = deque(n for n in nodes if not in_degree[id(n)])
+        ordered = []
+        while ready:
+            node = ready.popleft()
+            ordered.append(node)
+            for subscriber in subscriptions[id(node)]:
+                in_degree[id(subscriber)] -= 1
+                if not in_degree[id(subscriber)]:
+                    ready.append(subscriber)
+
+        if len(ordered) != len(nodes):
+            raise ValueError('the graph contains a cycle')
+
+        return ordered
+
+    def instrument(self):
+        """
+        Start recording timing and throughput statistics for every node in
+        this graph, which can be retrieved using `stats()`.  This must be
+        called before the graph is compiled or processed.  Nodes in graphs that
+        are never instrumented pay no cost
+        """
+        for node in self.values():
+            if not hasattr(node, '_stats'):
+                _instrument(node)
+        return self
+
+    def trace(self, recorder):
+        """
+        Record begin/end events for every node in this graph using a
+        `TraceRecorder`.  Like `instrument()`, this must be called before the
+        graph is compiled or processed
+        """
+        return recorder.attach(self)
+
+    def stats(self):
+        """
+        Return a `GraphStats` instance describing time spent and data produced
+        by each instrumented node in this graph
+        """
+        return GraphStats(
+            (k, node._stats) for k, node in self.items()
+            if hasattr(node, '_stats'))
+
+    def compile(self, threads=None, max_buffer_items=None,
+                max_buffer_bytes=None):
+        """
+        Build a `CompiledGraph` that runs this graph using a static execution
+        plan, rather than the more dynamic dispatch used by `process()`
+
+        Args:
+            threads (int): When provided, return a `ThreadedGraph` that runs
+                independent branches of the graph on a pool with this many
+                threads
+            max_buffer_items (int): When provided, return a `BoundedGraph` that
+                never buffers more than this many chunks on any single edge
+            max_buffer_bytes (int): When provided, return a `BoundedGraph` that
+                stops producing data for any edge buffering at least this many
+                bytes
+        """
+        bounded = \
+            max_buffer_items is not None or max_buffer_bytes is not None
+        if threads and bounded:
+            raise ValueError(
+                'threads and buffer limits cannot be used together')
+        if threads:
+            return ThreadedGraph(self, threads=threads)
+        if bounded:
+            return BoundedGraph(
+                self,
+                max_buffer_items=max_buffer_items,
+                max_buffer_bytes=max_buffer_bytes)
+        return CompiledGraph(self)
+
+    async def aprocess(self, **kwargs):
+        """
+        Process data asynchronously.  Nodes may define an asynchronous
+        generator `_process` method, and any awaitable yielded by a node (e.g.
+        the result of an asynchronous write) is awaited before being passed
+        along to its subscribers
+        """
+        await self.compile().aprocess(**kwargs)
+
+    def _ensure_synchronous(self):
+        for node in self.values():
+            if node.is_async:
+                raise ValueError(
+                    '{node} has an asynchronous _process method, so this graph '
+                    'must be run using aprocess()'.format(node=node))
+
+    def _root_arguments(self, kwargs):
         # get all root nodes (those that produce data, rather than consuming 
         # it)
         roots = self.roots()
@@ -324,7 +773,12 @@ class Graph(dict):
                     + ' keys for the root extractors were {r}') \
                     .format(kw=list(kwargs.keys()), r=list(roots.keys())))
 
-        graph_args = dict((k, kwargs[k]) for k in intersection)
+        return dict((k, kwargs[k]) for k in intersection)
+
+    def process(self, **kwargs):
+        self._ensure_synchronous()
+        roots = self.roots()
+        graph_args = self._root_arguments(kwargs)
 
         subscriptions = self.subscriptions()
         queue = deque()
@@ -343,3 +797,627 @@ class Graph(dict):
                         if result is None:
                             continue
                         [_ for _ in result]
+
+
+# sentinel pushed onto a CompiledGraph's queue when a node has finished
+_FINISHED = object()
+
+
+def _identity(x):
+    return x
+
+
+class _CompiledNode(object):
+    """
+    A dispatch table for a single node in a `CompiledGraph`.  Bound methods
+    and subscribers are looked up once, when the plan is built, instead of for
+    every chunk of data
+    """
+
+    __slots__ = [
+        'node',
+        'key',
+        'is_root',
+        'is_async',
+        'dependency_ids',
+        'subscribers',
+        'enqueue',
+        'dequeue',
+        'first_chunk',
+        'process',
+        'last_chunk',
+        'finalize'
+    ]
+
+    def __init__(self, node):
+        super(_CompiledNode, self).__init__()
+        self.node = node
+        self.key = id(node)
+        self.is_root = node.is_root
+        self.is_async = node.is_async
+        self.dependency_ids = frozenset(id(d) for d in node.dependencies)
+        self.subscribers = ()
+        self.enqueue = node._enqueue
+        self.dequeue = node._dequeue
+        self.first_chunk = node._first_chunk
+        self.process = node._process
+        self.last_chunk = node._last_chunk
+        self.finalize = node._finalize
+
+    def __repr__(self):
+        return repr(self.node)
+
+    def _complete(self, queue):
+        for chunk in self.last_chunk():
+            queue.appendleft((self, chunk))
+        self.finalize(None)
+        queue.appendleft((self, _FINISHED))
+
+    def finish(self, pusher):
+        self.finalize(pusher.node)
+        if pusher.key in self.dependency_ids:
+            self.node._finalized_dependencies.add(pusher.key)
+
+    def push(self, data, pusher, queue):
+        """
+        The equivalent of `Node.process` for nodes with dependencies
+        """
+        node = self.node
+        if data is not None:
+            node._enqueued_dependencies.add(pusher.key)
+            self.enqueue(data, pusher.node)
+
+        try:
+            inp = self.first_chunk(self.dequeue())
+            self.first_chunk = _identity
+            for d in self.process(inp):
+                queue.appendleft((self, d))
+        except NotEnoughData:
+            pass
+
+        if node._finalized:
+            self._complete(queue)
+
+    def drive(self, data, queue):
+        """
+        The equivalent of `Node.process` for root nodes, yielding after each
+        chunk, so that the graph can drain the queue and interleave roots
+        """
+        self.node._enqueued_dependencies.add(id(None))
+        self.enqueue(data, None)
+
+        try:
+            inp = self.first_chunk(self.dequeue())
+            self.first_chunk = _identity
+            for d in self.process(inp):
+                queue.appendleft((self, d))
+                yield
+        except NotEnoughData:
+            yield
+
+        self._complete(queue)
+        yield
+
+    def steps(self, data, pusher):
+        """
+        The equivalent of `Node.process` as a generator of output chunks,
+        ending with `_FINISHED` once the node has been finalized, so that a
+        scheduler can pause the node between any two chunks
+        """
+        node = self.node
+        if pusher is None:
+            node._enqueued_dependencies.add(id(None))
+            self.enqueue(data, None)
+        elif data is not None:
+            node._enqueued_dependencies.add(pusher.key)
+            self.enqueue(data, pusher.node)
+
+        try:
+            inp = self.first_chunk(self.dequeue())
+            self.first_chunk = _identity
+            for d in self.process(inp):
+                yield d
+        except NotEnoughData:
+            pass
+
+        if self.is_root or node._finalized:
+            for chunk in self.last_chunk():
+                yield chunk
+            self.finalize(None)
+            yield _FINISHED
+
+    async def apush(self, data, pusher, queue):
+        """
+        The asynchronous equivalent of `push()`
+        """
+        if not self.is_async:
+            return self.push(data, pusher, queue)
+
+        node = self.node
+        if data is not None:
+            node._enqueued_dependencies.add(pusher.key)
+            self.enqueue(data, pusher.node)
+
+        try:
+            inp = self.first_chunk(self.dequeue())
+            self.first_chunk = _identity
+            async for d in self.process(inp):
+                queue.appendleft((self, d))
+        except NotEnoughData:
+            pass
+
+        if node._finalized:
+            self._complete(queue)
+
+    async def adrive(self, data, queue):
+        """
+        The asynchronous equivalent of `drive()`
+        """
+        self.node._enqueued_dependencies.add(id(None))
+        self.enqueue(data, None)
+
+        try:
+            inp = self.first_chunk(self.dequeue())
+            self.first_chunk = _identity
+            if self.is_async:
+                async for d in self.process(inp):
+                    queue.appendleft((self, d))
+                    yield
+            else:
+                for d in self.process(inp):
+                    queue.appendleft((self, d))
+                    yield
+        except NotEnoughData:
+            yield
+
+        self._complete(queue)
+        yield
+
+
+class CompiledGraph(object):
+    """
+    A static execution plan for a `Graph`.  Nodes are topologically sorted
+    once, and each edge is resolved to a pre-bound dispatch table, so that
+    processing a chunk of data involves no per-chunk method lookups or keyword
+    argument dictionaries.  Node semantics are identical to `Graph.process`.
+
+    Like the `Graph` it's built from, a `CompiledGraph` holds per-document node
+    state, and should only be used to process a single document
+    """
+
+    def __init__(self, graph):
+        super(CompiledGraph, self).__init__()
+        self.graph = graph
+        self.nodes = graph.topological_sort()
+
+        compiled = OrderedDict((id(n), _CompiledNode(n)) for n in self.nodes)
+        subscriptions = graph.subscriptions()
+        for key, c in compiled.items():
+            c.subscribers = tuple(compiled[id(s)] for s in subscriptions[key])
+
+        self._compiled = compiled
+        self._roots = dict(
+            (k, compiled[id(v)]) for k, v in graph.roots().items())
+
+    def process(self, **kwargs):
+        self.graph._ensure_synchronous()
+        graph_args = self.graph._root_arguments(kwargs)
+        queue = deque()
+
+        with ExitStack() as stack:
+            [stack.enter_context(n) for n in self.nodes]
+            generators = [self._roots[k].drive(v, queue)
+                          for k, v in graph_args.items()]
+            for _ in zip_longest(*generators):
+                while queue:
+                    pusher, data = queue.pop()
+                    if data is _FINISHED:
+                        for subscriber in pusher.subscribers:
+                            subscriber.finish(pusher)
+                        data = None
+                    for subscriber in pusher.subscribers:
+                        subscriber.push(data, pusher, queue)
+
+    async def aprocess(self, **kwargs):
+        graph_args = self.graph._root_arguments(kwargs)
+        queue = deque()
+
+        async with AsyncExitStack() as stack:
+            for n in self.nodes:
+                await stack.enter_async_context(n)
+            generators = [self._roots[k].adrive(v, queue)
+                          for k, v in graph_args.items()]
+            while generators:
+                for generator in list(generators):
+                    try:
+                        await generator.__anext__()
+                    except StopAsyncIteration:
+                        generators.remove(generator)
+
+                while queue:
+                    pusher, data = queue.pop()
+                    if data is _FINISHED:
+                        for subscriber in pusher.subscribers:
+                            subscriber.finish(pusher)
+                        data = None
+                    elif inspect.isawaitable(data):
+                        data = await data
+                    for subscriber in pusher.subscribers:
+                        await subscriber.apush(data, pusher, queue)
+
+
+class _Branch(object):
+    """
+    A set of nodes in a `ThreadedGraph` that are always run serially, by at
+    most one thread at a time, and that receive data from a single, ordered
+    input queue
+    """
+
+    def __init__(self, graph):
+        super(_Branch, self).__init__()
+        self.graph = graph
+        self.nodes = []
+        # maps each pusher to its subscribers in this branch
+        self.targets = dict()
+        # maps each pusher in this branch to the other branches it feeds
+        self.forward = dict()
+        self._inbox = deque()
+        self._lock = Lock()
+        self._scheduled = False
+
+    def __repr__(self):
+        return '_Branch({nodes})'.format(nodes=self.nodes)
+
+    def post(self, pusher, data):
+        self.graph._increment()
+        with self._lock:
+            self._inbox.appendleft((pusher, data))
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.graph._submit(self)
+
+    def drain(self):
+        while True:
+            with self._lock:
+                if not self._inbox:
+                    self._scheduled = False
+                    return
+                event = self._inbox.pop()
+
+            try:
+                if not self.graph._failed:
+                    queue = deque()
+                    queue.appendleft(event)
+                    self.run(queue)
+            except BaseException as e:
+                self.graph._fail(e)
+            finally:
+                self.graph._decrement()
+
+    def run(self, queue):
+        while queue:
+            pusher, data = queue.pop()
+
+            for branch in self.forward.get(pusher, ()):
+                branch.post(pusher, data)
+
+            subscribers = self.targets.get(pusher, ())
+            if data is _FINISHED:
+                for subscriber in subscribers:
+                    subscriber.finish(pusher)
+                data = None
+            for subscriber in subscribers:
+                subscriber.push(data, pusher, queue)
+
+
+class ThreadedGraph(CompiledGraph):
+    """
+    A `CompiledGraph` that runs independent branches of the graph concurrently
+    on a thread pool.
+
+    The graph is partitioned into branches, such that each branch receives data
+    from exactly one upstream branch (or from the root nodes, which are always
+    run in the calling thread).  Each branch is run serially, from its own,
+    ordered input queue, so every node sees its input in the same order it
+    would have when run on a single thread, while sibling branches overlap.
+    This is most useful when nodes release the GIL, e.g. when doing numpy,
+    compression, hashing or I/O work.
+    """
+
+    def __init__(self, graph, threads=4):
+        super(ThreadedGraph, self).__init__(graph)
+        self.threads = threads
+        self.branches = self._partition()
+        self._executor = None
+        self._pending = 0
+        self._idle = Condition()
+        self._failed = False
+        self._error = None
+
+    def _partition(self):
+        compiled = self._compiled
+        driver = object()
+        parents = dict((key, key) for key in compiled)
+        parents[id(driver)] = id(driver)
+
+        def find(key):
+            while parents[key] != key:
+                parents[key] = parents[parents[key]]
+                key = parents[key]
+            return key
+
+        def union(*keys):
+            roots = [find(k) for k in keys]
+            for r in roots[1:]:
+                parents[r] = roots[0]
+
+        dependencies = dict(
+            (key, [id(d) for d in c.node.dependencies if id(d) in compiled])
+            for key, c in compiled.items())
+
+        for key, c in compiled.items():
+            deps = dependencies[key]
+            if c.is_root:
+                # root nodes are always driven by the calling thread
+                union(id(driver), key)
+            elif len(deps) == 1 and len(compiled[deps[0]].subscribers) == 1:
+                # a simple chain; there's nothing to gain by switching threads
+                union(deps[0], key)
+            elif len(deps) > 1:
+                # merging branches must run together to keep input ordered
+                union(key, *deps)
+
+        # ensure that each branch is fed by a single upstream branch, merging
+        # branches until this is true
+        changed = True
+        while changed:
+            changed = False
+            sources = defaultdict(set)
+            for key in compiled:
+                for dep in dependencies[key]:
+                    if find(dep) != find(key):
+                        sources[find(key)].add(find(dep))
+            for branch, upstream in sources.items():
+                if len(upstream) > 1:
+                    union(branch, *upstream)
+                    changed = True
+
+        branches = OrderedDict()
+        branches[find(id(driver))] = _Branch(self)
+        for key, c in compiled.items():
+            try:
+                branch = branches[find(key)]
+            except KeyError:
+                branch = branches[find(key)] = _Branch(self)
+            branch.nodes.append(c)
+
+        membership = dict(
+            (c.key, branch)
+            for branch in branches.values() for c in branch.nodes)
+
+        for c in compiled.values():
+            source = membership[c.key]
+            for subscriber in c.subscribers:
+                target = membership[subscriber.key]
+                target.targets[c] = target.targets.get(c, ()) + (subscriber,)
+                if target is not source \
+                        and target not in source.forward.get(c, ()):
+                    source.forward[c] = source.forward.get(c, ()) + (target,)
+
+        self._driver = branches[find(id(driver))]
+        return list(branches.values())
+
+    def _submit(self, branch):
+        self._executor.submit(branch.drain)
+
+    def _increment(self):
+        with self._idle:
+            self._pending += 1
+
+    def _decrement(self):
+        with self._idle:
+            self._pending -= 1
+            if not self._pending:
+                self._idle.notify_all()
+
+    def _fail(self, error):
+        with self._idle:
+            self._failed = True
+            if self._error is None:
+                self._error = error
+
+    def _wait(self):
+        with self._idle:
+            while self._pending:
+                self._idle.wait()
+
+    def process(self, **kwargs):
+        self.graph._ensure_synchronous()
+        graph_args = self.graph._root_arguments(kwargs)
+        queue = deque()
+
+        with ExitStack() as stack:
+            [stack.enter_context(n) for n in self.nodes]
+            self._executor = stack.enter_context(
+                ThreadPoolExecutor(max_workers=self.threads))
+            generators = [self._roots[k].drive(v, queue)
+                          for k, v in graph_args.items()]
+            try:
+                for _ in zip_longest(*generators):
+                    self._driver.run(queue)
+                    if self._failed:
+                        break
+            except BaseException:
+                self._failed = True
+                self._wait()
+                raise
+
+            self._wait()
+            if self._error is not None:
+                raise self._error
+
+
+class _BoundedNode(object):
+    """
+    A node in a `BoundedGraph`, along with its ordered input buffer, the
+    number of items and bytes buffered for each incoming edge, and the
+    generator of output chunks it's currently working through, if any
+    """
+
+    __slots__ = [
+        'compiled',
+        'subscribers',
+        'inbox',
+        'items',
+        'nbytes',
+        'active'
+    ]
+
+    def __init__(self, compiled):
+        super(_BoundedNode, self).__init__()
+        self.compiled = compiled
+        self.subscribers = ()
+        self.inbox = deque()
+        self.items = defaultdict(int)
+        self.nbytes = defaultdict(int)
+        self.active = None
+
+    def __repr__(self):
+        return repr(self.compiled)
+
+
+class BoundedGraph(CompiledGraph):
+    """
+    A `CompiledGraph` that bounds the amount of data buffered on each edge.
+
+    Every node has an ordered input buffer, and a node is paused between
+    chunks of output whenever any edge to one of its subscribers is full.  Data
+    is always drained from downstream nodes before upstream nodes are allowed
+    to produce more, so peak memory is bounded by the buffer limits, rather
+    than by the size of the input.
+
+    A single chunk is always allowed onto an empty edge, regardless of its size,
+    so an edge may exceed `max_buffer_bytes` by at most one chunk
+    """
+
+    def __init__(self, graph, max_buffer_items=None, max_buffer_bytes=None):
+        super(BoundedGraph, self).__init__(graph)
+        if max_buffer_items is not None and max_buffer_items < 1:
+            raise ValueError('max_buffer_items must be at least one')
+
+        self.max_buffer_items = max_buffer_items
+        self.max_buffer_bytes = max_buffer_bytes
+        self.peak_buffer_items = 0
+        self.peak_buffer_bytes = 0
+
+        bounded = OrderedDict(
+            (key, _BoundedNode(c)) for key, c in self._compiled.items())
+        for b in bounded.values():
+            b.subscribers = tuple(
+                bounded[s.key] for s in b.compiled.subscribers)
+        self._bounded = list(bounded.values())
+        self._bounded_roots = dict(
+            (k, bounded[c.key]) for k, c in self._roots.items())
+
+    def _has_room(self, consumer, pusher):
+        items = consumer.items[pusher]
+        if not items:
+            return True
+        if self.max_buffer_items is not None \
+                and items >= self.max_buffer_items:
+            return False
+        if self.max_buffer_bytes is not None \
+                and consumer.nbytes[pusher] >= self.max_buffer_bytes:
+            return False
+        return True
+
+    def _offer(self, consumer, pusher, data):
+        if data is _FINISHED:
+            consumer.inbox.appendleft((pusher, data, 0))
+            return
+
+        size = _size_in_bytes(data)
+        key = pusher.compiled.key
+        consumer.items[key] += 1
+        consumer.nbytes[key] += size
+        consumer.inbox.appendleft((pusher, data, size))
+        self.peak_buffer_items = max(
+            self.peak_buffer_items, consumer.items[key])
+        self.peak_buffer_bytes = max(
+            self.peak_buffer_bytes, consumer.nbytes[key])
+
+    def _take(self, consumer):
+        pusher, data, size = consumer.inbox.pop()
+        compiled = consumer.compiled
+        if data is _FINISHED:
+            compiled.finish(pusher.compiled)
+            data = None
+        else:
+            key = pusher.compiled.key
+            consumer.items[key] -= 1
+            consumer.nbytes[key] -= size
+        return compiled.steps(data, pusher.compiled)
+
+    def _advance(self, node, limit=None):
+        """
+        Do as much work as possible for a single node, until it's idle, or
+        blocked by a full buffer downstream, returning true if any progress
+        was made
+        """
+        progressed = False
+        produced = 0
+        key = node.compiled.key
+
+        while True:
+            if node.active is None:
+                if not node.inbox:
+                    return progressed
+                node.active = self._take(node)
+                progressed = True
+
+            if limit is not None and produced >= limit:
+                return progressed
+
+            for subscriber in node.subscribers:
+                if not self._has_room(subscriber, key):
+                    return progressed
+
+            try:
+                data = next(node.active)
+            except StopIteration:
+                node.active = None
+                continue
+
+            progressed = True
+            produced += 1
+            for subscriber in node.subscribers:
+                self._offer(subscriber, node, data)
+
+    def process(self, **kwargs):
+        self.graph._ensure_synchronous()
+        graph_args = self.graph._root_arguments(kwargs)
+
+        with ExitStack() as stack:
+            [stack.enter_context(n) for n in self.nodes]
+
+            roots = []
+            for k, v in graph_args.items():
+                root = self._bounded_roots[k]
+                root.active = root.compiled.steps(v, None)
+                roots.append(root)
+
+            # visit nodes downstream-first, so that buffers are drained before
+            # upstream nodes are allowed to produce more data.  Root nodes
+            # produce at most one chunk per pass, just like Graph.process
+            ordered = [
+                n for n in reversed(self._bounded) if not n.compiled.is_root]
+            progressed = True
+            while progressed:
+                progressed = False
+                for node in ordered:
+                    if self._advance(node):
+                        progressed = True
+                for root in roots:
+                    if self._advance(root, limit=1):
+                        progressed = True
@@ -7,6 +7,7 @@ from .decoder import JSONDecoder, Decoder, GreedyTextDecoder, DecoderNode, \
 from .encoder import IdentityEncoder, JSONEncoder, TextEncoder, BZ2Encoder, \
     PickleEncoder
 from .extractor import Graph, FunctionalNode, Node, KeySelector
+from .template import NodeRecipe
 from .util import dictify
 
 
@@ -33,6 +34,7 @@ class Feature(object):
 
         self.decoder = decoder or Decoder()
         self.extractor_args = extractor_args
+        self._version = None
 
         self._handle_callable_extractor()
 
@@ -47,6 +49,7 @@ class Feature(object):
         return Aspect(aspect_key, self)
 
     def _fixup_needs(self):
+        self.invalidate_version()
         self.needs = dictify(self.needs, lambda item: item.key)
 
         for k, v in list(self.needs.items()):
@@ -90,6 +93,36 @@ class Feature(object):
 
     @property
     def version(self):
+        """
+        This feature's version identifier.  It's computed once and cached,
+        unless it depends on the current values of closed-over variables, so
+        `invalidate_version()` must be called if the feature's extractor,
+        extractor arguments or dependencies are changed after it's first read
+        """
+        if self._version is not None:
+            return self._version
+        version = self._compute_version()
+        if not self.has_volatile_version:
+            self._version = version
+        return version
+
+    @property
+    def has_volatile_version(self):
+        """
+        Return true if this feature's version may change between reads.  The
+        version of a functional node with a closure fingerprint depends on the
+        current values of closed-over variables
+        """
+        return issubclass(self.extractor, FunctionalNode) \
+            and self.extractor_args.get('closure_fingerprint') is not None
+
+    def invalidate_version(self):
+        """
+        Discard this feature's cached version identifier
+        """
+        self._version = None
+
+    def _compute_version(self):
         # KLUDGE: Build a shallow version of the extractor.  Building a deep
         # version with re-usable code is more difficult, because
         # self._build_extractor relies on this version property, so there's
@@ -127,6 +160,10 @@ class Feature(object):
             persistence=persistence,
             **(extractor_args or self.extractor_args))
         f._fixup_needs()
+        if extractor in (None, self.extractor) \
+                and extractor_args in (None, self.extractor_args):
+            # the copy's version is the same as this feature's
+            f._version = self._version
         return f
 
     def database(self, persistence):
@@ -141,6 +178,17 @@ class Feature(object):
         except AttributeError:
             return None
 
+    def feature_cache(self, persistence):
+        try:
+            return (self.persistence or persistence).feature_cache
+        except AttributeError:
+            return None
+
+    def cache_key(self, _id, persistence):
+        # settings cloned from one another share a cache, but may store the
+        # same document in different databases
+        return _id, self.key, self.version, self.database(persistence)
+
     def feature_key(self, _id, persistence):
         return self.keybuilder(persistence).build(_id, self.key, self.version)
 
@@ -148,6 +196,19 @@ class Feature(object):
         key = self.keybuilder(persistence).build(_id, key, self.version)
         return self.database(persistence).read_stream(key)
 
+    def _decode_stored(self, _id, decoder, persistence):
+        """
+        Decode the stored value, raising KeyError if there isn't one.
+        Decoders that copy what they return read a zero-copy view, released
+        as soon as they return
+        """
+        if not getattr(decoder, 'copies', False):
+            return decoder(self.reader(_id, self.key, persistence))
+
+        key = self.feature_key(_id, persistence)
+        with self.database(persistence).read_view(key) as flo:
+            return decoder(flo)
+
     @property
     def is_root(self):
         return not self.needs
@@ -165,46 +226,51 @@ class Feature(object):
         Return true if this feature stored, or is unstored, but can be computed
         from stored dependencies
         """
-        if self.store and self._stored(_id, persistence):
-            return True
-
-        if self.is_root:
-            return False
-
-        return all(
-            [n._can_compute(_id, persistence) for n in self.dependencies])
-
-    def _compute(self, _id=None, persistence=None):
-        graph, stream = self._build_partial(_id, persistence)
-
-        kwargs = dict()
-        for k, extractor in list(graph.roots().items()):
-            try:
-                kwargs[k] = extractor._reader
-            except AttributeError:
-                kwargs[k] = self.reader(_id, k, persistence)
+        return ComputePlan(self, _id, persistence).can_compute
 
-        graph.process(**kwargs)
-        return stream
+    def _compute(self, _id=None, persistence=None, stats=None, trace=None):
+        plan = ComputePlan(self, _id, persistence)
+        return plan.run(stats=stats, trace=trace)[self.key]
 
     def compute(self, _id, persistence):
         self._compute(_id, persistence)
 
-    def __call__(self, _id=None, decoder=None, persistence=None):
+    def __call__(
+            self,
+            _id=None,
+            decoder=None,
+            persistence=None,
+            stats=None,
+            trace=None):
+        cache = None if decoder is not None \
+            else self.feature_cache(persistence)
+        if cache is None:
+            return self._read(_id, decoder, persistence, stats, trace)
+
+        key = self.cache_key(_id, persistence)
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+
+        decoded = self._read(_id, decoder, persistence, stats, trace)
+        cache.add(key, decoded)
+        return decoded
+
+    def _read(self, _id, decoder, persistence, stats, trace):
         if decoder is None:
             decoder = self.decoder
 
         try:
-            raw = self.reader(_id, self.key, persistence)
-            decoded = decoder(raw)
-            return decoded
+            return self._decode_stored(_id, decoder, persistence)
         except KeyError:
             pass
 
-        if not self._can_compute(_id, persistence):
+        plan = ComputePlan(self, _id, persistence)
+        if not plan.can_compute:
             raise AttributeError('%s cannot be computed' % self.key)
 
-        stream = self._compute(_id, persistence)
+        stream = plan.run(stats=stats, trace=trace)[self.key]
 
         if stream is None:
             stream = self.reader(_id, self.key, persistence)
@@ -213,117 +279,235 @@ class Feature(object):
         decoded = decoder(stream)
         return decoded
 
-    def _build_partial(self, _id, persistence):
-        features = self._partial(_id, persistence=persistence)
-        g = Graph()
-        for feat in list(features.values()):
-            e = feat._build_extractor(_id, g, persistence)
-            if feat.key == self.key:
-                stream = e.find_listener(
-                    lambda x: isinstance(x, BytesIODataWriter))
-                if stream is not None:
-                    stream = stream._stream
+    def _recipes(self, persistence):
+        """
+        Return recipes for the nodes that compute this feature and, if it's
+        stored, encode and write it, in the order they must be built.  Graphs
+        built from scratch, and by `GraphTemplate`, both use these
+        """
+        args = dict()
+        variables = []
+        for k, v in self.extractor_args.items():
+            if isinstance(v, Var) and v.name == k:
+                variables.append(k)
+            else:
+                args[k] = v
+
+        reader = None
+        if issubclass(self.extractor, DecoderNode):
+            def reader(_id):
+                return self.reader(_id, self.key, persistence)
+
+        needs = OrderedDict((k, f.key) for k, f in self.needs.items())
+        recipes = [NodeRecipe(
+            self.key, self.extractor, needs, args, variables, reader=reader)]
+
+        if not self.store:
+            return recipes
+
+        key = self.key
+        encoder_key = '{key}_encoder'.format(**locals())
+        recipes.append(NodeRecipe(encoder_key, self.encoder, key))
+
+        # persistence settings may be replaced on the model class, so they're
+        # resolved for every document.  Feature versions are cached, so
+        # reading them is cheap
+        def bind():
+            return dict(
+                feature_version=self.version,
+                key_builder=self.keybuilder(persistence),
+                database=self.database(persistence),
+                event_log=self.event_log(persistence))
+
+        recipes.append(NodeRecipe(
+            '{key}_writer'.format(**locals()),
+            self._data_writer,
+            encoder_key,
+            dict(feature_name=self.key),
+            binds_id=True,
+            bind=bind))
+        return recipes
+
+    def _build_extractor(self, _id, graph, persistence, **kwargs):
+        try:
+            return graph[self.key]
+        except KeyError:
+            pass
+
+        for f in self.needs.values():
+            f._build_extractor(_id, graph, persistence, **kwargs)
 
-        return g, stream
+        for recipe in self._recipes(persistence):
+            graph[recipe.key] = recipe.build(graph, _id, kwargs)
 
-    def _partial(self, _id, features=None, persistence=None):
+        return graph[self.key]
+
+
+class ComputePlan(object):
+    """
+    A plan for computing one or more features of a single document, doing the
+    work necessary to compute those features, and no more.
+
+    Planning visits each feature in the dependency graph just once, and checks
+    whether each stored feature is in the database just once, so features that
+    share ancestors don't multiply database lookups
+    """
+
+    def __init__(self, features, _id, persistence):
+        super(ComputePlan, self).__init__()
+        if isinstance(features, Feature):
+            features = [features]
+        self.targets = list(features)
+        self._id = _id
+        self.persistence = persistence
+        self._stored = dict()
+        self._computable = dict()
+        self._features = None
+
+    @property
+    def feature(self):
+        return self.targets[0]
+
+    def is_stored(self, feature):
+        if not feature.store:
+            return False
+
+        try:
+            return self._stored[feature.key]
+        except KeyError:
+            pass
+
+        stored = feature._stored(self._id, self.persistence)
+        self._stored[feature.key] = stored
+        return stored
+
+    @property
+    def can_compute(self):
         """
-        TODO: _partial is a shit name for this, kind of.  I'm building a graph
-        such that I can only do work necessary to compute self, and no more
+        True if every feature is stored, or is unstored, but can be computed
+        from stored dependencies
         """
+        return all(self._can_compute(f) for f in self.targets)
 
-        root = features is None
+    def _can_compute(self, feature):
+        try:
+            return self._computable[feature.key]
+        except KeyError:
+            pass
 
-        stored = self._stored(_id, persistence)
-        is_cached = self.store and stored
+        if self.is_stored(feature):
+            computable = True
+        elif feature.is_root:
+            computable = False
+        else:
+            computable = all(
+                self._can_compute(f) for f in feature.dependencies)
 
-        if self.store and not stored:
-            data_writer = None
-        elif root:
+        self._computable[feature.key] = computable
+        return computable
+
+    @property
+    def features(self):
+        """
+        Copies of the features that must be decoded or computed, keyed by
+        feature key.  Stored features are decoded, rather than recomputed,
+        and dependencies of stored features are left out entirely
+        """
+        if self._features is None:
+            self._features = OrderedDict()
+            targets = set(f.key for f in self.targets)
+            for feature in self.targets:
+                self._partial(feature, targets)
+        return self._features
+
+    def _partial(self, feature, targets):
+        try:
+            return self._features[feature.key]
+        except KeyError:
+            pass
+
+        root = feature.key in targets
+        is_cached = self.is_stored(feature)
+        should_store = feature.store and not is_cached
+
+        if root and not should_store:
             data_writer = BytesIODataWriter
         else:
             data_writer = None
 
-        should_store = self.store and not stored
-        nf = self.copy(
-            extractor=DecoderNode if is_cached else self.extractor,
+        nf = feature.copy(
+            extractor=DecoderNode if is_cached else feature.extractor,
             store=root or should_store,
             needs=dict(),
             data_writer=data_writer,
-            persistence=self.persistence,
-            extractor_args=dict(decodifier=self.decoder, version=self.version) \
-                if is_cached else self.extractor_args)
+            persistence=feature.persistence,
+            extractor_args=dict(
+                decodifier=feature.decoder, version=feature.version) \
+                if is_cached else feature.extractor_args)
 
-        if root:
-            features = dict()
-
-        features[self.key] = nf
+        self._features[feature.key] = nf
 
         if not is_cached:
-            for k, v in list(self.needs.items()):
-                v._partial(_id, features=features, persistence=persistence)
-                nf.needs[k] = features[v.key]
-
-        return features
-
-    def _depends_on(self, _id, graph, persistence, **kwargs):
-        needs = OrderedDict()
+            for k, v in list(feature.needs.items()):
+                nf.needs[k] = self._partial(v, targets)
 
-        for k, f in list(self.needs.items()):
-            if f.key in graph:
-                needs[k] = graph[f.key]
-                continue
+        return nf
 
-            e = f._build_extractor(_id, graph, persistence, **kwargs)
-            needs[k] = e
+    def build(self, **kwargs):
+        """
+        Build the graph that will compute the features, returning the graph,
+        and a dictionary mapping each feature's key to the in-memory stream it
+        will be written to, or None if it will be stored in the database
+        """
+        g = Graph()
+        for feat in list(self.features.values()):
+            feat._build_extractor(self._id, g, self.persistence, **kwargs)
 
-        return needs
+        streams = dict()
+        for feature in self.targets:
+            stream = g[feature.key].find_listener(
+                lambda x: isinstance(x, BytesIODataWriter))
+            streams[feature.key] = None if stream is None else stream._stream
 
-    def _build_extractor(self, _id, graph, persistence, **kwargs):
-        try:
-            return graph[self.key]
-        except KeyError:
-            pass
+        return g, streams
 
-        needs = self._depends_on(_id, graph, persistence, **kwargs)
+    def arguments(self, graph, **kwargs):
+        """
+        Return the arguments for processing a graph built by this plan.  Stored
+        features are read from the database, while unstored root features are
+        fed by the keyword arguments
+        """
+        graph_args = dict(kwargs)
+        for k, extractor in list(graph.roots().items()):
+            try:
+                graph_args[k] = extractor._reader
+            except AttributeError:
+                if k not in graph_args:
+                    graph_args[k] = self.feature.reader(
+                        self._id, k, self.persistence)
+        return graph_args
 
-        extractor_args = dict()
-        for k, v in list(self.extractor_args.items()):
-            if isinstance(v, Var) and v.name == k:
-                try:
-                    extractor_args[k] = kwargs[k]
-                except KeyError:
-                    raise ValueError('{k} is a Var, but it was not provided'
-                                     .format(**locals()))
-            else:
-                extractor_args[k] = v
+    def run(self, stats=None, trace=None, **kwargs):
+        """
+        Compute the features, returning a dictionary mapping each feature's
+        key to the in-memory stream it was written to, or None if it was
+        stored in the database.  Root features that aren't stored are fed by
+        the keyword arguments
+        """
+        graph, streams = self.build(**kwargs)
 
-        e = self.extractor(needs=needs, **extractor_args)
+        if stats is not None:
+            graph.instrument()
 
-        if isinstance(e, DecoderNode):
-            reader = self.reader(_id, self.key, persistence)
-            setattr(e, '_reader', reader)
+        if trace is not None:
+            graph.trace(trace)
 
-        graph[self.key] = e
+        graph.process(**self.arguments(graph, **kwargs))
 
-        if not self.store:
-            return e
+        if stats is not None:
+            stats.merge(graph.stats())
 
-        key = self.key
-        encoder = self.encoder(needs=e)
-        graph['{key}_encoder'.format(**locals())] = encoder
-
-        dw = self._data_writer(
-            needs=encoder,
-            _id=_id,
-            feature_name=self.key,
-            feature_version=self.version,
-            key_builder=self.keybuilder(persistence),
-            database=self.database(persistence),
-            event_log=self.event_log(persistence))
-
-        graph['{key}_writer'.format(**locals())] = dw
-        return e
+        return streams
 
 
 class Aspect(object):
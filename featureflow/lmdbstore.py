@@ -1,6 +1,12 @@
 import lmdb
-from .data import Database
-from io import BytesIO
+from .data import Database, WriteBatch
+from contextlib import contextmanager
+import io
+from uuid import uuid4
+from collections import OrderedDict
+from threading import Lock
+from weakref import WeakSet
+import struct
 import os
 
 
@@ -18,12 +24,105 @@ def from_bytes(b):
         return b
 
 
+# values larger than a single segment are stored as a series of segments in a
+# separate database, and the feature database holds a small header that points
+# to them, so that a value never has to be held in memory all at once
+SEGMENT_DB = b'__segments__'
+SEGMENT_MAGIC = b'\x00featureflow-segmented\x00'
+SEGMENT_HEADER = struct.Struct('>16sQI')
+
+
+def _segment_key(_id, nonce, index):
+    return _id + b'\x00' + nonce + struct.pack('>I', index)
+
+
+def _parse_segment_key(key):
+    """
+    Return the (_id, nonce) of the value a segment belongs to
+    """
+    key = bytes(key)
+    return key[:-21], key[-20:-4]
+
+
+def _pack_header(nonce, total_length, count):
+    return SEGMENT_MAGIC + SEGMENT_HEADER.pack(nonce, total_length, count)
+
+
+def _unpack_header(value):
+    """
+    Return (nonce, total_length, segment_count) if value is the header of a
+    segmented value, and None otherwise
+    """
+    if value is None \
+            or len(value) != len(SEGMENT_MAGIC) + SEGMENT_HEADER.size \
+            or bytes(value[:len(SEGMENT_MAGIC)]) != SEGMENT_MAGIC:
+        return None
+    return SEGMENT_HEADER.unpack(bytes(value[len(SEGMENT_MAGIC):]))
+
+
+def _iter_segments(txn, segment_db, _id, header):
+    nonce, _, count = header
+    for i in range(count):
+        segment = txn.get(_segment_key(_id, nonce, i), db=segment_db)
+        if segment is None:
+            raise IOError(
+                'segment {i} of {count} for {_id} is missing'
+                .format(**locals()))
+        yield segment
+
+
+def _delete_segments(txn, segment_db, _id, value):
+    header = _unpack_header(value)
+    if header is None:
+        return
+    nonce, _, count = header
+    for i in range(count):
+        txn.delete(_segment_key(_id, nonce, i), db=segment_db)
+
+
+def _store(txn, db, segment_db, _id, value):
+    """
+    Store value under _id, or delete _id if value is None, removing the
+    segments of any segmented value being replaced
+    """
+    _delete_segments(txn, segment_db, _id, txn.get(_id, db=db))
+    if value is None:
+        txn.delete(_id, db=db)
+    else:
+        txn.put(_id, value, db=db)
+
+
 class WriteStream(object):
-    def __init__(self, key, env, db_getter=None):
+    """
+    Writes a single value.  Once more than `segment_size` bytes are pending,
+    they're committed as a segment in a write transaction of their own, and
+    the header that makes the segments reachable is only written when the
+    stream is closed.  So a large value costs one commit per segment, and a
+    stream that is never closed (e.g. because the process died) leaves its
+    segments behind, until `LmdbDatabase.sweep_segments()` removes them
+    """
+
+    def __init__(
+            self,
+            key,
+            env,
+            db_getter=None,
+            segment_db=None,
+            segment_size=1024 * 1024,
+            batch=None):
         self.key = key
         self.db_getter = db_getter
         self.env = env
-        self.buf = BytesIO()
+        self.segment_db = segment_db
+        self.segment_size = segment_size
+        self.batch = batch
+        self.buf = bytearray()
+        self._nonce = uuid4().bytes
+        self._segment_count = 0
+        self._total_length = 0
+        self._id = None
+        self._db = None
+        self._closed = False
 
     def __enter__(self):
         return self
@@ -31,33 +130,281 @@ class WriteStream(object):
     def __exit__(self, t, value, traceback):
         self.close()
 
+    def _resolve_db(self):
+        if self._db is None:
+            _id, self._db = self.db_getter(self.key)
+            self._id = to_bytes(_id)
+        return self._id, self._db
+
+    def _flush_segment(self):
+        _id, _ = self._resolve_db()
+        key = _segment_key(_id, self._nonce, self._segment_count)
+        with self.env.begin(write=True) as txn:
+            txn.put(key, self.buf, db=self.segment_db)
+        self._segment_count += 1
+        del self.buf[:]
+
     def close(self):
-        _id, db = self.db_getter(self.key)
-        self.buf.seek(0)
-        data = self.buf.read()
+        if self._closed:
+            return
+        self._closed = True
+
+        if self.buf and self._segment_count:
+            self._flush_segment()
 
-        if not data:
+        if not self._total_length:
             return
 
-        with self.env.begin(db, write=True) as txn:
-            txn.put(to_bytes(_id.encode()), data, db=db)
+        _id, db = self._resolve_db()
+
+        if self._segment_count:
+            value = _pack_header(
+                self._nonce, self._total_length, self._segment_count)
+        else:
+            value = self.buf
+
+        if self.batch is not None:
+            self.batch._put(self.key, _id, db, value)
+        else:
+            with self.env.begin(db, write=True, buffers=True) as txn:
+                _store(txn, db, self.segment_db, _id, value)
+
+        self.buf = bytearray()
 
     def write(self, data):
-        self.buf.write(to_bytes(data))
+        data = to_bytes(data)
+        self.buf.extend(data)
+        self._total_length += len(data)
+        if self.segment_db is not None and len(self.buf) >= self.segment_size:
+            self._flush_segment()
+
+
+class LmdbWriteBatch(WriteBatch):
+    """
+    Groups the values written through it into a single write transaction,
+    committed when the batch exits, or earlier, once more than `max_bytes` of
+    values are pending.  Large values are still written segment by segment as
+    they arrive; only their headers wait for the commit.  Values written
+    through the batch can't be read until they're committed, so callbacks
+    registered with `after_commit()` are held until then, too
+    """
+
+    def __init__(self, database, max_bytes=64 * 1024 * 1024):
+        super(LmdbWriteBatch, self).__init__(database)
+        self.max_bytes = max_bytes
+        self.commits = 0
+        # maps each key to its most recent value, or None if it was deleted
+        self._pending = OrderedDict()
+        self._pending_bytes = 0
+        self._callbacks = []
+        self._lock = Lock()
+
+    def write_stream(self, key, content_type):
+        return self.database.write_stream(key, content_type, batch=self)
+
+    def _put(self, key, _id, db, value):
+        previous = None
+        with self._lock:
+            try:
+                _, _, previous = self._pending.pop(key)
+                self._pending_bytes -= len(previous or b'')
+            except KeyError:
+                pass
+            self._pending[key] = (_id, db, value)
+            self._pending_bytes += len(value or b'')
+            full = self._pending_bytes >= self.max_bytes
+
+        if _unpack_header(previous) is not None:
+            # the replaced value was never committed, so nothing else will
+            # ever remove its segments
+            with self.database.env.begin(write=True) as txn:
+                _delete_segments(txn, self.database.segment_db, _id, previous)
+
+        if full:
+            self.commit()
+
+    def _pending_nonces(self):
+        """
+        Return the nonces of segmented values waiting to be committed
+        """
+        with self._lock:
+            headers = [
+                _unpack_header(value)
+                for _, _, value in self._pending.values()]
+        return set(header[0] for header in headers if header is not None)
+
+    def __contains__(self, key):
+        with self._lock:
+            try:
+                _, _, value = self._pending[to_bytes(key)]
+                return value is not None
+            except KeyError:
+                pass
+        return key in self.database
+
+    def __delitem__(self, key):
+        try:
+            _id, db = self.database._get_read_db(to_bytes(key))
+        except KeyError:
+            return
+        self._put(to_bytes(key), to_bytes(_id), db, None)
+
+    def after_commit(self, callback):
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def commit(self):
+        # hold the lock throughout, so that concurrent commits can't apply
+        # writes to the same key out of order
+        with self._lock:
+            if self._pending:
+                with self.database.env.begin(write=True, buffers=True) as txn:
+                    for _id, db, value in self._pending.values():
+                        _store(txn, db, self.database.segment_db, _id, value)
+                self._pending = OrderedDict()
+                self._pending_bytes = 0
+                self.commits += 1
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            callback()
+
+
+class ReadStream(io.RawIOBase):
+    """
+    A read-only, seekable file-like object over a single stored value, whose
+    `view()` exposes the value as a memoryview without copying it.
+
+    Streams returned by `LmdbDatabase.read_view()` are pinned: they hold a
+    read transaction open until they're closed, and their views point into
+    the memory map, so they're only valid until the stream, or the database,
+    is closed.  Anything that must outlive them has to be copied out
+    """
+
+    def __init__(self, value, txn=None):
+        super(ReadStream, self).__init__()
+        self._buf = value
+        self._txn = txn
+        self._pos = 0
+
+    def __len__(self):
+        return len(self._buf)
+
+    @property
+    def pinned(self):
+        """
+        True if this stream's views point into the memory map
+        """
+        return self._txn is not None
+
+    def _check_closed(self):
+        if self.closed:
+            raise ValueError('I/O operation on closed stream')
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def view(self):
+        """
+        Return the entire value as a read-only memoryview, without copying it.
+        The views of pinned streams are only valid until they're closed
+        """
+        self._check_closed()
+        return self._buf
+
+    def read(self, size=-1):
+        self._check_closed()
+        start = min(self._pos, len(self._buf))
+        stop = len(self._buf) if size is None or size < 0 \
+            else min(start + size, len(self._buf))
+        self._pos = max(self._pos, stop)
+        return bytes(self._buf[start: stop])
+
+    def readinto(self, b):
+        self._check_closed()
+        data = self._buf[self._pos: self._pos + len(b)]
+        n = len(data)
+        b[:n] = data
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._check_closed()
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == os.SEEK_END:
+            pos = len(self._buf) + offset
+        else:
+            raise ValueError('invalid whence ({whence})'.format(**locals()))
+
+        if pos < 0:
+            raise ValueError('negative seek position {pos}'.format(**locals()))
+
+        self._pos = pos
+        return pos
+
+    def tell(self):
+        self._check_closed()
+        return self._pos
+
+    def close(self):
+        if self.closed:
+            return
+        self._buf.release()
+        if self._txn is not None:
+            try:
+                self._txn.abort()
+            except lmdb.Error:
+                # the environment has already been closed
+                pass
+            self._txn = None
+        super(ReadStream, self).close()
 
 
 class LmdbDatabase(Database):
-    def __init__(self, path, map_size=1000000000, key_builder=None):
+    def __init__(
+            self,
+            path,
+            map_size=1000000000,
+            key_builder=None,
+            segment_size=1024 * 1024,
+            max_dbs=10):
         super(LmdbDatabase, self).__init__(key_builder=key_builder)
         self.path = path
-        self.env = lmdb.open(
+        self.map_size = map_size
+        self.max_dbs = max_dbs
+        self.segment_size = segment_size
+        self._inherited_envs = []
+        self._streams = WeakSet()
+        self._writing = WeakSet()
+        self._batches = WeakSet()
+        self.env = self._open()
+        self.dbs = dict()
+
+    def _open(self):
+        env = lmdb.open(
             self.path,
-            max_dbs=10,
-            map_size=map_size,
+            # one database per stored feature, plus one for segments
+            max_dbs=self.max_dbs + 1,
+            map_size=self.map_size,
             writemap=True,
             map_async=True,
             metasync=True)
-        self.env.reader_check()
+        env.reader_check()
+        self.segment_db = env.open_db(SEGMENT_DB)
+        return env
+
+    def reopen(self):
+        # an environment must not be used after a fork, so open a new one.
+        # Closing the inherited environment isn't safe either, so hang on to a
+        # reference to keep it from being closed when it's garbage collected
+        self._inherited_envs.append(self.env)
+        self.env = self._open()
         self.dbs = dict()
 
     def __enter__(self):
@@ -67,6 +414,10 @@ class LmdbDatabase(Database):
         self.close()
 
     def close(self):
+        # open read streams point into the memory map, so close them before
+        # it's unmapped
+        for stream in list(self._streams):
+            stream.close()
         self.env.close()
 
     def __del__(self):
@@ -76,6 +427,8 @@ class LmdbDatabase(Database):
         with self.env.begin() as txn:
             cursor = txn.cursor()
             for feature in cursor.iternext(keys=True, values=False):
+                if feature == SEGMENT_DB:
+                    continue
                 self.dbs[feature] = self.env.open_db(feature)
 
     def _get_db(self, key):
@@ -103,20 +456,104 @@ class LmdbDatabase(Database):
             except lmdb.NotFoundError:
                 raise KeyError(key)
 
-    def write_stream(self, key, content_type):
-        return WriteStream(key.encode(), self.env, self._get_db)
+    def write_stream(self, key, content_type, batch=None):
+        stream = WriteStream(
+            key.encode(),
+            self.env,
+            self._get_db,
+            segment_db=self.segment_db,
+            segment_size=self.segment_size,
+            batch=batch)
+        self._writing.add(stream)
+        return stream
+
+    def sweep_segments(self):
+        """
+        Delete segments that no stored value refers to, e.g., those left
+        behind when a process died part way through writing a large value, and
+        return the number deleted.  Segments of streams still open in this
+        process, and of values waiting in its uncommitted batches, are kept,
+        but those being written by other processes can't be told apart from
+        abandoned ones, so this must not run while other processes are writing
+        """
+        writing = set(stream._nonce for stream in list(self._writing))
+        for batch in list(self._batches):
+            writing.update(batch._pending_nonces())
+        self._init_db_cache()
+
+        with self.env.begin(write=True, buffers=True) as txn:
+            referenced = set()
+            for db in self.dbs.values():
+                cursor = txn.cursor(db)
+                for _id, value in cursor.iternext(keys=True, values=True):
+                    header = _unpack_header(value)
+                    if header is not None:
+                        referenced.add((bytes(_id), header[0]))
+
+            cursor = txn.cursor(self.segment_db)
+            orphaned = []
+            for key in cursor.iternext(keys=True, values=False):
+                _id, nonce = _parse_segment_key(key)
+                if nonce not in writing and (_id, nonce) not in referenced:
+                    orphaned.append(bytes(key))
+
+            for key in orphaned:
+                txn.delete(key, db=self.segment_db)
+
+        return len(orphaned)
+
+    def batch(self, max_bytes=64 * 1024 * 1024):
+        batch = LmdbWriteBatch(self, max_bytes=max_bytes)
+        self._batches.add(batch)
+        return batch
+
+    def _read(self, txn, key, _id, db):
+        buf = txn.get(_id, db=db)
+        if buf is None:
+            raise KeyError(key)
+
+        header = _unpack_header(buf)
+        if header is None:
+            return buf
+
+        # segments aren't contiguous in the memory map, so they must be copied
+        # into a single buffer
+        return b''.join(_iter_segments(txn, self.segment_db, _id, header))
 
     def read_stream(self, key):
+        """
+        Return a stream over a copy of the stored value, so that no read
+        transaction outlives this call
+        """
+        # databases must be opened before the transactions that read them
         _id, db = self._get_read_db(to_bytes(key))
-
         with self.env.begin(buffers=True) as txn:
-            buf = txn.get(to_bytes(_id), db=db)
-            if buf is None:
-                raise KeyError(key)
+            buf = self._read(txn, key, to_bytes(_id), db)
+            if isinstance(buf, memoryview):
+                buf = bytes(buf)
+        return ReadStream(memoryview(buf))
+
+    @contextmanager
+    def read_view(self, key):
+        """
+        Yield a pinned stream over the stored value, which reads it straight
+        from the memory map, without copying it.  The stream, and any views
+        it has handed out, are released when the context exits
+        """
+        _id, db = self._get_read_db(to_bytes(key))
+        txn = self.env.begin(buffers=True)
+        try:
+            buf = self._read(txn, key, to_bytes(_id), db)
+            stream = ReadStream(memoryview(buf), txn=txn)
+        except Exception:
+            txn.abort()
+            raise
 
-        # POSSIBLE BUG:  Is it safe to keep the buffer around after the
-        # transaction is complete?
-        return BytesIO(buf)
+        self._streams.add(stream)
+        try:
+            yield stream
+        finally:
+            stream.close()
 
     def size(self, key):
         _id, db = self._get_read_db(key)
@@ -126,7 +563,8 @@ class LmdbDatabase(Database):
             buf = txn.get(_id.encode(), db=db)
             if buf is None:
                 raise KeyError(key)
-            l = len(buf)
+            header = _unpack_header(buf)
+            l = len(buf) if header is None else header[1]
 
         return l
 
@@ -177,5 +615,5 @@ class LmdbDatabase(Database):
             _id, db = self._get_read_db(key)
         except KeyError:
             return
-        with self.env.begin(write=True) as txn:
-            txn.delete(_id, db=db)
+        with self.env.begin(write=True, buffers=True) as txn:
+            _store(txn, db, self.segment_db, to_bytes(_id), None)
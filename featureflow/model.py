@@ -1,7 +1,26 @@
 from .extractor import Graph
-from .feature import Feature
+from .feature import Feature, ComputePlan
 from .persistence import PersistenceSettings
+from .var import Var
+from .template import GraphTemplate
+from .datawriter import DataWriter
+from contextlib import ExitStack
 from random import choice
+from multiprocessing import Pool
+import time
+
+# keyword arguments consumed by `BaseModel.process()` and `aprocess()`,
+# rather than passed on to the graph
+_PROCESS_OPTIONS = frozenset([
+    'raise_if_exists',
+    'compiled',
+    'threads',
+    'max_buffer_items',
+    'max_buffer_bytes',
+    'stats',
+    'trace',
+    'features',
+    'batch'])
 
 
 class MetaModel(type):
@@ -57,6 +76,43 @@ class ModelExistsError(Exception):
     pass
 
 
+class ProcessResult(object):
+    """
+    The id of a document processed by `BaseModel.process_many`, along with the
+    wall-clock time, in seconds, it took to process
+    """
+
+    def __init__(self, _id, seconds):
+        super(ProcessResult, self).__init__()
+        self._id = _id
+        self.seconds = seconds
+
+    def __repr__(self):
+        return '{cls}(_id={_id}, seconds={seconds})'.format(
+            cls=self.__class__.__name__, **self.__dict__)
+
+    @property
+    def documents_per_second(self):
+        return 1 / self.seconds if self.seconds else float('inf')
+
+
+# the model class processed by the worker processes of process_many
+_worker_model = None
+
+
+def _init_worker(cls):
+    global _worker_model
+    _worker_model = cls
+    for database in cls._databases():
+        database.reopen()
+
+
+def _process_document(kwargs):
+    start = time.time()
+    _id = _worker_model.process(**kwargs)
+    return ProcessResult(_id, time.time() - start)
+
+
 class BaseModel(object, metaclass=MetaModel):
     def __init__(self, _id=None):
         super(BaseModel, self).__init__()
@@ -75,6 +131,72 @@ class BaseModel(object, metaclass=MetaModel):
         setattr(self, key, decoded)
         return decoded
 
+    def compute(self, features, stats=None, trace=None):
+        """
+        Read or compute several features of this document at once, returning
+        a dictionary mapping each feature's key to its decoded value.
+
+        Unstored features are computed together by a single graph, so work
+        they have in common, including reading and decoding shared stored
+        features, is only done once
+
+        Args:
+            features (iterable): Feature names or `Feature` instances
+            stats (GraphStats): Optionally, collect per-node statistics
+            trace (TraceRecorder): Optionally, record a trace of the
+                computation
+        """
+        cls = self.__class__
+        BaseModel._ensure_persistence_settings(cls)
+
+        results = dict()
+        missing = []
+        caches = dict()
+        for feature in cls._select(features):
+            key = feature.key
+            if key in self.__dict__:
+                results[key] = self.__dict__[key]
+                continue
+
+            cache = feature.feature_cache(cls)
+            if cache is not None:
+                cache_key = feature.cache_key(self._id, cls)
+                try:
+                    results[key] = cache[cache_key]
+                    continue
+                except KeyError:
+                    caches[key] = (cache, cache_key)
+
+            try:
+                results[key] = feature._decode_stored(
+                    self._id, feature.decoder, cls)
+            except KeyError:
+                missing.append(feature)
+
+        if missing:
+            plan = ComputePlan(missing, self._id, cls)
+            if not plan.can_compute:
+                keys = [f.key for f in missing if not plan._can_compute(f)]
+                raise AttributeError('%s cannot be computed' % keys)
+
+            streams = plan.run(stats=stats, trace=trace)
+            for feature in missing:
+                stream = streams[feature.key]
+                if stream is None:
+                    stream = feature.reader(self._id, feature.key, cls)
+                stream.seek(0)
+                results[feature.key] = feature.decoder(stream)
+
+        for key, value in results.items():
+            setattr(self, key, value)
+            try:
+                cache, cache_key = caches[key]
+                cache.add(cache_key, value)
+            except KeyError:
+                pass
+
+        return results
+
     @classmethod
     def _build_extractor(cls, _id, **kwargs):
         g = Graph()
@@ -82,6 +204,43 @@ class BaseModel(object, metaclass=MetaModel):
             feature._build_extractor(_id, g, cls, **kwargs)
         return g
 
+    @classmethod
+    def graph_template(cls):
+        """
+        Return the `GraphTemplate` used to build a graph for each document
+        processed, building it the first time it's needed.  Each model class
+        has its own template, which is never inherited by subclasses
+        """
+        try:
+            return cls.__dict__['_graph_template']
+        except KeyError:
+            pass
+
+        cls._check_argument_names()
+        template = GraphTemplate(cls)
+        cls._graph_template = template
+        return template
+
+    @classmethod
+    def invalidate_graph_template(cls):
+        """
+        Discard this model's `GraphTemplate`, so that it will be rebuilt the
+        next time a document is processed
+        """
+        try:
+            delattr(cls, '_graph_template')
+        except AttributeError:
+            pass
+
+    @classmethod
+    def invalidate_versions(cls):
+        """
+        Discard the cached version identifiers of all this model's features,
+        e.g. after a feature's definition has been changed
+        """
+        for feature in cls.features.values():
+            feature.invalidate_version()
+
     @classmethod
     def random(cls):
         all_ids = list(cls.database.iter_ids())
@@ -104,8 +263,35 @@ class BaseModel(object, metaclass=MetaModel):
         return feature_key in cls.database
 
     @classmethod
-    def process(cls, raise_if_exists=False, **kwargs):
+    def _argument_names(cls):
+        """
+        Return the names of the keyword arguments the model's graph is
+        processed with:  the keys of its root features, and the names of any
+        `Var`s its features are bound to
+        """
+        names = set()
+        for feature in cls.iter_features():
+            if feature.is_root:
+                names.add(feature.key)
+            for k, v in feature.extractor_args.items():
+                if isinstance(v, Var) and v.name == k:
+                    names.add(k)
+        return names
+
+    @classmethod
+    def _check_argument_names(cls):
+        collisions = cls._argument_names() & _PROCESS_OPTIONS
+        if collisions:
+            raise ValueError(
+                '{names} can\'t be used as root feature or Var names, since '
+                'process() reserves them for its own options'
+                .format(names=', '.join(sorted(collisions))))
+
+    @classmethod
+    def _prepare(cls, raise_if_exists, kwargs, features=None):
         BaseModel._ensure_persistence_settings(cls)
+        # names are checked once, when the template is first built
+        template = cls.graph_template()
         _id = cls.id_provider.new_id(**kwargs)
 
         if raise_if_exists and cls.exists(_id):
@@ -123,8 +309,222 @@ class BaseModel(object, metaclass=MetaModel):
         except KeyError:
             pass
 
-        graph = cls._build_extractor(_id, **kwargs)
-        graph.remove_dead_nodes(iter(list(cls.features.values())))
+        if features is not None:
+            return cls._prepare_selection(_id, features, kwargs)
+
+        graph = template.build(_id, **kwargs)
+        return _id, graph, kwargs
+
+    @classmethod
+    def _select(cls, features):
+        return [
+            f if isinstance(f, Feature) else cls.features[f] for f in features]
+
+    @classmethod
+    def _prepare_selection(cls, _id, features, kwargs):
+        # build a graph that computes only the selected stored features, and
+        # any missing features they depend on, reading those features that
+        # are already stored from the database
+        selected = cls._select(features)
+        for feature in selected:
+            if not feature.store:
+                raise ValueError(
+                    '{key} must have store=True'.format(key=feature.key))
+
+        plan = ComputePlan(selected, _id, cls)
+        plan.targets = [f for f in selected if not plan.is_stored(f)]
+        graph, _ = plan.build(**kwargs)
+        return _id, graph, plan.arguments(graph, **kwargs)
+
+    @classmethod
+    def _invalidate_cached(cls, _id):
+        # processing a document may overwrite stored features whose decoded
+        # values have already been cached
+        caches = dict()
+        for feature in cls.iter_features():
+            cache = feature.feature_cache(cls)
+            if cache is not None:
+                caches[id(cache)] = cache
+        for cache in caches.values():
+            cache.invalidate(_id)
+
+    @classmethod
+    def _write_batches(cls, graph, _id, batch=None):
+        """
+        Route every data writer in the graph through a `WriteBatch` for its
+        database, and return a context manager that commits those batches.
+        Writers for `batch.database` use `batch` itself, which is left for
+        the caller to commit.  Cached values of the document are invalidated
+        once each batch commits
+        """
+        stack = ExitStack()
+        batches = dict()
+        if batch is not None:
+            batches[id(batch.database)] = batch
+
+        for node in graph.values():
+            if not isinstance(node, DataWriter):
+                continue
+            database = node.database
+            try:
+                node.database = batches[id(database)]
+            except KeyError:
+                node.database = stack.enter_context(database.batch())
+                batches[id(database)] = node.database
+
+        # values read, and cached, while the batches were pending are stale
+        # once they commit.  This runs before the batches exit, so that the
+        # callbacks are in place when they commit
+        def invalidate_after_commit():
+            for b in batches.values():
+                b.after_commit(lambda: cls._invalidate_cached(_id))
+
+        stack.callback(invalidate_after_commit)
+        return stack
+
+    @classmethod
+    def process(
+            cls,
+            raise_if_exists=False,
+            compiled=False,
+            threads=None,
+            max_buffer_items=None,
+            max_buffer_bytes=None,
+            stats=None,
+            trace=None,
+            features=None,
+            batch=None,
+            **kwargs):
+        """
+        Process a single document, computing and storing all of its stored
+        features, or only those named in `features`.  When `features` is
+        given, any of those features already stored for the document are
+        skipped, and stored features they depend on are read from the
+        database, rather than recomputed.
+
+        All of the document's stored features are written through a single
+        `WriteBatch` per database, and committed together once processing
+        is done.  To share one commit between many documents, e.g. during a
+        bulk ingest, pass a batch opened with `database.batch()`, which the
+        caller is then responsible for committing.
+
+        Since these options are keyword arguments of `process()` itself, a
+        model whose root features or `Var`s share their names can't be
+        processed, and raises a `ValueError`
+        """
+        _id, graph, graph_args = cls._prepare(
+            raise_if_exists, kwargs, features)
+
+        if stats is not None:
+            graph.instrument()
+
+        if trace is not None:
+            graph.trace(trace)
+
+        runner = graph
+        bounded = \
+            max_buffer_items is not None or max_buffer_bytes is not None
+        if compiled or threads or bounded:
+            runner = graph.compile(
+                threads=threads,
+                max_buffer_items=max_buffer_items,
+                max_buffer_bytes=max_buffer_bytes)
+
+        try:
+            with cls._write_batches(graph, _id, batch):
+                if trace is None:
+                    runner.process(**graph_args)
+                else:
+                    with trace.span(cls.__name__, 'document', _id=str(_id)):
+                        runner.process(**graph_args)
+        finally:
+            cls._invalidate_cached(_id)
+
+        if stats is not None:
+            stats.merge(graph.stats())
+
+        return _id
+
+    @classmethod
+    async def aprocess(
+            cls,
+            raise_if_exists=False,
+            stats=None,
+            trace=None,
+            features=None,
+            batch=None,
+            **kwargs):
+        """
+        Process a single document asynchronously, so that many documents can
+        be in flight at once in a single process.  See `Graph.aprocess()`,
+        and `process()` for the meaning of `batch`
+        """
+        _id, graph, graph_args = cls._prepare(
+            raise_if_exists, kwargs, features)
+
+        if stats is not None:
+            graph.instrument()
+
+        if trace is not None:
+            graph.trace(trace)
+
+        try:
+            with cls._write_batches(graph, _id, batch):
+                await graph.aprocess(**graph_args)
+        finally:
+            cls._invalidate_cached(_id)
+
+        if stats is not None:
+            stats.merge(graph.stats())
 
-        graph.process(**kwargs)
         return _id
+
+    @classmethod
+    def _databases(cls):
+        databases = dict()
+        databases[id(cls.database)] = cls.database
+        for feature in cls.iter_features():
+            database = feature.database(cls)
+            databases[id(database)] = database
+        return list(databases.values())
+
+    @classmethod
+    def process_many(cls, documents, workers=None, chunksize=1, **kwargs):
+        """
+        Process many documents in parallel, using a pool of worker processes,
+        each of which re-opens its own database handles
+
+        Args:
+            documents (iterable): An iterable of dictionaries, each containing
+                the keyword arguments that would be passed to `process()` for a
+                single document
+            workers (int): The number of worker processes.  Defaults to the
+                number of CPUs
+            chunksize (int): The number of documents sent to a worker at once
+            kwargs: Additional keyword arguments, e.g. `compiled`, passed to
+                `process()` for every document
+
+        Returns:
+            A generator of `ProcessResult`, in the order that documents finish
+            processing
+
+        Raises:
+            ValueError: if any of the model's databases, e.g., an
+                `InMemoryDatabase`, can't be shared with worker processes,
+                since documents they store would never be seen by this one
+        """
+        BaseModel._ensure_persistence_settings(cls)
+        for database in cls._databases():
+            if not database.shared_across_processes:
+                raise ValueError(
+                    '{database} can\'t be shared with worker processes'
+                    .format(database=database.__class__.__name__))
+        documents = (dict(kwargs, **document) for document in documents)
+        return cls._process_many(documents, workers, chunksize)
+
+    @classmethod
+    def _process_many(cls, documents, workers, chunksize):
+        with Pool(workers, initializer=_init_worker, initargs=(cls,)) as pool:
+            for result in pool.imap_unordered(
+                    _process_document, documents, chunksize=chunksize):
+                yield result
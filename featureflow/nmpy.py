@@ -3,11 +3,12 @@ import numpy as np
 # that the symbol "numpy" must be defined when we call eval().  This is a
 # terrible kludge; we should not be using eval() at all.
 import numpy
-from .extractor import Node
+from .extractor import Node, NotEnoughData
 from .feature import Feature
 from .util import chunked
 from .decoder import Decoder
 import struct
+import os
 
 
 class NumpyMetaData(object):
@@ -106,7 +107,41 @@ def _np_from_buffer(b, shape, dtype):
     return np.frombuffer(b, dtype=dtype).reshape(tuple(int(x) for x in shape))
 
 
+def _remaining(flo):
+    """
+    Return the unread bytes of a file-like object, as a zero-copy view if the
+    stream exposes its underlying memory via `view()`, or by reading them
+    otherwise.  The views of pinned streams are only valid while the stream is
+    open, so arrays built over them must be copied before they're handed to
+    the caller
+    """
+    if not hasattr(flo, 'view'):
+        return flo.read()
+
+    pos = flo.tell()
+    flo.seek(0, os.SEEK_END)
+    return flo.view()[pos:]
+
+
+def _chunks(flo, chunksize):
+    if not hasattr(flo, 'view'):
+        for chunk in chunked(flo, chunksize):
+            yield chunk
+        return
+
+    remaining = _remaining(flo)
+    for i in range(0, len(remaining), chunksize):
+        yield remaining[i: i + chunksize]
+
+
+def _decoded(arr, flo):
+    # arrays decoded from a pinned stream's memory must not outlive the stream
+    return arr.copy() if getattr(flo, 'pinned', False) else arr
+
+
 class BaseNumpyDecoder(Decoder):
+    copies = True
+
     def __init__(self):
         super(BaseNumpyDecoder, self).__init__()
 
@@ -118,11 +153,11 @@ class BaseNumpyDecoder(Decoder):
 
     def __call__(self, flo):
         metadata, bytes_read = self._unpack_metadata(flo)
-        leftovers = flo.read()
+        leftovers = _remaining(flo)
         leftover_bytes = len(leftovers)
         first_dim = leftover_bytes / metadata.totalsize
         dim = (first_dim,) + metadata.shape
-        raw = _np_from_buffer(leftovers, dim, metadata.dtype)
+        raw = _decoded(_np_from_buffer(leftovers, dim, metadata.dtype), flo)
         return self._wrap_array(raw, metadata)
 
     def __iter__(self, flo):
@@ -148,12 +183,12 @@ class StreamingNumpyDecoder(Decoder):
         chunk_size = int(example_size * self.n_examples)
         count = 0
 
-        for chunk in chunked(flo, chunk_size):
+        for chunk in _chunks(flo, chunk_size):
             n_examples = len(chunk) // example_size
-            yield _np_from_buffer(
+            yield _decoded(_np_from_buffer(
                     chunk,
                     (n_examples,) + metadata.shape,
-                    metadata.dtype)
+                    metadata.dtype), flo)
             count += 1
 
         if count == 0:
@@ -181,3 +216,170 @@ class NumpyFeature(Feature):
                 decoder=decoder,
                 key=key,
                 **extractor_args)
+
+
+class ArrayBuffer(object):
+    """
+    A growable buffer of numpy array rows, i.e., examples along the first
+    axis.  Storage is preallocated and doubled as needed, and consuming rows
+    from the front of the buffer just advances an offset, so appending and
+    consuming are both amortized constant time per row.
+
+    If `compact` is False, rows are never moved within existing storage, so
+    views returned by `view()` stay valid after later appends, at the cost of
+    allocating fresh storage whenever the current storage fills up
+    """
+
+    def __init__(self, capacity=1024, dtype=None, compact=True):
+        super(ArrayBuffer, self).__init__()
+        self._capacity = capacity
+        self._dtype = dtype
+        self._compact = compact
+        self._array = None
+        self._start = 0
+        self._stop = 0
+
+    def __len__(self):
+        return self._stop - self._start
+
+    @property
+    def capacity(self):
+        return 0 if self._array is None else len(self._array)
+
+    def _reserve(self, n):
+        """
+        Make room for n more rows after the last buffered row, either by
+        moving buffered rows to the front of the array, or by allocating a
+        larger one
+        """
+        size = len(self)
+        needed = size + n
+        capacity = len(self._array)
+
+        if self._stop + n <= capacity:
+            return
+
+        if needed <= capacity // 2 and self._compact:
+            self._array[:size] = self._array[self._start:self._stop]
+        else:
+            if needed > capacity // 2:
+                capacity = max(capacity * 2, needed)
+            array = np.empty(
+                (capacity,) + self._array.shape[1:], dtype=self._array.dtype)
+            array[:size] = self._array[self._start:self._stop]
+            self._array = array
+
+        self._start = 0
+        self._stop = size
+
+    def append(self, data):
+        data = np.asarray(data)
+        n = len(data)
+
+        if self._array is None:
+            self._array = np.empty(
+                (max(self._capacity, n),) + data.shape[1:],
+                dtype=self._dtype or data.dtype)
+        else:
+            self._reserve(n)
+
+        self._array[self._stop: self._stop + n] = data
+        self._stop += n
+
+    def view(self):
+        """
+        Return a zero-copy view of the buffered rows.  The view is only valid
+        until the buffer is next appended to
+        """
+        if self._array is None:
+            return np.empty((0,), dtype=self._dtype or np.float64)
+        return self._array[self._start: self._stop]
+
+    def consume(self, n=None):
+        """
+        Remove and return (as a copy) the first n rows of the buffer, or all
+        of them if n is not specified
+        """
+        n = len(self) if n is None else min(n, len(self))
+        data = self.view()[:n].copy()
+        self.discard(n)
+        return data
+
+    def discard(self, n):
+        """
+        Remove the first n rows of the buffer without copying them
+        """
+        self._start += min(n, len(self))
+        if self._start == self._stop and self._compact:
+            self._start = self._stop = 0
+
+    def clear(self):
+        self._start = self._stop = 0
+
+
+class WindowedNode(Node):
+    """
+    Slide a window of `size` examples over the input, advancing by `step`
+    examples each time.  Incoming examples are kept in a preallocated buffer,
+    and all the complete windows available after each chunk are passed to
+    `_process()` as a single strided array of shape `(n_windows, size, ...)`
+    that is a view into the buffer, rather than a copy.
+
+    Once the input is exhausted, leftover examples not covered by any
+    window are zero-padded into one final window, unless `pad` is False
+    """
+
+    def __init__(self, size, step=None, pad=True, capacity=None, needs=None):
+        super(WindowedNode, self).__init__(needs=needs)
+        self._size = size
+        self._step = step or size
+        self._pad = pad
+        # storage is never compacted in place, so windows that have been
+        # pushed downstream stay valid after subsequent chunks arrive
+        self._cache = ArrayBuffer(
+            capacity=capacity or max(self._size * 4, 1024), compact=False)
+        # examples that fall between windows when step is larger than size
+        self._skip = 0
+        self._windows_emitted = False
+
+    def _enqueue(self, data, pusher):
+        if self._skip:
+            skipped = min(self._skip, len(data))
+            data = data[skipped:]
+            self._skip -= skipped
+        self._cache.append(data)
+
+    def _windows(self, data, n_windows):
+        stride = data.strides[0]
+        return np.lib.stride_tricks.as_strided(
+            data,
+            shape=(n_windows, self._size) + data.shape[1:],
+            strides=(stride * self._step, stride) + data.strides[1:],
+            writeable=False)
+
+    def _dequeue(self):
+        available = len(self._cache)
+        if available < self._size:
+            raise NotEnoughData()
+
+        n_windows = 1 + ((available - self._size) // self._step)
+        windows = self._windows(self._cache.view(), n_windows)
+
+        advance = n_windows * self._step
+        self._skip = max(0, advance - available)
+        self._cache.discard(advance)
+        self._windows_emitted = True
+        return windows
+
+    def _last_chunk(self):
+        leftover = self._cache.view()
+        covered = \
+            max(0, self._size - self._step) if self._windows_emitted else 0
+
+        if not self._pad or len(leftover) <= covered:
+            return iter(())
+
+        window = np.zeros(
+            (1, self._size) + leftover.shape[1:], dtype=leftover.dtype)
+        window[0, :len(leftover)] = leftover
+        return self._process(window)
@@ -5,17 +5,26 @@ class PersistenceSettings(object):
     id_provider = UuidProvider()
     key_builder = StringDelimitedKeyBuilder()
     database = InMemoryDatabase(key_builder=key_builder)
+    # an optional FeatureCache, shared by all models using these settings
+    feature_cache = None
 
     @classmethod
-    def clone(cls, id_provider=None, key_builder=None, database=None):
+    def clone(
+            cls,
+            id_provider=None,
+            key_builder=None,
+            database=None,
+            feature_cache=None):
         ip = id_provider
         kb = key_builder
         db = database
+        fc = feature_cache
 
         class Settings(PersistenceSettings):
             id_provider = ip or cls.id_provider
             key_builder = kb or cls.key_builder
             database = db or cls.database
+            feature_cache = cls.feature_cache if fc is None else fc
 
         return Settings
 
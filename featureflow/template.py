@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from .extractor import Graph, dead_keys
+
+
+class NodeRecipe(object):
+    """
+    Everything needed to instantiate a single node of a graph, other than the
+    document id and `Var` values, which are bound per document.  Features
+    describe the nodes they need as recipes, which are used both to build a
+    graph from scratch, and by `GraphTemplate`
+    """
+
+    def __init__(
+            self,
+            key,
+            cls,
+            needs,
+            args=None,
+            variables=None,
+            binds_id=False,
+            bind=None,
+            reader=None):
+
+        super(NodeRecipe, self).__init__()
+        self.key = key
+        self.cls = cls
+        # either a single key, or an ordered mapping from dependency names to
+        # keys
+        self.needs = needs
+        self.args = args or dict()
+        self.variables = variables or []
+        self.binds_id = binds_id
+        # a callable returning any remaining arguments that must be computed
+        # for each document
+        self.bind = bind
+        # a callable returning the stream a node reads from, for a document
+        self.reader = reader
+
+    @property
+    def dependencies(self):
+        if isinstance(self.needs, dict):
+            return list(self.needs.values())
+        return [self.needs]
+
+    def build(self, graph, _id, kwargs):
+        if isinstance(self.needs, dict):
+            needs = OrderedDict(
+                (k, graph[v]) for k, v in self.needs.items())
+        else:
+            needs = graph[self.needs]
+
+        args = dict(self.args)
+        for k in self.variables:
+            try:
+                args[k] = kwargs[k]
+            except KeyError:
+                raise ValueError('{k} is a Var, but it was not provided'
+                                 .format(**locals()))
+
+        if self.binds_id:
+            args['_id'] = _id
+
+        if self.bind is not None:
+            args.update(self.bind())
+
+        node = self.cls(needs=needs, **args)
+
+        if self.reader is not None:
+            node._reader = self.reader(_id)
+
+        return node
+
+
+class GraphTemplate(object):
+    """
+    A reusable recipe for the graph that `BaseModel.process` builds for every
+    document.
+
+    The shape of the graph, the arguments of each node and the pruning of dead
+    nodes are all worked out once, when the template is built, so that
+    building a graph for a new document only involves instantiating nodes, and
+    binding the document id and `Var` values.
+    """
+
+    def __init__(self, model):
+        super(GraphTemplate, self).__init__()
+        self.model = model
+        self._recipes = OrderedDict()
+        for feature in model.features.values():
+            self._add_feature(feature)
+
+        unstored = set(f.key for f in model.features.values() if not f.store)
+        dependencies = dict(
+            (k, r.dependencies) for k, r in self._recipes.items())
+        for key in dead_keys(dependencies, lambda k: k in unstored):
+            del self._recipes[key]
+
+    def __len__(self):
+        return len(self._recipes)
+
+    def __contains__(self, key):
+        return key in self._recipes
+
+    def _add_feature(self, feature):
+        if feature.key in self._recipes:
+            return
+
+        for f in feature.needs.values():
+            self._add_feature(f)
+
+        for recipe in feature._recipes(self.model):
+            self._recipes[recipe.key] = recipe
+
+    def build(self, _id, **kwargs):
+        """
+        Build a fresh graph for a single document
+        """
+        graph = Graph()
+        for key, recipe in self._recipes.items():
+            graph[key] = recipe.build(graph, _id, kwargs)
+        return graph
@@ -0,0 +1,206 @@
+import unittest2
+from .buffers import ByteBuffer, TextBuffer, BufferedNode
+from .extractor import Graph, Node, NotEnoughData
+from .bytestream import BytesWithTotalLength
+from .test_integration import TextStream, data_source
+
+
+class Collect(Node):
+    def __init__(self, needs=None):
+        super(Collect, self).__init__(needs=needs)
+        self.collected = []
+
+    def _process(self, data):
+        self.collected.append(data)
+        yield data
+
+
+class SpaceTokenizer(BufferedNode):
+    def __init__(self, needs=None):
+        super(SpaceTokenizer, self).__init__(needs=needs)
+
+    def _finalize(self, pusher):
+        self._cache.append(b' ')
+
+    def _take(self, buf):
+        last_index = buf.rfind(b' ')
+        if last_index == -1:
+            raise NotEnoughData()
+        return buf.consume(last_index + 1)
+
+    def _process(self, data):
+        yield [x for x in data.split(b' ') if x]
+
+
+class TextBufferedNode(BufferedNode):
+    buffer_class = TextBuffer
+
+
+class TextTokenizer(BufferedNode):
+    buffer_class = TextBuffer
+
+    def __init__(self, needs=None):
+        super(TextTokenizer, self).__init__(needs=needs)
+        self._searched = 0
+
+    def _take(self, buf):
+        last_index = buf.rfind(' ', self._searched)
+        if last_index == -1:
+            self._searched = len(buf)
+            raise NotEnoughData()
+        data = buf.consume(last_index + 1)
+        self._searched = len(buf)
+        return data
+
+    def _process(self, data):
+        yield data.split()
+
+
+class ByteBufferTests(unittest2.TestCase):
+    def test_consumes_prefix(self):
+        buf = ByteBuffer()
+        buf.append(b'hello ')
+        buf.append(b'world')
+        self.assertEqual(b'hello', buf.consume(5))
+        self.assertEqual(6, len(buf))
+        self.assertEqual(b' world', buf.consume())
+        self.assertEqual(0, len(buf))
+
+    def test_consume_returns_bytes(self):
+        buf = ByteBuffer(b'abc')
+        self.assertIsInstance(buf.consume(2), bytes)
+
+    def test_view_does_not_copy(self):
+        buf = ByteBuffer(b'abcdef')
+        buf.consume(2)
+        view = buf.view()
+        self.assertEqual(b'cdef', view.tobytes())
+        view.release()
+        buf.append(b'g')
+        self.assertEqual(b'cdefg', buf.consume())
+
+    def test_appends_chunks_with_total_length(self):
+        buf = ByteBuffer()
+        buf.append(BytesWithTotalLength(b'abc', 6))
+        buf.append(BytesWithTotalLength(b'def', 6))
+        self.assertEqual(b'abc', buf.consume(3))
+        self.assertEqual(b'def', buf.consume())
+
+    def test_find(self):
+        buf = ByteBuffer(b'a b c')
+        self.assertEqual(1, buf.find(b' '))
+        self.assertEqual(3, buf.rfind(b' '))
+
+    def test_clear(self):
+        buf = ByteBuffer(b'abc')
+        buf.clear()
+        self.assertEqual(0, len(buf))
+
+
+class TextBufferTests(unittest2.TestCase):
+    def test_joins_appended_text(self):
+        buf = TextBuffer()
+        buf.append('hello ')
+        buf.append('world')
+        self.assertEqual(11, len(buf))
+        self.assertEqual('hello world', buf.value)
+
+    def test_consumes_prefix(self):
+        buf = TextBuffer('hello world')
+        self.assertEqual('hello ', buf.consume(6))
+        buf.append('!')
+        self.assertEqual('world!', buf.value)
+        self.assertEqual(6, len(buf))
+
+    def test_decodes_characters_split_across_chunks(self):
+        encoded = 'café'.encode('utf-8')
+        buf = TextBuffer()
+        buf.append(encoded[:4])
+        self.assertEqual(3, len(buf))
+        buf.append(encoded[4:])
+        self.assertEqual('café', buf.consume())
+
+    def test_finds_text_across_pieces(self):
+        buf = TextBuffer('xx')
+        buf.consume(1)
+        for piece in ['ab', 'c', 'de', 'abcd']:
+            buf.append(piece)
+        self.assertEqual('xabcdeabcd', buf.value)
+        for sub in ['x', 'a', 'bc', 'cde', 'xabcde', 'dea', 'cd', 'z']:
+            for start in range(len(buf.value) + 1):
+                self.assertEqual(
+                    buf.value.find(sub, start), buf.find(sub, start))
+                self.assertEqual(
+                    buf.value.rfind(sub, start), buf.rfind(sub, start))
+
+    def test_find_does_not_join_pieces(self):
+        buf = TextBuffer()
+        for _ in range(100):
+            buf.append('abc')
+            self.assertEqual(-1, buf.find(' ', len(buf) - 3))
+        self.assertEqual(100, len(buf._pieces))
+
+    def test_consume_only_joins_pieces_it_needs(self):
+        buf = TextBuffer()
+        for _ in range(10):
+            buf.append('abc')
+        self.assertEqual('abca', buf.consume(4))
+        self.assertEqual(8, len(buf._pieces))
+        self.assertEqual('bc' + 'abc' * 8, buf.value)
+
+    def test_close_raises_for_truncated_character(self):
+        buf = TextBuffer()
+        buf.append('café'.encode('utf-8')[:-1])
+        self.assertEqual(3, len(buf))
+        self.assertRaises(UnicodeDecodeError, buf.close)
+
+    def test_close_can_replace_truncated_character(self):
+        buf = TextBuffer(errors='replace')
+        buf.append('café'.encode('utf-8')[:-1])
+        buf.close()
+        self.assertEqual('caf\ufffd', buf.value)
+
+    def test_clear(self):
+        buf = TextBuffer()
+        buf.append('abc')
+        buf.clear()
+        self.assertEqual(0, len(buf))
+        self.assertEqual('', buf.value)
+
+
+class BufferedNodeTests(unittest2.TestCase):
+    def test_byte_buffered_node(self):
+        g = Graph()
+        g['stream'] = TextStream(chunksize=3)
+        g['tokens'] = SpaceTokenizer(needs=g['stream'])
+        g['sink'] = Collect(needs=g['tokens'])
+        g.process(stream='humpty')
+        words = [w for batch in g['sink'].collected for w in batch]
+        self.assertEqual(data_source['humpty'].split(b' '), words)
+
+    def test_text_buffered_node(self):
+        g = Graph()
+        g['stream'] = TextStream(chunksize=3)
+        g['tokens'] = TextTokenizer(needs=g['stream'])
+        g['sink'] = Collect(needs=g['tokens'])
+        g.process(stream='mary')
+        words = [w for batch in g['sink'].collected for w in batch]
+        self.assertEqual(
+            data_source['mary'].decode().split(' ')[:-1], words)
+
+    def test_text_buffered_node_raises_for_truncated_character(self):
+        g = Graph()
+        g['stream'] = Node()
+        g['buffered'] = TextBufferedNode(needs=g['stream'])
+        g['sink'] = Collect(needs=g['buffered'])
+        self.assertRaises(
+            UnicodeDecodeError,
+            lambda: g.process(stream='café'.encode('utf-8')[:-1]))
+
+    def test_default_take_consumes_everything(self):
+        g = Graph()
+        g['stream'] = TextStream(chunksize=3)
+        g['buffered'] = BufferedNode(needs=g['stream'])
+        g['sink'] = Collect(needs=g['buffered'])
+        g.process(stream='mary')
+        self.assertEqual(data_source['mary'], b''.join(g['sink'].collected))
@@ -1,6 +1,11 @@
-from .bytestream import BytesWithTotalLength, ByteStream, ZipWrapper, iter_zip
+from .bytestream import BytesWithTotalLength, ByteStream, ZipWrapper, \
+    iter_zip, BufferWithTotalLength, ByteStreamFeature, total_length, \
+    HttpSessionPool
+from .model import BaseModel
+from .persistence import simple_in_memory_settings
 import unittest2
 import sys
+import threading
 import tempfile
 import subprocess
 import requests
@@ -13,6 +18,8 @@ from .util import wait_for_http_server
 
 
 class BytestreamTests(unittest2.TestCase):
+    server_flags = []
+
     def setUp(self):
         self.HasUri = namedtuple('HasUri', ['uri'])
         self.bytestream = ByteStream(chunksize=3)
@@ -22,7 +29,8 @@ class BytestreamTests(unittest2.TestCase):
         self.expected = b''.join(uuid4().hex.encode() for _ in range(100))
         devnull = open(os.devnull, 'w')
         self.process = subprocess.Popen(
-            [sys.executable, server, self.port, self.expected],
+            [sys.executable, server, self.port, self.expected] +
+            self.server_flags,
             stdout=devnull,
             stderr=devnull)
         wait_for_http_server('localhost', '9876')
@@ -112,12 +120,188 @@ class BytestreamTests(unittest2.TestCase):
         results = self.results(self.HasUri(uri=req))
         self.assertEqual(self.expected, results)
 
+    def test_reuses_connections_across_instances(self):
+        pool = HttpSessionPool(pool_maxsize=1)
+        first = ByteStream(chunksize=3, session_pool=pool)
+        second = ByteStream(chunksize=3, session_pool=pool)
+        self.assertEqual(
+            self.expected, b''.join(first._process(self.local_url())))
+        adapter = pool.session.get_adapter(self.local_url())
+        connections = adapter.poolmanager.connection_from_url(
+            self.local_url()).num_connections
+        self.assertEqual(
+            self.expected, b''.join(second._process(self.local_url())))
+        self.assertEqual(
+            connections,
+            adapter.poolmanager.connection_from_url(
+                self.local_url()).num_connections)
+
+    def test_instances_share_default_session_pool(self):
+        self.assertIs(
+            ByteStream()._session(), ByteStream(chunksize=3)._session())
+
     def test_supports_legacy_uri_interface_for_file_like_objects(self):
         bio = BytesIO(self.expected)
         results = self.results(self.HasUri(uri=bio))
         self.assertEqual(self.expected, results)
 
 
+class ZeroCopyBytestreamTests(BytestreamTests):
+    def setUp(self):
+        super(ZeroCopyBytestreamTests, self).setUp()
+        self.bytestream = ByteStream(chunksize=3, zero_copy=True)
+
+    def test_produces_buffers_with_total_length(self):
+        chunks = list(self.bytestream._process(BytesIO(self.expected)))
+        self.assertTrue(
+            all(isinstance(c, BufferWithTotalLength) for c in chunks))
+        self.assertTrue(
+            all(c.total_length == len(self.expected) for c in chunks))
+
+    def test_retries_short_reads(self):
+        class Trickle(BytesIO):
+            def readinto(self, b):
+                return super(Trickle, self).readinto(memoryview(b)[:1])
+
+        chunks = list(self.bytestream._process(Trickle(b'abcdefgh')))
+        self.assertEqual([b'abc', b'def', b'gh'], chunks)
+
+
+class ReadAheadBytestreamTests(BytestreamTests):
+    def setUp(self):
+        super(ReadAheadBytestreamTests, self).setUp()
+        self.bytestream = ByteStream(chunksize=3, read_ahead=4)
+
+    def test_reads_in_background_thread(self):
+        threads = set()
+
+        class Recorder(BytesIO):
+            def read(self, n=-1):
+                threads.add(threading.get_ident())
+                return super(Recorder, self).read(n)
+
+        results = self.results(Recorder(self.expected))
+        self.assertEqual(self.expected, results)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_raises_read_errors_in_calling_thread(self):
+        class Broken(BytesIO):
+            def read(self, n=-1):
+                raise IOError('broken')
+
+        self.assertRaises(IOError, lambda: self.results(Broken(b'abc')))
+
+    def test_stops_reading_when_consumer_stops(self):
+        before = threading.active_count()
+        chunks = self.bytestream._process(BytesIO(self.expected))
+        self.assertEqual(3, len(next(chunks)))
+        chunks.close()
+        self.assertEqual(before, threading.active_count())
+
+
+class MemoryMappedBytestreamTests(BytestreamTests):
+    def setUp(self):
+        super(MemoryMappedBytestreamTests, self).setUp()
+        self.bytestream = ByteStream(chunksize=3, memory_map=True)
+
+    def test_produces_memoryviews_of_local_files(self):
+        with tempfile.NamedTemporaryFile('wb+') as tf:
+            tf.write(self.expected)
+            tf.flush()
+            chunks = list(self.bytestream._process(tf.name))
+        self.assertTrue(all(isinstance(c, memoryview) for c in chunks))
+        self.assertEqual(3, len(chunks[0]))
+        self.assertEqual(len(self.expected), total_length(chunks[-1]))
+
+    def test_can_store_memory_mapped_file(self):
+        @simple_in_memory_settings
+        class Document(BaseModel):
+            stream = ByteStreamFeature(
+                ByteStream, chunksize=64, memory_map=True, store=True)
+
+        with tempfile.NamedTemporaryFile('wb+') as tf:
+            tf.write(self.expected)
+            tf.flush()
+            _id = Document.process(stream=tf.name)
+
+        doc = Document(_id)
+        self.assertEqual(self.expected, b''.join(doc.stream))
+
+
+class RangedBytestreamTests(BytestreamTests):
+    server_flags = ['ranges']
+
+    def setUp(self):
+        super(RangedBytestreamTests, self).setUp()
+        self.bytestream = ByteStream(chunksize=3, connections=4, range_size=64)
+
+    def test_fetches_ranges(self):
+        ranges = []
+
+        class Recorder(ByteStream):
+            def _fetch_range(self, session, prepped, start, stop):
+                ranges.append((start, stop))
+                return super(Recorder, self)._fetch_range(
+                    session, prepped, start, stop)
+
+        bs = Recorder(chunksize=3, connections=4, range_size=64)
+        chunks = list(bs._process(self.local_url()))
+        self.assertEqual(self.expected, b''.join(chunks))
+        self.assertEqual(len(self.expected) // 64, len(ranges))
+        self.assertTrue(all(len(c) == 3 for c in chunks[:-1]))
+        self.assertTrue(
+            all(c.total_length == len(self.expected) for c in chunks))
+
+
+class RangedFallbackBytestreamTests(BytestreamTests):
+    def setUp(self):
+        super(RangedFallbackBytestreamTests, self).setUp()
+        self.bytestream = ByteStream(chunksize=3, connections=4, range_size=64)
+
+
+class GzipRangedBytestreamTests(RangedBytestreamTests):
+    server_flags = ['ranges', 'gzip']
+
+
+class ForbiddenHeadBytestreamTests(RangedFallbackBytestreamTests):
+    server_flags = ['ranges', 'noheads']
+
+
+class BufferWithTotalLengthTests(unittest2.TestCase):
+    def test_can_be_viewed_without_copying(self):
+        x = BufferWithTotalLength(b'fake', 100)
+        view = memoryview(x)
+        x[0:1] = b'c'
+        self.assertEqual(b'cake', view.tobytes())
+        self.assertEqual(100, x.total_length)
+
+    def test_right_add(self):
+        self.assertEqual(
+            b'blahfake', b'blah' + BufferWithTotalLength(b'fake', 100))
+
+
+class HttpSessionPoolTests(unittest2.TestCase):
+    def test_returns_same_session_within_process(self):
+        pool = HttpSessionPool()
+        self.assertIs(pool.session, pool.session)
+
+    def test_does_not_reuse_session_from_another_process(self):
+        pool = HttpSessionPool()
+        session = pool.session
+        pool._sessions = {-1: session}
+        self.assertIsNot(session, pool.session)
+
+    def test_can_disable_keep_alive(self):
+        pool = HttpSessionPool(keep_alive=False)
+        self.assertEqual('close', pool.session.headers['Connection'])
+
+    def test_can_close(self):
+        pool = HttpSessionPool()
+        session = pool.session
+        pool.close()
+        self.assertIsNot(session, pool.session)
+
+
 class BytesWithTotalLengthTests(unittest2.TestCase):
     def test_left_add(self):
         self.assertEqual(
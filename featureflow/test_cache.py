@@ -0,0 +1,97 @@
+import unittest2
+import sys
+import numpy as np
+from io import BytesIO
+from .cache import FeatureCache, sizeof
+
+
+class SizeofTests(unittest2.TestCase):
+    def test_uses_nbytes_for_arrays(self):
+        self.assertEqual(800, sizeof(np.zeros(100)))
+
+    def test_uses_length_for_bytes_and_strings(self):
+        self.assertEqual(5, sizeof(b'hello'))
+        self.assertEqual(5, sizeof('hello'))
+
+
+    def test_counts_contents_of_containers(self):
+        value = {'words': ['a' * 1000, 'b' * 1000], 'count': 2}
+        self.assertGreater(sizeof(value), 2000)
+
+    def test_counts_attributes_of_objects(self):
+        class Decoded(object):
+            def __init__(self):
+                self.values = np.zeros(100)
+
+        self.assertGreater(sizeof(Decoded()), 800)
+
+    def test_counts_shared_values_once(self):
+        shared = np.zeros(100)
+        self.assertLess(sizeof([shared, shared]), 1600)
+
+    def test_handles_cycles(self):
+        value = []
+        value.append(value)
+        self.assertEqual(sys.getsizeof(value), sizeof(value))
+
+
+class FeatureCacheTests(unittest2.TestCase):
+    def test_can_get_cached_value(self):
+        cache = FeatureCache()
+        cache.add(('id', 'feature', 'v1'), b'value')
+        self.assertEqual(b'value', cache[('id', 'feature', 'v1')])
+
+    def test_counts_hits_and_misses(self):
+        cache = FeatureCache()
+        cache.add('a', b'value')
+        cache['a']
+        self.assertRaises(KeyError, lambda: cache['b'])
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+        self.assertEqual(0.5, cache.hit_rate)
+
+    def test_evicts_least_recently_used_when_size_is_exceeded(self):
+        cache = FeatureCache(max_bytes=10)
+        cache.add('a', b'aaaa')
+        cache.add('b', b'bbbb')
+        cache['a']
+        cache.add('c', b'cccc')
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(8, cache.size)
+        self.assertEqual(1, cache.evictions)
+
+    def test_does_not_cache_values_larger_than_the_cache(self):
+        cache = FeatureCache(max_bytes=4)
+        self.assertFalse(cache.add('a', b'too big'))
+        self.assertEqual(0, len(cache))
+
+    def test_does_not_cache_streams_or_iterators(self):
+        cache = FeatureCache()
+        self.assertFalse(cache.add('a', BytesIO(b'value')))
+        self.assertFalse(cache.add('b', iter([1, 2, 3])))
+        self.assertEqual(0, len(cache))
+
+    def test_replacing_value_updates_size(self):
+        cache = FeatureCache()
+        cache.add('a', b'aaaa')
+        cache.add('a', b'aa')
+        self.assertEqual(2, cache.size)
+        self.assertEqual(1, len(cache))
+
+    def test_can_invalidate_document(self):
+        cache = FeatureCache()
+        cache.add(('id1', 'feature', 'v1'), b'value')
+        cache.add(('id1', 'other', 'v1'), b'value')
+        cache.add(('id2', 'feature', 'v1'), b'value')
+        cache.invalidate('id1')
+        self.assertEqual(1, len(cache))
+        self.assertEqual(5, cache.size)
+
+    def test_can_clear(self):
+        cache = FeatureCache()
+        cache.add('a', b'value')
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.size)
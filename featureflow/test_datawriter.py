@@ -1,6 +1,10 @@
 import unittest2
-from .datawriter import BytesIODataWriter
+import asyncio
+from .datawriter import BytesIODataWriter, DataWriter
 from .encoder import IdentityEncoder
+from .extractor import Graph
+from .data import InMemoryDatabase, StringDelimitedKeyBuilder
+from .test_integration import TextStream, data_source
 
 
 class StringIODataWriterTests(unittest2.TestCase):
@@ -13,3 +17,44 @@ class StringIODataWriterTests(unittest2.TestCase):
         writer._stream.seek(0)
         retrieved = writer._stream.read()
         self.assertEqual(data, retrieved)
+
+
+class AsyncWriteStream(object):
+    def __init__(self, database, key):
+        super(AsyncWriteStream, self).__init__()
+        self.database = database
+        self.key = key
+        self.chunks = []
+
+    async def write(self, data):
+        await asyncio.sleep(0)
+        self.chunks.append(data)
+        return len(data)
+
+    async def close(self):
+        await asyncio.sleep(0)
+        self.database._dict[self.key] = b''.join(self.chunks)
+
+
+class AsyncInMemoryDatabase(InMemoryDatabase):
+    def write_stream(self, key, content_type):
+        return AsyncWriteStream(self, key)
+
+
+class AsyncDataWriterTests(unittest2.TestCase):
+    def test_awaits_writes_to_asynchronous_database(self):
+        key_builder = StringDelimitedKeyBuilder()
+        db = AsyncInMemoryDatabase(key_builder=key_builder)
+        g = Graph()
+        g['stream'] = TextStream()
+        g['encoder'] = IdentityEncoder(needs=g['stream'])
+        g['writer'] = DataWriter(
+            needs=g['encoder'],
+            _id='id',
+            feature_name='stream',
+            feature_version='version',
+            key_builder=key_builder,
+            database=db)
+        asyncio.run(g.aprocess(stream='mary'))
+        key = key_builder.build('id', 'stream', 'version')
+        self.assertEqual(data_source['mary'], db.read_stream(key).read())
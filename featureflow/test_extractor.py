@@ -0,0 +1,437 @@
+import unittest2
+from .extractor import Graph, Node, CompiledGraph, ThreadedGraph, \
+    BoundedGraph, GraphStats, NodeStats, SpillingAggregator, Batching, Unbatch
+from .util import chunked
+from .test_integration import TextStream, Tokenizer, WordCount, Dam, \
+    TheLastWord, EagerConcatenate, ToUpper, ToLower, Broken, data_source
+
+
+class Collect(Node):
+    def __init__(self, needs=None):
+        super(Collect, self).__init__(needs=needs)
+        self.collected = []
+
+    def _process(self, data):
+        self.collected.append(data)
+        yield data
+
+
+class SpilledLength(SpillingAggregator, Node):
+    def __init__(self, spill_bytes=16, needs=None):
+        super(SpilledLength, self).__init__(
+            spill_bytes=spill_bytes, needs=needs)
+
+    def _process(self, data):
+        yield sum(len(chunk) for chunk in chunked(data, chunksize=7))
+
+
+class ProcessesLastChunk(Node):
+    """
+    Passes its input through, and then emits one last chunk, produced by its
+    own `_process()`
+    """
+
+    def __init__(self, needs=None):
+        super(ProcessesLastChunk, self).__init__(needs=needs)
+
+    def _last_chunk(self):
+        return self._process(b'last')
+
+
+def last_chunk_graph():
+    g = Graph()
+    g['stream'] = TextStream(chunksize=4)
+    g['last'] = ProcessesLastChunk(needs=g['stream'])
+    g['sink'] = Collect(needs=g['last'])
+    return g
+
+
+def spilling_graph(spill_bytes):
+    g = Graph()
+    g['stream'] = TextStream(chunksize=4)
+    g['length'] = SpilledLength(spill_bytes=spill_bytes, needs=g['stream'])
+    g['sink'] = Collect(needs=g['length'])
+    return g
+
+
+class BatchUpper(Batching, Node):
+    def __init__(self, needs=None, **kwargs):
+        super(BatchUpper, self).__init__(needs=needs, **kwargs)
+
+    def _process(self, data):
+        yield [chunk.upper() for chunk in data]
+
+
+def batching_graph(**kwargs):
+    g = Graph()
+    g['stream'] = TextStream(chunksize=4)
+    g['batch'] = BatchUpper(needs=g['stream'], **kwargs)
+    g['batches'] = Collect(needs=g['batch'])
+    g['unbatch'] = Unbatch(needs=g['batch'])
+    g['sink'] = Collect(needs=g['unbatch'])
+    return g
+
+
+def word_count_graph():
+    g = Graph()
+    g['stream'] = TextStream()
+    g['words'] = Tokenizer(needs=g['stream'])
+    g['count'] = WordCount(needs=g['words'])
+    g['sink'] = Collect(needs=g['count'])
+    return g
+
+
+def fan_out_graph():
+    g = Graph()
+    g['stream'] = TextStream(chunksize=4)
+    g['dam'] = Dam(needs=g['stream'])
+    g['last'] = TheLastWord(needs=g['stream'])
+    g['upper'] = ToUpper(needs=g['dam'])
+    g['dam_sink'] = Collect(needs=g['upper'])
+    g['last_sink'] = Collect(needs=g['last'])
+    return g
+
+
+def dam_graph():
+    g = Graph()
+    g['stream'] = TextStream(chunksize=16)
+    g['dam'] = Dam(chunksize=2, needs=g['stream'])
+    g['upper'] = ToUpper(needs=g['dam'])
+    g['sink'] = Collect(needs=g['upper'])
+    g['words'] = Tokenizer(needs=g['stream'])
+    g['count'] = WordCount(needs=g['words'])
+    g['count_sink'] = Collect(needs=g['count'])
+    return g
+
+
+def diamond_graph():
+    g = Graph()
+    g['stream'] = TextStream()
+    g['upper'] = ToUpper(needs=g['stream'])
+    g['lower'] = ToLower(needs=g['stream'])
+    g['left'] = ToUpper(needs=g['upper'])
+    g['cat'] = EagerConcatenate(needs=[g['left'], g['lower']])
+    g['sink'] = Collect(needs=g['cat'])
+    g['other'] = TheLastWord(needs=g['stream'])
+    g['other_sink'] = Collect(needs=g['other'])
+    return g
+
+
+def multiple_roots_graph():
+    g = Graph()
+    g['stream1'] = TextStream()
+    g['stream2'] = TextStream()
+    g['cat'] = EagerConcatenate(needs=[g['stream1'], g['stream2']])
+    g['sink'] = Collect(needs=g['cat'])
+    return g
+
+
+class GraphTests(unittest2.TestCase):
+    def test_topological_sort_places_dependencies_first(self):
+        g = fan_out_graph()
+        ordered = g.topological_sort()
+        self.assertEqual(len(g), len(ordered))
+        positions = dict((id(n), i) for i, n in enumerate(ordered))
+        for node in g.values():
+            for dependency in node.dependencies:
+                self.assertLess(positions[id(dependency)], positions[id(node)])
+
+    def test_topological_sort_raises_for_cycle(self):
+        g = Graph()
+        g['a'] = TextStream()
+        g['b'] = ToUpper(needs=g['a'])
+        g['a']._needs = {'b': g['b']}
+        self.assertRaises(ValueError, lambda: g.topological_sort())
+
+    def test_compile_returns_compiled_graph(self):
+        self.assertIsInstance(word_count_graph().compile(), CompiledGraph)
+
+    def test_compiled_graph_raises_when_root_arguments_are_missing(self):
+        compiled = multiple_roots_graph().compile()
+        self.assertRaises(KeyError, lambda: compiled.process(stream1='mary'))
+
+
+class CompiledGraphTests(unittest2.TestCase):
+    def _assert_same_results(self, graph_factory, sinks, **kwargs):
+        interpreted = graph_factory()
+        interpreted.process(**kwargs)
+        compiled = graph_factory()
+        compiled.compile().process(**kwargs)
+        for sink in sinks:
+            self.assertEqual(
+                interpreted[sink].collected, compiled[sink].collected)
+        return compiled
+
+    def test_aggregator_output_matches_graph_process(self):
+        g = self._assert_same_results(
+            word_count_graph, ['sink'], stream='mary')
+        self.assertEqual(3, g['sink'].collected[0]['lamb'])
+
+    def test_fan_out_and_last_chunk_output_matches_graph_process(self):
+        g = self._assert_same_results(
+            fan_out_graph, ['dam_sink', 'last_sink'], stream='humpty')
+        self.assertEqual(
+            data_source['humpty'].upper(), b''.join(g['dam_sink'].collected))
+        self.assertEqual('final', g['last_sink'].collected[-1])
+
+    def test_multiple_roots_output_matches_graph_process(self):
+        self._assert_same_results(
+            multiple_roots_graph,
+            ['sink'],
+            stream1='mary',
+            stream2='humpty')
+
+
+class ThreadedGraphTests(unittest2.TestCase):
+    def _assert_same_results(self, graph_factory, sinks, **kwargs):
+        interpreted = graph_factory()
+        interpreted.process(**kwargs)
+        threaded = graph_factory()
+        threaded.compile(threads=4).process(**kwargs)
+        for sink in sinks:
+            self.assertEqual(
+                interpreted[sink].collected, threaded[sink].collected)
+        return threaded
+
+    def test_compile_with_threads_returns_threaded_graph(self):
+        compiled = word_count_graph().compile(threads=2)
+        self.assertIsInstance(compiled, ThreadedGraph)
+
+    def test_sibling_branches_are_run_separately(self):
+        compiled = fan_out_graph().compile(threads=2)
+        self.assertEqual(3, len(compiled.branches))
+
+    def test_merging_branches_are_run_together(self):
+        g = diamond_graph()
+        compiled = g.compile(threads=2)
+        self.assertEqual(3, len(compiled.branches))
+        by_node = dict(
+            (c.node, b) for b in compiled.branches for c in b.nodes)
+        self.assertIs(by_node[g['upper']], by_node[g['cat']])
+        self.assertIs(by_node[g['lower']], by_node[g['cat']])
+        self.assertIsNot(by_node[g['other']], by_node[g['cat']])
+
+    def test_aggregator_output_matches_graph_process(self):
+        g = self._assert_same_results(
+            word_count_graph, ['sink'], stream='mary')
+        self.assertEqual(3, g['sink'].collected[0]['lamb'])
+
+    def test_fan_out_and_last_chunk_output_matches_graph_process(self):
+        self._assert_same_results(
+            fan_out_graph, ['dam_sink', 'last_sink'], stream='lorem')
+
+    def test_diamond_output_matches_graph_process(self):
+        self._assert_same_results(
+            diamond_graph, ['sink', 'other_sink'], stream='lorem')
+
+    def test_multiple_roots_output_matches_graph_process(self):
+        self._assert_same_results(
+            multiple_roots_graph,
+            ['sink'],
+            stream1='mary',
+            stream2='humpty')
+
+    def test_exception_in_branch_is_raised_in_calling_thread(self):
+        g = fan_out_graph()
+        g['broken'] = Broken(needs=g['last'])
+        compiled = g.compile(threads=2)
+        self.assertRaises(
+            Exception, lambda: compiled.process(stream='lorem'))
+
+
+class BoundedGraphTests(unittest2.TestCase):
+    def _assert_same_results(self, graph_factory, sinks, **kwargs):
+        interpreted = graph_factory()
+        interpreted.process(**kwargs)
+        graph = graph_factory()
+        bounded = graph.compile(max_buffer_items=2)
+        bounded.process(**kwargs)
+        for sink in sinks:
+            self.assertEqual(
+                interpreted[sink].collected, graph[sink].collected)
+        return bounded
+
+    def test_compile_with_buffer_limit_returns_bounded_graph(self):
+        compiled = word_count_graph().compile(max_buffer_bytes=1024)
+        self.assertIsInstance(compiled, BoundedGraph)
+
+    def test_cannot_combine_threads_and_buffer_limits(self):
+        self.assertRaises(
+            ValueError,
+            lambda: word_count_graph().compile(threads=2, max_buffer_items=2))
+
+    def test_buffer_item_limit_must_be_positive(self):
+        self.assertRaises(
+            ValueError,
+            lambda: word_count_graph().compile(max_buffer_items=0))
+
+    def test_never_buffers_more_than_item_limit(self):
+        bounded = self._assert_same_results(
+            dam_graph, ['sink', 'count_sink'], stream='lorem')
+        self.assertLessEqual(bounded.peak_buffer_items, 2)
+
+    def test_never_buffers_more_than_byte_limit_plus_one_chunk(self):
+        g = fan_out_graph()
+        bounded = g.compile(max_buffer_bytes=4)
+        bounded.process(stream='lorem')
+        self.assertEqual(
+            data_source['lorem'].upper(), b''.join(g['dam_sink'].collected))
+        # the largest single chunk is the five-character string "final"
+        self.assertLess(bounded.peak_buffer_bytes, 4 + 5)
+
+    def test_fan_out_and_last_chunk_output_matches_graph_process(self):
+        self._assert_same_results(
+            fan_out_graph, ['dam_sink', 'last_sink'], stream='lorem')
+
+    def test_diamond_output_matches_graph_process(self):
+        self._assert_same_results(
+            diamond_graph, ['sink', 'other_sink'], stream='lorem')
+
+    def test_multiple_roots_output_matches_graph_process(self):
+        self._assert_same_results(
+            multiple_roots_graph,
+            ['sink'],
+            stream1='mary',
+            stream2='humpty')
+
+
+class InstrumentationTests(unittest2.TestCase):
+    def test_uninstrumented_graph_has_no_stats(self):
+        g = word_count_graph()
+        g.process(stream='mary')
+        self.assertEqual(0, len(g.stats()))
+
+    def test_records_chunks_and_bytes_in_and_out(self):
+        g = word_count_graph().instrument()
+        g.process(stream='mary')
+        stats = g.stats()
+        self.assertIsInstance(stats, GraphStats)
+        self.assertEqual(set(g.keys()), set(stats.keys()))
+        stream = stats['stream']
+        self.assertEqual(16, stream.chunks_out)
+        self.assertEqual(len(data_source['mary']), stream.bytes_out)
+        self.assertEqual(16, stats['words'].chunks_in)
+        self.assertEqual(len(data_source['mary']), stats['words'].bytes_in)
+        self.assertEqual(1, stats['count'].chunks_out)
+
+    def test_records_stalls(self):
+        g = word_count_graph().instrument()
+        g.process(stream='mary')
+        stats = g.stats()
+        # the word count aggregator stalls until its input is exhausted
+        self.assertGreater(stats['count'].stalls, 0)
+        self.assertEqual(0, stats['stream'].stalls)
+
+    def test_records_time(self):
+        g = word_count_graph().instrument()
+        g.process(stream='lorem')
+        stats = g.stats()
+        self.assertGreater(stats['stream'].wall_time, 0)
+        self.assertGreater(stats['words'].enqueue_time, 0)
+        self.assertGreater(stats['words'].dequeue_time, 0)
+        self.assertIn(stats.hot_spots()[0], g)
+
+    def test_records_last_chunk_output(self):
+        g = fan_out_graph().instrument()
+        g.process(stream='mary')
+        stats = g.stats()
+        self.assertEqual(
+            len(g['last_sink'].collected), stats['last'].chunks_out)
+
+    def test_last_chunks_produced_by_process_are_counted_once(self):
+        g = last_chunk_graph().instrument()
+        g.process(stream='mary')
+        stats = g.stats()['last']
+        collected = g['sink'].collected
+        self.assertEqual(b'last', collected[-1])
+        self.assertEqual(len(collected), stats.chunks_out)
+        self.assertEqual(sum(len(c) for c in collected), stats.bytes_out)
+
+    def test_instrumented_compiled_graph_matches_graph_process(self):
+        g = word_count_graph().instrument()
+        g.process(stream='mary')
+        compiled = word_count_graph().instrument()
+        compiled.compile().process(stream='mary')
+        self.assertEqual(
+            dict((k, v.chunks_out) for k, v in g.stats().items()),
+            dict((k, v.chunks_out) for k, v in compiled.stats().items()))
+
+    def test_can_merge_stats(self):
+        stats = GraphStats()
+        for _ in range(2):
+            g = word_count_graph().instrument()
+            g.process(stream='mary')
+            stats.merge(g.stats())
+        self.assertEqual(32, stats['stream'].chunks_out)
+        self.assertEqual(32, stats.to_dict()['stream']['chunks_out'])
+
+    def test_node_stats_start_at_zero(self):
+        self.assertTrue(all(v == 0 for v in NodeStats().to_dict().values()))
+
+
+class SpillingAggregatorTests(unittest2.TestCase):
+    def test_spills_to_disk_when_threshold_is_exceeded(self):
+        g = spilling_graph(spill_bytes=16)
+        g.process(stream='lorem')
+        self.assertTrue(g['length'].spilled)
+        self.assertEqual([len(data_source['lorem'])], g['sink'].collected)
+
+    def test_stays_in_memory_below_threshold(self):
+        g = spilling_graph(spill_bytes=1024 * 1024)
+        g.process(stream='lorem')
+        self.assertFalse(g['length'].spilled)
+        self.assertEqual([len(data_source['lorem'])], g['sink'].collected)
+
+    def test_only_produces_output_once_input_is_exhausted(self):
+        g = spilling_graph(spill_bytes=16)
+        g.compile().process(stream='mary')
+        self.assertEqual([len(data_source['mary'])], g['sink'].collected)
+
+    def test_closes_temporary_file_after_processing(self):
+        g = spilling_graph(spill_bytes=16)
+        g.process(stream='lorem')
+        self.assertTrue(g['length']._spool.closed)
+
+
+class BatchingTests(unittest2.TestCase):
+    def test_must_specify_a_batch_limit(self):
+        self.assertRaises(ValueError, lambda: BatchUpper())
+
+    def test_batches_by_count(self):
+        g = batching_graph(batch_size=5)
+        g.process(stream='lorem')
+        batches = g['batches'].collected
+        self.assertTrue(all(len(b) == 5 for b in batches[:-1]))
+        self.assertLessEqual(len(batches[-1]), 5)
+        self.assertEqual(
+            data_source['lorem'].upper(), b''.join(g['sink'].collected))
+
+    def test_batches_by_bytes(self):
+        g = batching_graph(batch_bytes=10)
+        g.process(stream='lorem')
+        batches = g['batches'].collected
+        # chunks are four bytes long
+        self.assertTrue(all(len(b) == 3 for b in batches[:-1]))
+        self.assertEqual(
+            data_source['lorem'].upper(), b''.join(g['sink'].collected))
+
+    def test_batches_by_timeout(self):
+        g = batching_graph(batch_timeout=0)
+        g.process(stream='mary')
+        self.assertTrue(all(len(b) == 1 for b in g['batches'].collected))
+
+    def test_flushes_partial_batch(self):
+        g = batching_graph(batch_size=10000)
+        g.process(stream='mary')
+        self.assertEqual(1, len(g['batches'].collected))
+        self.assertEqual(
+            data_source['mary'].upper(), b''.join(g['sink'].collected))
+
+    def test_unbatched_output_matches_across_schedulers(self):
+        g = batching_graph(batch_size=3)
+        g.process(stream='lorem')
+        expected = g['sink'].collected
+        for kwargs in [dict(), dict(threads=2), dict(max_buffer_items=2)]:
+            g = batching_graph(batch_size=3)
+            g.compile(**kwargs).process(stream='lorem')
+            self.assertEqual(expected, g['sink'].collected)
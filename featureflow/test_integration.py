@@ -10,12 +10,13 @@ import sys
 import time
 
 from .var import Var
-from .extractor import NotEnoughData, Aggregator, Node, InvalidProcessMethod
+from .extractor import NotEnoughData, Aggregator, Node, InvalidProcessMethod, \
+    GraphStats
 from .iteratornode import IteratorNode
 from .model import BaseModel, NoPersistenceSettingsError, ModelExistsError
 from .feature import \
     Feature, JSONFeature, CompressedFeature, ClobberJSONFeature, \
-    ClobberPickleFeature, TextFeature
+    ClobberPickleFeature, TextFeature, ComputePlan
 from .data import *
 from .bytestream import ByteStream, ByteStreamFeature
 from io import BytesIO
@@ -23,9 +24,12 @@ from .util import chunked
 from .lmdbstore import LmdbDatabase
 from .decoder import Decoder
 from .persistence import PersistenceSettings
+from .cache import FeatureCache
 from tempfile import mkdtemp
 from shutil import rmtree
 import traceback
+import asyncio
+import json
 
 data_source = {
     'mary': b'mary had a little lamb little lamb little lamb',
@@ -56,6 +60,25 @@ class TextStream(Node):
             yield chunk
 
 
+class AsyncTextStream(TextStream):
+    def __init__(self, chunksize=3, needs=None):
+        super(AsyncTextStream, self).__init__(chunksize=chunksize, needs=needs)
+
+    async def _process(self, data):
+        for chunk in super(AsyncTextStream, self)._process(data):
+            await asyncio.sleep(0)
+            yield chunk
+
+
+class AsyncToUpper(Node):
+    def __init__(self, needs=None):
+        super(AsyncToUpper, self).__init__(needs=needs)
+
+    async def _process(self, data):
+        await asyncio.sleep(0)
+        yield data.upper()
+
+
 class MaryTextStream(Node):
     def __init__(self, needs=None):
         super(MaryTextStream, self).__init__(needs=needs)
@@ -317,6 +340,15 @@ class Add(Node):
         yield [c + self._rhs for c in data]
 
 
+class AddBatch(Node):
+    def __init__(self, batch=1, needs=None):
+        super(AddBatch, self).__init__(needs=needs)
+        self._batch = batch
+
+    def _process(self, data):
+        yield [c + self._batch for c in data]
+
+
 class Tokenizer(Node):
     def __init__(self, needs=None):
         super(Tokenizer, self).__init__(needs=needs)
@@ -700,6 +732,44 @@ class BaseTest(object):
 
         self.assertEqual(b'THIS IS A TEST.2020', doc.uppercase.read())
 
+    def test_feature_version_is_computed_once(self):
+        class Split(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            uppercase = Feature(lambda x: x.upper(), needs=stream, store=True)
+
+        version = Split.uppercase.version
+        self.assertIsNotNone(Split.uppercase._version)
+        Split.uppercase._version = 'cached'
+        self.assertEqual('cached', Split.uppercase.version)
+        Split.invalidate_versions()
+        self.assertEqual(version, Split.uppercase.version)
+
+    def test_volatile_feature_version_is_not_cached(self):
+        a = 10
+
+        class Split(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            uppercase = Feature(
+                lambda x: x.upper() + str(a).encode(),
+                needs=stream,
+                store=True,
+                closure_fingerprint=lambda d: str(d['a']))
+
+        self.assertTrue(Split.uppercase.has_volatile_version)
+        version = Split.uppercase.version
+        a = 20
+        self.assertNotEqual(version, Split.uppercase.version)
+
+    def test_can_read_feature_after_invalidating_versions(self):
+        class Split(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            uppercase = Feature(ToUpper, needs=stream, store=True)
+
+        _id = Split.process(stream='cased')
+        Split.invalidate_versions()
+        doc = Split(_id)
+        self.assertEqual(b'THIS IS A TEST.', doc.uppercase.read())
+
     def test_can_compute_feature_directly_with_callable(self):
         class FancyUpperCase(object):
             def __call__(self, x):
@@ -1129,6 +1199,450 @@ class BaseTest(object):
         doc = Doc(_id)
         self.assertEqual(b'THIS IS A TEST.final', doc.final.read())
 
+    def test_can_process_document_using_compiled_graph(self):
+        class Doc(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            final = Feature(TheLastWord, needs=stream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        _id = Doc.process(stream='mary', compiled=True)
+        doc = Doc(_id)
+        self.assertEqual(data_source['mary'].upper() + b'final', doc.final.read())
+        self.assertEqual(3, doc.count['lamb'])
+
+    def test_can_process_document_using_threaded_graph(self):
+        class Doc(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            final = Feature(TheLastWord, needs=stream, store=True)
+            lowercase = CompressedFeature(ToLower, needs=stream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        _id = Doc.process(stream='lorem', threads=4)
+        doc = Doc(_id)
+        self.assertEqual(
+            data_source['lorem'].upper() + b'final', doc.final.read())
+        self.assertEqual(data_source['lorem'].lower(), b''.join(doc.lowercase))
+        self.assertEqual(2, doc.count['dolor'])
+
+    def test_threaded_graph_removes_keys_when_exception_is_thrown(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            upper = Feature(ToUpper, needs=stream, store=True)
+            broken = Feature(Broken, needs=stream, store=True)
+
+        self.assertRaises(
+            Exception, lambda: D.process(stream='mary', threads=2))
+        self.assertEqual(0, len(list(self.Settings.database.iter_ids())))
+
+    def test_can_process_document_asynchronously(self):
+        class Doc(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            final = Feature(TheLastWord, needs=stream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        _id = asyncio.run(Doc.aprocess(stream='mary'))
+        doc = Doc(_id)
+        self.assertEqual(data_source['mary'].upper() + b'final', doc.final.read())
+        self.assertEqual(3, doc.count['lamb'])
+
+    def test_can_process_many_documents_concurrently_with_async_nodes(self):
+        class Doc(BaseModel, self.Settings):
+            stream = Feature(AsyncTextStream, store=True)
+            upper = Feature(AsyncToUpper, needs=stream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        async def process_all():
+            return await asyncio.gather(
+                *[Doc.aprocess(stream=k) for k in ['mary', 'humpty', 'lorem']])
+
+        _ids = asyncio.run(process_all())
+        for _id, k in zip(_ids, ['mary', 'humpty', 'lorem']):
+            doc = Doc(_id)
+            self.assertEqual(data_source[k], doc.stream.read())
+            self.assertEqual(data_source[k].upper(), doc.upper.read())
+        self.assertEqual(3, Doc(_ids[0]).count['lamb'])
+
+    def test_synchronous_process_raises_for_async_node(self):
+        class Doc(BaseModel, self.Settings):
+            stream = Feature(AsyncTextStream, store=True)
+
+        self.assertRaises(ValueError, lambda: Doc.process(stream='mary'))
+        self.assertRaises(
+            ValueError, lambda: Doc.process(stream='mary', compiled=True))
+
+    def test_async_process_removes_keys_when_exception_is_thrown(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(AsyncTextStream, store=True)
+            broken = Feature(Broken, needs=stream, store=True)
+
+        self.assertRaises(
+            Exception, lambda: asyncio.run(D.aprocess(stream='mary')))
+        self.assertEqual(0, len(list(self.Settings.database.iter_ids())))
+
+    def test_can_process_document_with_bounded_buffers(self):
+        class Doc(BaseModel, self.Settings):
+            stream = Feature(TextStream, chunksize=16, store=True)
+            dam = Feature(Dam, needs=stream, store=False)
+            final = Feature(TheLastWord, needs=dam, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        _id = Doc.process(stream='lorem', max_buffer_items=1)
+        doc = Doc(_id)
+        self.assertEqual(
+            data_source['lorem'].upper() + b'final', doc.final.read())
+        self.assertEqual(2, doc.count['dolor'])
+
+    def test_can_collect_stats_while_processing_documents(self):
+        class Doc(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        stats = GraphStats()
+        Doc.process(stream='mary', stats=stats)
+        Doc.process(stream='mary', compiled=True, stats=stats)
+        self.assertEqual(2, stats['count'].chunks_out)
+        self.assertEqual(32, stats['stream'].chunks_out)
+        self.assertIn('count_writer', stats)
+
+    def test_can_collect_stats_while_computing_unstored_feature(self):
+        class Doc(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=False)
+
+        _id = Doc.process(stream='mary')
+        stats = GraphStats()
+        count = Doc.count(_id, persistence=Doc, stats=stats)
+        self.assertEqual(3, count['lamb'])
+        self.assertEqual(1, stats['count'].chunks_out)
+        self.assertGreater(stats['words'].chunks_in, 0)
+
+    def test_compiled_graph_removes_keys_when_exception_is_thrown(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            broken = Feature(Broken, needs=stream, store=True)
+
+        self.assertRaises(
+            Exception, lambda: D.process(stream='mary', compiled=True))
+        self.assertEqual(0, len(list(self.Settings.database.iter_ids())))
+
+    def test_graph_template_is_built_once_per_model(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        D.process(stream='mary')
+        template = D.graph_template()
+        D.process(stream='humpty')
+        self.assertIs(template, D.graph_template())
+
+    def test_graph_template_is_not_inherited(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+
+        class D2(D):
+            upper = Feature(ToUpper, needs=D.stream, store=True)
+
+        self.assertNotIn('upper', D.graph_template())
+        self.assertIn('upper', D2.graph_template())
+
+    def _describe_graph(self, graph):
+        keys = dict((id(node), key) for key, node in graph.items())
+        return [
+            (key,
+             node.__class__,
+             [keys[id(d)] for d in node.dependencies],
+             getattr(node, '_rhs', None),
+             getattr(node, '_id', None),
+             id(getattr(node, 'database', None)))
+            for key, node in graph.items()]
+
+    def test_graph_template_builds_same_graph_as_model(self):
+        other = self.Settings.clone(
+            database=InMemoryDatabase(key_builder=self.Settings.key_builder))
+
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            copy = Feature(Counter, needs=stream, store=False)
+            words = Feature(Tokenizer, needs=copy, store=False)
+            count = JSONFeature(WordCount, needs=words, store=False)
+            upper = Feature(ToUpper, needs=stream, store=True)
+            lower = Feature(
+                ToLower, needs=stream, store=True, persistence=other)
+            cat = Feature(
+                Concatenate, needs=[upper, lower], store=True)
+            both = Feature(UpperAndLower, needs=stream, store=False)
+            echo = Feature(Echo, needs=both.aspect('upper'), store=True)
+            numbers = Feature(NumberStream, store=False)
+            add = Feature(Add, needs=numbers, store=True, rhs=Var('rhs'))
+
+        graph = D._build_extractor('id', rhs=2)
+        graph.remove_dead_nodes(D.features.values())
+        built = D.graph_template().build('id', rhs=2)
+        self.assertEqual(
+            self._describe_graph(graph), self._describe_graph(built))
+        self.assertNotIn('count', built)
+        self.assertIs(other.database, built['lower_writer'].database)
+        self.assertEqual(2, built['add']._rhs)
+
+    def test_graph_template_builds_fresh_nodes_for_each_document(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        template = D.graph_template()
+        first = template.build('first')
+        second = template.build('second')
+        self.assertIsNot(first['count'], second['count'])
+        self.assertEqual('second', second['count_writer']._id)
+
+    def test_can_invalidate_graph_template(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+
+        template = D.graph_template()
+        D.invalidate_graph_template()
+        self.assertIsNot(template, D.graph_template())
+
+    def test_can_process_many_documents_in_one_batch(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            upper = Feature(ToUpper, needs=stream, store=True)
+
+        with D.database.batch() as batch:
+            _ids = [D.process(stream='cased', batch=batch) for _ in range(5)]
+
+        for _id in _ids:
+            doc = D(_id)
+            self.assertEqual(b'THIS IS A TEST.', doc.upper.read())
+
+    def test_can_process_asynchronously_in_one_batch(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            upper = Feature(ToUpper, needs=stream, store=True)
+
+        async def process():
+            with D.database.batch() as batch:
+                return await asyncio.gather(*[
+                    D.aprocess(stream='cased', batch=batch)
+                    for _ in range(3)])
+
+        for _id in asyncio.run(process()):
+            self.assertEqual(b'THIS IS A TEST.', D(_id).upper.read())
+
+    def test_can_process_selected_features(self):
+        settings = self.Settings.clone(
+            id_provider=UserSpecifiedIdProvider(key='_id'))
+
+        class D(BaseModel, settings):
+            stream = Feature(TextStream, store=True)
+            copy = Feature(Counter, needs=stream, store=True)
+            upper = Feature(ToUpper, needs=copy, store=True)
+            lower = Feature(ToLower, needs=stream, store=True)
+
+        D.process(stream='cased', _id='doc', features=['upper'])
+        doc = D('doc')
+        self.assertEqual(b'THIS IS A TEST.', doc.upper.read())
+        self.assertFalse(D.exists('doc', D.lower))
+
+    def test_processing_selected_features_reads_stored_dependencies(self):
+        settings = self.Settings.clone(
+            id_provider=UserSpecifiedIdProvider(key='_id'))
+
+        class D(BaseModel, settings):
+            stream = Feature(TextStream, store=True)
+            copy = Feature(Counter, needs=stream, store=True)
+
+        class D2(D):
+            upper = Feature(ToUpper, needs=D.copy, store=True)
+
+        D.process(stream='cased', _id='doc')
+        Counter.Count = 0
+        D2.process(_id='doc', features=[D2.upper])
+        self.assertEqual(0, Counter.Count)
+        self.assertEqual(b'THIS IS A TEST.', D2('doc').upper.read())
+
+    def test_processing_selected_features_skips_stored_features(self):
+        settings = self.Settings.clone(
+            id_provider=UserSpecifiedIdProvider(key='_id'))
+
+        class D(BaseModel, settings):
+            stream = Feature(TextStream, store=True)
+            copy = Feature(Counter, needs=stream, store=True)
+
+        D.process(stream='cased', _id='doc')
+        Counter.Count = 0
+        D.process(stream='cased', _id='doc', features=['copy'])
+        self.assertEqual(0, Counter.Count)
+
+    def test_processing_selected_features_computes_missing_dependencies(self):
+        settings = self.Settings.clone(
+            id_provider=UserSpecifiedIdProvider(key='_id'))
+
+        class D(BaseModel, settings):
+            stream = Feature(TextStream, store=True)
+            copy = Feature(Counter, needs=stream, store=True)
+            upper = Feature(ToUpper, needs=copy, store=True)
+
+        D.process(stream='cased', _id='doc', features=['stream'])
+        Counter.Count = 0
+        D.process(_id='doc', features=['upper'])
+        self.assertGreater(Counter.Count, 0)
+        self.assertTrue(D.exists('doc', D.copy))
+        self.assertEqual(b'THIS IS A TEST.', D('doc').upper.read())
+
+    def test_can_compute_several_features_at_once(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            copy = Feature(Counter, needs=stream, store=False)
+            upper = Feature(ToUpper, needs=copy, store=False)
+            lower = Feature(ToLower, needs=copy, store=False)
+
+        _id = D.process(stream='cased')
+        Counter.Count = 0
+        D(_id).upper
+        D(_id).lower
+        separately = Counter.Count
+        self.assertGreater(separately, 0)
+
+        Counter.Count = 0
+        doc = D(_id)
+        results = doc.compute(['upper', D.lower, 'stream'])
+        self.assertEqual(separately // 2, Counter.Count)
+        self.assertEqual(b'THIS IS A TEST.', results['upper'].read())
+        self.assertEqual(b'this is a test.', results['lower'].read())
+        self.assertEqual(data_source['cased'], results['stream'].read())
+        self.assertIs(results['upper'], doc.upper)
+
+    def test_compute_raises_when_features_cannot_be_computed(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=False)
+            upper = Feature(ToUpper, needs=stream, store=False)
+
+        self.assertRaises(
+            AttributeError, lambda: D('missing').compute(['upper']))
+
+    def test_decoded_values_are_shared_across_instances_with_cache(self):
+        settings = self.Settings.clone(feature_cache=FeatureCache())
+
+        class D(BaseModel, settings):
+            stream = Feature(TextStream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        _id = D.process(stream='mary')
+        first = D(_id).count
+        second = D(_id).count
+        self.assertIs(first, second)
+        self.assertEqual(1, settings.feature_cache.hits)
+        self.assertEqual(1, settings.feature_cache.misses)
+
+    def test_clones_with_different_databases_do_not_share_cached_values(
+            self):
+        settings = self.Settings.clone(
+            id_provider=UserSpecifiedIdProvider(key='_id'),
+            feature_cache=FeatureCache())
+        first = settings.clone(database=InMemoryDatabase(
+            key_builder=settings.key_builder))
+        second = settings.clone(database=InMemoryDatabase(
+            key_builder=settings.key_builder))
+
+        class A(BaseModel, first):
+            stream = Feature(TextStream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        class B(BaseModel, second):
+            stream = Feature(TextStream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        A.process(stream='mary', _id='doc')
+        B.process(stream='humpty', _id='doc')
+        self.assertIn('lamb', A('doc').count)
+        self.assertNotIn('lamb', B('doc').count)
+
+    def test_can_hold_stored_streams_of_many_documents(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+
+        _ids = [D.process(stream='mary') for _ in range(200)]
+        streams = [D(_id).stream for _id in _ids]
+        self.assertTrue(
+            all(s.read() == data_source['mary'] for s in streams))
+
+    def test_streams_are_not_cached(self):
+        settings = self.Settings.clone(feature_cache=FeatureCache())
+
+        class D(BaseModel, settings):
+            stream = Feature(TextStream, store=True)
+
+        _id = D.process(stream='mary')
+        self.assertEqual(data_source['mary'], D(_id).stream.read())
+        self.assertEqual(data_source['mary'], D(_id).stream.read())
+        self.assertEqual(0, len(settings.feature_cache))
+
+    def test_computed_features_are_cached(self):
+        settings = self.Settings.clone(feature_cache=FeatureCache())
+
+        class D(BaseModel, settings):
+            stream = Feature(TextStream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=False)
+
+        _id = D.process(stream='mary')
+        D(_id).compute(['count'])
+        self.assertEqual(3, D(_id).count['lamb'])
+        self.assertEqual(1, settings.feature_cache.hits)
+
+    def test_reprocessing_document_invalidates_cache(self):
+        settings = self.Settings.clone(
+            id_provider=UserSpecifiedIdProvider(key='_id'),
+            feature_cache=FeatureCache())
+
+        class D(BaseModel, settings):
+            stream = Feature(TextStream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        D.process(stream='mary', _id='doc')
+        self.assertIn('lamb', D('doc').count)
+        D.process(stream='humpty', _id='doc')
+        self.assertNotIn('lamb', D('doc').count)
+
+    def test_reprocessing_document_in_shared_batch_invalidates_cache(self):
+        settings = self.Settings.clone(
+            id_provider=UserSpecifiedIdProvider(key='_id'),
+            feature_cache=FeatureCache())
+
+        class D(BaseModel, settings):
+            stream = Feature(TextStream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        D.process(stream='mary', _id='doc')
+        with D.database.batch() as batch:
+            D.process(stream='humpty', _id='doc', batch=batch)
+            D('doc').count
+        self.assertNotIn('lamb', D('doc').count)
+
+    def test_cannot_select_unstored_features_to_process(self):
+        class D(BaseModel, self.Settings):
+            stream = Feature(TextStream, store=True)
+            upper = Feature(ToUpper, needs=stream, store=False)
+
+        self.assertRaises(
+            ValueError,
+            lambda: D.process(stream='cased', features=['upper']))
+
     def test_unstored_feature_with_no_stored_dependents_is_not_computed_during_process(
             self):
         class D(BaseModel, self.Settings):
@@ -1513,6 +2027,62 @@ class BaseTest(object):
 
         self.assertRaises(ValueError, lambda: Numbers.process(stream='numbers'))
 
+    def test_raises_if_root_feature_name_is_a_process_option(self):
+        class Numbers(BaseModel, self.Settings):
+            trace = Feature(NumberStream, store=False)
+            add1 = Feature(Add, needs=trace, store=False, rhs=1)
+            stringify = Feature(
+                lambda x: ''.join(map(str, x)), needs=add1, store=True)
+
+        self.assertRaises(ValueError, lambda: Numbers.process(trace='numbers'))
+
+    def test_raises_if_variable_name_is_a_process_option(self):
+        class Numbers(BaseModel, self.Settings):
+            stream = Feature(NumberStream, store=False)
+            add1 = Feature(
+                AddBatch, needs=stream, store=False, batch=Var('batch'))
+            stringify = Feature(
+                lambda x: ''.join(map(str, x)), needs=add1, store=True)
+
+        self.assertRaises(
+            ValueError, lambda: Numbers.process(stream='numbers', batch=2))
+
+    def test_colliding_variable_name_is_found_when_template_is_built(self):
+        class Numbers(BaseModel, self.Settings):
+            stream = Feature(NumberStream, store=False)
+            add1 = Feature(
+                AddBatch, needs=stream, store=False, batch=Var('batch'))
+            stringify = Feature(
+                lambda x: ''.join(map(str, x)), needs=add1, store=True)
+
+        self.assertRaises(ValueError, Numbers.graph_template)
+
+    def test_aprocess_raises_if_variable_name_is_a_process_option(self):
+        class Numbers(BaseModel, self.Settings):
+            stream = Feature(NumberStream, store=False)
+            add1 = Feature(
+                AddBatch, needs=stream, store=False, batch=Var('batch'))
+            stringify = Feature(
+                lambda x: ''.join(map(str, x)), needs=add1, store=True)
+
+        self.assertRaises(
+            ValueError,
+            lambda: asyncio.run(Numbers.aprocess(stream='numbers', batch=2)))
+
+    def test_raises_for_colliding_names_when_processing_selected_features(
+            self):
+        class Numbers(BaseModel, self.Settings):
+            stream = Feature(NumberStream, store=False)
+            add1 = Feature(
+                AddBatch, needs=stream, store=False, batch=Var('batch'))
+            stringify = Feature(
+                lambda x: ''.join(map(str, x)), needs=add1, store=True)
+
+        self.assertRaises(
+            ValueError,
+            lambda: Numbers.process(
+                stream='numbers', batch=2, features=['stringify']))
+
     def test_feature_with_multiple_inputs_using_a_tuple(self):
         class Numbers(BaseModel, self.Settings):
             stream = Feature(NumberStream, store=False)
@@ -1761,6 +2331,151 @@ class BaseTest(object):
         self.assertEqual(data_source['lorem'].lower(), b''.join(doc.lowercase))
 
 
+class ContainsCountingDatabase(InMemoryDatabase):
+    def __init__(self, key_builder=None):
+        super(ContainsCountingDatabase, self).__init__(key_builder=key_builder)
+        self.contains_checks = defaultdict(int)
+
+    def __contains__(self, key):
+        self.contains_checks[key] += 1
+        return super(ContainsCountingDatabase, self).__contains__(key)
+
+
+class ComputePlanTests(unittest2.TestCase):
+    def setUp(self):
+        class Settings(PersistenceSettings):
+            id_provider = UuidProvider()
+            key_builder = StringDelimitedKeyBuilder()
+            database = ContainsCountingDatabase(key_builder=key_builder)
+
+        class Diamonds(BaseModel, Settings):
+            stream = Feature(TextStream, store=True)
+            upper = Feature(ToUpper, needs=stream, store=True)
+            lower = Feature(ToLower, needs=stream, store=False)
+            cat1 = Feature(EagerConcatenate, needs=[upper, lower], store=False)
+            cat2 = Feature(EagerConcatenate, needs=[upper, lower], store=False)
+            cat3 = Feature(EagerConcatenate, needs=[cat1, cat2], store=False)
+            cat4 = Feature(EagerConcatenate, needs=[cat1, cat2], store=False)
+            cat5 = Feature(EagerConcatenate, needs=[cat3, cat4], store=False)
+
+        self.Diamonds = Diamonds
+        self.database = Settings.database
+
+    def test_checks_each_stored_feature_once(self):
+        _id = self.Diamonds.process(stream='cased')
+        self.database.contains_checks.clear()
+        doc = self.Diamonds(_id)
+        doc.cat5
+        self.assertEqual(2, len(self.database.contains_checks))
+        self.assertTrue(
+            all(v == 1 for v in self.database.contains_checks.values()))
+
+    def test_visits_each_feature_once(self):
+        _id = self.Diamonds.process(stream='cased')
+        plan = ComputePlan(self.Diamonds.cat5, _id, self.Diamonds)
+        self.assertTrue(plan.can_compute)
+        self.assertEqual(
+            ['cat5', 'cat3', 'cat1', 'upper', 'lower', 'stream', 'cat2',
+             'cat4'],
+            list(plan.features.keys()))
+
+    def test_dependencies_of_stored_features_are_not_planned(self):
+        _id = self.Diamonds.process(stream='cased')
+        plan = ComputePlan(self.Diamonds.upper, _id, self.Diamonds)
+        self.assertEqual(['upper'], list(plan.features.keys()))
+
+    def test_cannot_compute_when_stored_roots_are_missing(self):
+        plan = ComputePlan(self.Diamonds.cat5, 'missing', self.Diamonds)
+        self.assertFalse(plan.can_compute)
+
+
+class BatchRecordingLmdbDatabase(LmdbDatabase):
+    def __init__(self, *args, **kwargs):
+        super(BatchRecordingLmdbDatabase, self).__init__(*args, **kwargs)
+        self.batches = []
+
+    def batch(self, max_bytes=64 * 1024 * 1024):
+        batch = super(BatchRecordingLmdbDatabase, self).batch(
+            max_bytes=max_bytes)
+        self.batches.append(batch)
+        return batch
+
+
+class VisibilityCheckingEventLog(object):
+    """
+    Records whether each feature was readable when its event was logged
+    """
+
+    def __init__(self, key_builder):
+        super(VisibilityCheckingEventLog, self).__init__()
+        self.key_builder = key_builder
+        self.database = None
+        self.visible = []
+
+    def append(self, data):
+        event = json.loads(data)
+        key = self.key_builder.build(
+            event['_id'], event['name'], event['version'])
+        self.visible.append(key in self.database)
+
+
+class LmdbWriteBatchTests(unittest2.TestCase):
+    def setUp(self):
+        self._dir = mkdtemp()
+
+        class Settings(PersistenceSettings):
+            id_provider = UuidProvider()
+            key_builder = StringDelimitedKeyBuilder()
+            database = BatchRecordingLmdbDatabase(
+                path=self._dir,
+                map_size=10000000,
+                key_builder=key_builder)
+            event_log = VisibilityCheckingEventLog(key_builder)
+
+        class Document(BaseModel, Settings):
+            stream = Feature(TextStream, store=True)
+            upper = Feature(ToUpper, needs=stream, store=True)
+            lower = Feature(ToLower, needs=stream, store=True)
+
+        self.Document = Document
+        self.database = Settings.database
+        self.event_log = Settings.event_log
+        self.event_log.database = Settings.database
+
+    def tearDown(self):
+        self.database.close()
+        rmtree(self._dir)
+
+    def test_commits_all_features_of_a_document_at_once(self):
+        _id = self.Document.process(stream='cased')
+        self.assertEqual(1, len(self.database.batches))
+        self.assertEqual(1, self.database.batches[0].commits)
+        doc = self.Document(_id)
+        self.assertEqual(b'THIS IS A TEST.', doc.upper.read())
+        self.assertEqual(b'this is a test.', doc.lower.read())
+
+    def test_commits_many_documents_at_once(self):
+        with self.database.batch() as batch:
+            _ids = [
+                self.Document.process(stream='cased', batch=batch)
+                for _ in range(5)]
+            self.assertFalse(any(self.Document.exists(_id) for _id in _ids))
+        self.assertEqual(1, batch.commits)
+        self.assertEqual(1, len(self.database.batches))
+        self.assertTrue(all(self.Document.exists(_id) for _id in _ids))
+
+    def test_events_are_logged_after_features_are_committed(self):
+        self.Document.process(stream='cased')
+        self.assertEqual([True] * 3, self.event_log.visible)
+
+    def test_events_wait_for_shared_batch_to_commit(self):
+        with self.database.batch() as batch:
+            for _ in range(2):
+                self.Document.process(stream='cased', batch=batch)
+            self.assertEqual([], self.event_log.visible)
+        self.assertEqual([True] * 6, self.event_log.visible)
+
+
 class InMemoryTest(BaseTest, unittest2.TestCase):
     def setUp(self):
         class Settings(PersistenceSettings):
@@ -168,3 +168,316 @@ class LmdbDatabaseTests(unittest2.TestCase):
         with self.db.write_stream(key, 'application/octet-stream') as ws:
             ws.write('')
         self.assertFalse(key in self.db)
+
+    def test_can_write_ten_features(self):
+        keys = [
+            self.key_builder.build('id', 'feature{i}'.format(i=i), 'version')
+            for i in range(10)]
+        for key in keys:
+            with self.db.write_stream(key, 'application/octet-stream') as ws:
+                ws.write(self.value)
+        self.assertTrue(all(key in self.db for key in keys))
+        self.assertEqual(['id'], list(self.db.iter_ids()))
+
+    def test_can_read_and_write_after_reopening(self):
+        self.write_key()
+        self.db.reopen()
+        with self.db.read_stream(self.key) as rs:
+            self.assertEqual(self.value, rs.read())
+        key = self.key_builder.build(uuid4().hex, 'feature', 'version')
+        with self.db.write_stream(key, 'application/octet-stream') as ws:
+            ws.write(self.value)
+        self.assertTrue(key in self.db)
+
+    def test_read_view_exposes_value_without_copying(self):
+        self.write_key()
+        with self.db.read_view(self.key) as rs:
+            self.assertTrue(rs.pinned)
+            view = rs.view()
+            self.assertIsInstance(view, memoryview)
+            self.assertTrue(view.readonly)
+            self.assertEqual(self.value, view.tobytes())
+
+    def test_can_read_into_buffer(self):
+        self.write_key()
+        buf = bytearray(600)
+        with self.db.read_stream(self.key) as rs:
+            self.assertEqual(600, rs.readinto(buf))
+            self.assertEqual(self.value[:600], bytes(buf))
+            self.assertEqual(400, rs.readinto(buf))
+            self.assertEqual(self.value[600:], bytes(buf[:400]))
+
+    def test_cannot_read_from_closed_stream(self):
+        self.write_key()
+        rs = self.db.read_stream(self.key)
+        rs.close()
+        self.assertRaises(ValueError, lambda: rs.read())
+
+    def test_read_view_raises_key_error_for_missing_key(self):
+        def read():
+            with self.db.read_view(self.key):
+                pass
+
+        self.assertRaises(KeyError, read)
+
+    def test_view_is_released_when_read_view_exits(self):
+        self.write_key()
+        with self.db.read_view(self.key) as rs:
+            view = rs.view()
+        self.assertTrue(rs.closed)
+        self.assertRaises(ValueError, lambda: view.tobytes())
+
+    def test_closing_database_closes_open_views(self):
+        self.write_key()
+        with self.db.read_view(self.key) as rs:
+            self.db.close()
+            self.assertTrue(rs.closed)
+            self.assertRaises(ValueError, lambda: rs.read())
+
+    def test_read_streams_do_not_hold_read_transactions(self):
+        self.write_key()
+        # more than LMDB's default limit of 126 readers
+        streams = [self.db.read_stream(self.key) for _ in range(200)]
+        self.assertFalse(any(rs.pinned for rs in streams))
+        self.assertTrue(all(rs.read() == self.value for rs in streams))
+
+    def test_read_stream_is_valid_after_database_is_closed(self):
+        self.write_key()
+        rs = self.db.read_stream(self.key)
+        self.db.close()
+        self.assertEqual(self.value, rs.read())
+
+
+class SegmentedLmdbDatabaseTests(unittest2.TestCase):
+    def setUp(self):
+        self.dir = uuid4().hex
+        self.path = '/tmp/{dir}'.format(dir=self.dir)
+        self.key_builder = StringDelimitedKeyBuilder()
+        self.db = LmdbDatabase(
+            self.path,
+            map_size=100000000,
+            key_builder=self.key_builder,
+            segment_size=1024)
+        self.key = self.key_builder.build('id', 'feature', 'version')
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def write(self, value, key=None, chunksize=100):
+        key = key or self.key
+        with self.db.write_stream(key, 'application/octet-stream') as ws:
+            for i in range(0, len(value), chunksize):
+                ws.write(value[i: i + chunksize])
+
+    def read(self, key=None):
+        with self.db.read_stream(key or self.key) as rs:
+            return rs.read()
+
+    def segment_count(self):
+        with self.db.env.begin() as txn:
+            return txn.stat(self.db.segment_db)['entries']
+
+    def test_can_read_large_value(self):
+        value = os.urandom(10000)
+        self.write(value)
+        self.assertEqual(value, self.read())
+        self.assertGreater(self.segment_count(), 1)
+
+    def test_can_view_large_value(self):
+        value = os.urandom(10000)
+        self.write(value)
+        with self.db.read_stream(self.key) as rs:
+            self.assertEqual(value, rs.view().tobytes())
+
+    def test_small_value_is_not_segmented(self):
+        value = os.urandom(100)
+        self.write(value)
+        self.assertEqual(value, self.read())
+        self.assertEqual(0, self.segment_count())
+
+    def test_size_of_large_value(self):
+        self.write(os.urandom(10000))
+        self.assertEqual(10000, self.db.size(self.key))
+
+    def test_large_value_is_listed_once(self):
+        self.write(os.urandom(10000))
+        self.assertEqual(['id'], list(self.db.iter_ids()))
+        self.assertTrue(self.key in self.db)
+
+    def test_overwriting_removes_old_segments(self):
+        self.write(os.urandom(10000))
+        value = os.urandom(5000)
+        self.write(value)
+        self.assertEqual(value, self.read())
+        self.assertEqual(5, self.segment_count())
+
+    def test_overwriting_with_small_value_removes_old_segments(self):
+        self.write(os.urandom(10000))
+        value = os.urandom(10)
+        self.write(value)
+        self.assertEqual(value, self.read())
+        self.assertEqual(0, self.segment_count())
+
+    def test_deleting_removes_segments(self):
+        self.write(os.urandom(10000))
+        del self.db[self.key]
+        self.assertFalse(self.key in self.db)
+        self.assertEqual(0, self.segment_count())
+
+    def test_can_read_large_value_after_reopening(self):
+        value = os.urandom(10000)
+        self.write(value)
+        self.db.reopen()
+        self.assertEqual(value, self.read())
+        self.assertEqual(['id'], list(self.db.iter_ids()))
+
+    def test_sweep_removes_segments_of_abandoned_writes(self):
+        value = os.urandom(10000)
+        self.write(value)
+        ws = self.db.write_stream(
+            self.key_builder.build('other', 'feature', 'version'),
+            'application/octet-stream')
+        for _ in range(5):
+            ws.write(os.urandom(1024))
+        del ws
+        self.assertEqual(15, self.segment_count())
+        self.assertEqual(5, self.db.sweep_segments())
+        self.assertEqual(10, self.segment_count())
+        self.assertEqual(value, self.read())
+
+    def test_sweep_keeps_segments_of_open_streams(self):
+        key = self.key_builder.build('other', 'feature', 'version')
+        value = os.urandom(5000)
+        with self.db.write_stream(key, 'application/octet-stream') as ws:
+            ws.write(value)
+            self.assertEqual(0, self.db.sweep_segments())
+        self.assertEqual(value, self.read(key))
+
+    def test_write_memory_is_bounded_by_segment_size(self):
+        import tracemalloc
+        chunk = os.urandom(1024)
+        tracemalloc.start()
+        try:
+            with self.db.write_stream(
+                    self.key, 'application/octet-stream') as ws:
+                for _ in range(10000):
+                    ws.write(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 1024 * 1024)
+        self.assertEqual(1024 * 10000, self.db.size(self.key))
+
+
+class LmdbWriteBatchTests(unittest2.TestCase):
+    def setUp(self):
+        self.ephemeral = EphemeralLmdb()
+        self.db = self.ephemeral.db
+        self.key_builder = self.ephemeral.key_builder
+
+    def tearDown(self):
+        self.ephemeral.clean_up()
+
+    def key(self, _id='id'):
+        return self.key_builder.build(_id, 'feature', 'version')
+
+    def write(self, batch, key, value):
+        with batch.write_stream(key, 'application/octet-stream') as ws:
+            ws.write(value)
+
+    def read(self, key):
+        with self.db.read_stream(key) as rs:
+            return rs.read()
+
+    def test_values_are_not_visible_until_committed(self):
+        with self.db.batch() as batch:
+            self.write(batch, self.key(), b'value')
+            self.assertFalse(self.key() in self.db)
+            self.assertTrue(self.key() in batch)
+        self.assertEqual(b'value', self.read(self.key()))
+
+    def test_commits_many_values_at_once(self):
+        with self.db.batch() as batch:
+            for i in range(10):
+                self.write(batch, self.key(str(i)), b'value')
+        self.assertEqual(1, batch.commits)
+        self.assertEqual(10, len(list(self.db.iter_ids())))
+
+    def test_last_write_to_a_key_wins(self):
+        with self.db.batch() as batch:
+            self.write(batch, self.key(), b'first')
+            self.write(batch, self.key(), b'second')
+        self.assertEqual(b'second', self.read(self.key()))
+
+    def test_can_delete_pending_value(self):
+        with self.db.batch() as batch:
+            self.write(batch, self.key(), b'value')
+            del batch[self.key()]
+            self.assertFalse(self.key() in batch)
+        self.assertFalse(self.key() in self.db)
+
+    def test_can_delete_committed_value(self):
+        with self.db.write_stream(self.key(), 'application/octet-stream') as ws:
+            ws.write(b'value')
+        with self.db.batch() as batch:
+            del batch[self.key()]
+            self.assertTrue(self.key() in self.db)
+        self.assertFalse(self.key() in self.db)
+
+    def test_commits_early_when_max_bytes_are_pending(self):
+        with self.db.batch(max_bytes=1000) as batch:
+            for i in range(10):
+                self.write(batch, self.key(str(i)), os.urandom(500))
+        self.assertEqual(5, batch.commits)
+        self.assertEqual(10, len(list(self.db.iter_ids())))
+
+    def test_can_write_segmented_value(self):
+        self.db.segment_size = 1024
+        value = os.urandom(10000)
+        with self.db.batch() as batch:
+            with batch.write_stream(
+                    self.key(), 'application/octet-stream') as ws:
+                for i in range(0, len(value), 100):
+                    ws.write(value[i: i + 100])
+        self.assertEqual(value, self.read(self.key()))
+        self.assertEqual(10000, self.db.size(self.key()))
+
+    def segment_count(self):
+        with self.db.env.begin() as txn:
+            return txn.stat(self.db.segment_db)['entries']
+
+    def write_segmented(self, batch, value):
+        self.db.segment_size = 1024
+        with batch.write_stream(self.key(), 'application/octet-stream') as ws:
+            for i in range(0, len(value), 100):
+                ws.write(value[i: i + 100])
+
+    def test_deleting_pending_segmented_value_removes_segments(self):
+        with self.db.batch() as batch:
+            self.write_segmented(batch, os.urandom(10000))
+            del batch[self.key()]
+        self.assertFalse(self.key() in self.db)
+        self.assertEqual(0, self.segment_count())
+
+    def test_replacing_pending_segmented_value_removes_segments(self):
+        value = os.urandom(5000)
+        with self.db.batch() as batch:
+            self.write_segmented(batch, os.urandom(10000))
+            self.write_segmented(batch, value)
+        self.assertEqual(value, self.read(self.key()))
+        self.assertEqual(5, self.segment_count())
+
+    def test_sweep_keeps_segments_of_pending_values(self):
+        value = os.urandom(10000)
+        with self.db.batch() as batch:
+            self.write_segmented(batch, value)
+            self.assertEqual(0, self.db.sweep_segments())
+        self.assertEqual(value, self.read(self.key()))
+
+    def test_missing_segment_raises_io_error(self):
+        with self.db.batch() as batch:
+            self.write_segmented(batch, os.urandom(10000))
+        with self.db.env.begin(write=True) as txn:
+            txn.drop(self.db.segment_db, delete=False)
+        self.assertRaises(IOError, lambda: self.read(self.key()))
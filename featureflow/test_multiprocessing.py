@@ -3,7 +3,7 @@ from .feature import Feature, JSONFeature
 from .lmdbstore import LmdbDatabase
 from .model import BaseModel
 from .persistence import PersistenceSettings, UuidProvider, \
-    StringDelimitedKeyBuilder
+    StringDelimitedKeyBuilder, simple_in_memory_settings
 from .test_integration import TextStream, Tokenizer, WordCount
 from tempfile import mkdtemp
 from multiprocessing import Pool
@@ -35,3 +35,35 @@ class MultiProcessTests(unittest2.TestCase):
         pool = Pool(4)
         counts = pool.map(get_count, [_ for _ in range(10)])
         self.assertSequenceEqual([2] * 10, counts)
+
+    def test_can_process_many_documents_in_worker_processes(self):
+        texts = ['mary', 'humpty', 'lorem', 'cased']
+        results = list(D.process_many(
+            ({'stream': text} for text in texts), workers=2))
+        self.assertEqual(4, len(results))
+        for result in results:
+            self.assertTrue(result.seconds > 0)
+            self.assertTrue(result.documents_per_second > 0)
+        counts = [D(result._id).count for result in results]
+        self.assertIn(3, [c.get('lamb') for c in counts])
+
+    def test_process_many_passes_extra_arguments_to_process(self):
+        results = list(D.process_many(
+            [{'stream': 'mary'}], workers=1, compiled=True))
+        self.assertEqual(3, D(results[0]._id).count['lamb'])
+
+    def test_processed_ids_are_visible_in_parent_process(self):
+        results = list(D.process_many(
+            [{'stream': 'mary'}, {'stream': 'humpty'}], workers=2))
+        ids = set(D.database.iter_ids())
+        for result in results:
+            self.assertIn(result._id, ids)
+
+    def test_process_many_raises_for_in_memory_database(self):
+        @simple_in_memory_settings
+        class InMemory(BaseModel):
+            stream = Feature(TextStream, store=True)
+
+        self.assertRaises(
+            ValueError,
+            lambda: InMemory.process_many([{'stream': 'mary'}], workers=1))
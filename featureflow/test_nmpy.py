@@ -2,7 +2,8 @@ import unittest2
 
 try:
     import numpy as np
-    from .nmpy import NumpyFeature, StreamingNumpyDecoder, PackedNumpyEncoder
+    from .nmpy import NumpyFeature, StreamingNumpyDecoder, PackedNumpyEncoder, \
+        ArrayBuffer, WindowedNode
 except ImportError:
     np = None
 
@@ -10,7 +11,7 @@ from .persistence import PersistenceSettings
 from .data import *
 from .model import BaseModel
 from .lmdbstore import LmdbDatabase
-from .extractor import Node
+from .extractor import Node, Graph
 from tempfile import mkdtemp
 from shutil import rmtree
 
@@ -122,6 +123,37 @@ class GreedyNumpyLmdbTest(BaseNumpyTest, unittest2.TestCase):
     def tearDown(self):
         rmtree(self._dir)
 
+    def test_decoded_array_owns_its_data(self):
+        cls = self._build_doc()
+        _id = cls.process(feat=np.arange(100, dtype=np.float32))
+        self.assertTrue(cls(_id).feat.flags.owndata)
+
+    def test_decoded_arrays_do_not_hold_read_transactions(self):
+        cls = self._build_doc()
+        _id = cls.process(feat=np.arange(100, dtype=np.float32))
+        # more than LMDB's default limit of 126 readers
+        arrays = [cls(_id).feat for _ in range(200)]
+        self.assertEqual(200, len(arrays))
+        np.testing.assert_array_equal(np.arange(100), cls(_id).feat)
+
+    def test_decoded_array_is_valid_after_database_is_closed(self):
+        cls = self._build_doc()
+        arr = np.arange(100, dtype=np.float32)
+        _id = cls.process(feat=arr)
+        recovered = cls(_id).feat
+        cls.database.close()
+        self.assertEqual(arr.sum(), recovered.sum())
+
+    def test_array_is_valid_after_value_is_deleted(self):
+        cls = self._build_doc()
+        arr = np.arange(1000, dtype=np.float64)
+        _id = cls.process(feat=arr)
+        recovered = cls(_id).feat
+        del cls.database[cls.feat.feature_key(_id, cls)]
+        for _ in range(20):
+            cls.process(feat=np.zeros(1000))
+        np.testing.assert_array_equal(arr, recovered)
+
 
 class StreamingNumpyTest(BaseNumpyTest, unittest2.TestCase):
     def _register_database(self, settings_class):
@@ -204,3 +236,180 @@ class StreamingNumpyLmdbTest(BaseNumpyTest, unittest2.TestCase):
 
     def _restore(self, data):
         return np.concatenate(list(data))
+
+    def test_decoders_do_not_hold_read_transactions(self):
+        cls = self._build_doc()
+        _id = cls.process(feat=np.arange(100, dtype=np.float32))
+        # more than LMDB's default limit of 126 readers
+        decoders = [cls(_id).feat for _ in range(200)]
+        np.testing.assert_array_equal(
+            np.arange(100), np.concatenate(list(decoders[-1])))
+
+    def test_chunks_are_valid_after_value_is_deleted(self):
+        cls = self._build_doc()
+        arr = np.arange(1000, dtype=np.float64)
+        _id = cls.process(feat=arr)
+        chunks = list(cls(_id).feat)
+        del cls.database[cls.feat.feature_key(_id, cls)]
+        for _ in range(20):
+            cls.process(feat=np.zeros(1000))
+        np.testing.assert_array_equal(arr, np.concatenate(chunks))
+
+
+class ArrayBufferTests(unittest2.TestCase):
+    def setUp(self):
+        if np is None:
+            self.skipTest('numpy is not available')
+
+    def test_appends_and_consumes_rows(self):
+        buf = ArrayBuffer(capacity=4)
+        buf.append(np.arange(6).reshape((3, 2)))
+        buf.append(np.arange(6, 10).reshape((2, 2)))
+        self.assertEqual(5, len(buf))
+        np.testing.assert_array_equal(
+            np.arange(4).reshape((2, 2)), buf.consume(2))
+        np.testing.assert_array_equal(
+            np.arange(4, 10).reshape((3, 2)), buf.view())
+
+    def test_grows_capacity(self):
+        buf = ArrayBuffer(capacity=2)
+        for i in range(10):
+            buf.append(np.arange(i * 3, (i + 1) * 3))
+        self.assertGreaterEqual(buf.capacity, 30)
+        np.testing.assert_array_equal(np.arange(30), buf.consume())
+
+    def test_reuses_storage_when_rows_are_consumed(self):
+        buf = ArrayBuffer(capacity=8)
+        for i in range(100):
+            buf.append(np.array([i, i]))
+            np.testing.assert_array_equal(np.array([i, i]), buf.consume())
+        self.assertEqual(8, buf.capacity)
+
+    def test_consume_returns_a_copy(self):
+        buf = ArrayBuffer(capacity=4)
+        buf.append(np.zeros(4))
+        consumed = buf.consume(2)
+        buf.append(np.ones(2))
+        np.testing.assert_array_equal(np.zeros(2), consumed)
+
+    def test_uses_specified_dtype(self):
+        buf = ArrayBuffer(dtype=np.float32)
+        buf.append(np.arange(3))
+        self.assertEqual(np.float32, buf.view().dtype)
+
+    def test_empty_view(self):
+        self.assertEqual(0, len(ArrayBuffer().view()))
+
+    def test_views_stay_valid_without_compaction(self):
+        buf = ArrayBuffer(capacity=4, compact=False)
+        buf.append(np.arange(4))
+        view = buf.view()
+        buf.discard(4)
+        buf.append(np.arange(4, 8))
+        np.testing.assert_array_equal(np.arange(4), view)
+        np.testing.assert_array_equal(np.arange(4, 8), buf.view())
+
+
+class ArraySource(Node):
+    def __init__(self, chunksize=7, needs=None):
+        super(ArraySource, self).__init__(needs=needs)
+        self._chunksize = chunksize
+
+    def _process(self, data):
+        for i in range(0, len(data), self._chunksize):
+            yield data[i: i + self._chunksize]
+
+
+class CollectWindows(Node):
+    def __init__(self, needs=None):
+        super(CollectWindows, self).__init__(needs=needs)
+        self.collected = []
+
+    def _process(self, data):
+        self.collected.append(data)
+        yield data
+
+
+class WindowedNodeTests(unittest2.TestCase):
+    def setUp(self):
+        if np is None:
+            self.skipTest('numpy is not available')
+
+    def _windows(self, data, chunksize=7, **kwargs):
+        g = Graph()
+        g['source'] = ArraySource(chunksize=chunksize)
+        g['windowed'] = WindowedNode(needs=g['source'], **kwargs)
+        g['sink'] = CollectWindows(needs=g['windowed'])
+        g.process(source=data)
+        return g['sink'].collected
+
+    def _expected(self, data, size, step):
+        return np.array(
+            [data[i: i + size] for i in range(0, len(data) - size + 1, step)])
+
+    def test_overlapping_windows(self):
+        data = np.arange(50)
+        batches = self._windows(data, size=8, step=4, pad=False)
+        np.testing.assert_array_equal(
+            self._expected(data, 8, 4), np.concatenate(batches))
+
+    def test_windows_are_batched_per_chunk(self):
+        data = np.arange(50)
+        batches = self._windows(data, chunksize=10, size=4, step=2, pad=False)
+        self.assertEqual(5, len(batches))
+
+    def test_windows_are_views(self):
+        data = np.arange(50, dtype=np.float32)
+        batches = self._windows(data, chunksize=50, size=8, step=4, pad=False)
+        self.assertEqual(1, len(batches))
+        self.assertIsNotNone(batches[0].base)
+        self.assertEqual((11, 8), batches[0].shape)
+
+    def test_windows_remain_valid_after_more_data_arrives(self):
+        data = np.arange(1000)
+        batches = self._windows(
+            data, chunksize=3, size=8, step=3, pad=False, capacity=16)
+        np.testing.assert_array_equal(
+            self._expected(data, 8, 3), np.concatenate(batches))
+
+    def test_step_larger_than_size(self):
+        data = np.arange(50)
+        batches = self._windows(data, chunksize=3, size=2, step=5, pad=False)
+        np.testing.assert_array_equal(
+            self._expected(data, 2, 5), np.concatenate(batches))
+
+    def test_multidimensional_examples(self):
+        data = np.arange(60).reshape((30, 2))
+        batches = self._windows(data, size=4, step=2, pad=False)
+        np.testing.assert_array_equal(
+            self._expected(data, 4, 2), np.concatenate(batches))
+
+    def test_pads_final_partial_window(self):
+        data = np.arange(1, 11)
+        batches = self._windows(data, size=4, step=4)
+        windows = np.concatenate(batches)
+        self.assertEqual((3, 4), windows.shape)
+        np.testing.assert_array_equal([9, 10, 0, 0], windows[-1])
+
+    def test_does_not_pad_when_all_examples_are_covered(self):
+        data = np.arange(12)
+        batches = self._windows(data, size=4, step=4)
+        self.assertEqual((3, 4), np.concatenate(batches).shape)
+
+    def test_does_not_pad_overlap_from_last_window(self):
+        data = np.arange(10)
+        batches = self._windows(data, size=4, step=2)
+        windows = np.concatenate(batches)
+        self.assertEqual((4, 4), windows.shape)
+        np.testing.assert_array_equal([6, 7, 8, 9], windows[-1])
+
+    def test_pads_input_shorter_than_window(self):
+        data = np.arange(1, 4)
+        batches = self._windows(data, size=8)
+        np.testing.assert_array_equal(
+            [[1, 2, 3, 0, 0, 0, 0, 0]], np.concatenate(batches))
+
+    def test_drops_final_partial_window_when_not_padding(self):
+        data = np.arange(10)
+        batches = self._windows(data, size=4, step=4, pad=False)
+        self.assertEqual((2, 4), np.concatenate(batches).shape)
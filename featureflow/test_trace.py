@@ -0,0 +1,140 @@
+import unittest2
+import json
+import asyncio
+from io import StringIO
+from collections import defaultdict
+from .trace import TraceRecorder
+from .model import BaseModel
+from .feature import Feature, JSONFeature
+from .persistence import PersistenceSettings
+from .data import UuidProvider, StringDelimitedKeyBuilder, InMemoryDatabase
+from .test_integration import TextStream, Tokenizer, WordCount, \
+    AsyncTextStream
+from .test_extractor import word_count_graph, fan_out_graph, \
+    last_chunk_graph
+
+
+class Settings(PersistenceSettings):
+    id_provider = UuidProvider()
+    key_builder = StringDelimitedKeyBuilder()
+    database = InMemoryDatabase(key_builder=key_builder)
+
+
+class TraceRecorderTests(unittest2.TestCase):
+    def _events(self, recorder, phase=None, category=None):
+        return [
+            e for e in recorder.events
+            if (phase is None or e['ph'] == phase)
+            and (category is None or e['cat'] == category)]
+
+    def test_begin_and_end_events_are_balanced_per_thread(self):
+        recorder = TraceRecorder()
+        g = word_count_graph()
+        g.trace(recorder)
+        g.process(stream='mary')
+        depth = defaultdict(int)
+        for event in recorder.events:
+            if event['ph'] == 'B':
+                depth[event['tid']] += 1
+            elif event['ph'] == 'E':
+                depth[event['tid']] -= 1
+                self.assertGreaterEqual(depth[event['tid']], 0)
+        self.assertTrue(all(v == 0 for v in depth.values()))
+
+    def test_records_one_process_span_per_chunk(self):
+        recorder = TraceRecorder()
+        g = word_count_graph()
+        g.trace(recorder)
+        g.process(stream='mary')
+        begins = [
+            e for e in self._events(recorder, 'B', 'process')
+            if e['name'] == 'stream']
+        # one span per chunk, plus a final span that ends the generator
+        self.assertEqual(17, len(begins))
+        self.assertEqual('TextStream', begins[0]['args']['node'])
+
+    def test_records_stalls_as_instant_events(self):
+        recorder = TraceRecorder()
+        g = word_count_graph()
+        g.trace(recorder)
+        g.process(stream='mary')
+        stalls = self._events(recorder, 'i', 'stall')
+        self.assertIn('count', set(e['name'] for e in stalls))
+
+    def test_records_last_chunk_spans(self):
+        recorder = TraceRecorder()
+        g = fan_out_graph()
+        g.trace(recorder)
+        g.compile().process(stream='mary')
+        names = set(
+            e['name'] for e in self._events(recorder, 'B', 'last_chunk'))
+        self.assertIn('last', names)
+
+    def test_last_chunks_produced_by_process_are_traced_once(self):
+        recorder = TraceRecorder()
+        g = last_chunk_graph()
+        g.trace(recorder)
+        g.process(stream='mary')
+        categories = []
+        for event in recorder.events:
+            if event['ph'] == 'B' and event['name'] == 'last':
+                categories.append(event['cat'])
+        # one process span per chunk, plus one that ends each generator
+        chunks = len(g['sink'].collected) - 1
+        self.assertEqual(chunks + chunks, categories.count('process'))
+        self.assertEqual(2, categories.count('last_chunk'))
+
+    def test_timestamps_are_monotonic(self):
+        recorder = TraceRecorder()
+        g = word_count_graph()
+        g.trace(recorder)
+        g.process(stream='mary')
+        timestamps = [e['ts'] for e in recorder.events]
+        self.assertEqual(sorted(timestamps), timestamps)
+
+    def test_can_dump_chrome_trace_json(self):
+        recorder = TraceRecorder()
+        g = word_count_graph()
+        g.trace(recorder)
+        g.process(stream='mary')
+        flo = StringIO()
+        recorder.dump(flo)
+        data = json.loads(flo.getvalue())
+        self.assertEqual(len(recorder.events), len(data['traceEvents']))
+        self.assertEqual('ms', data['displayTimeUnit'])
+
+    def test_can_trace_document_processing(self):
+        class Doc(BaseModel, Settings):
+            stream = Feature(TextStream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=True)
+
+        recorder = TraceRecorder()
+        _id = Doc.process(stream='mary', trace=recorder, threads=2)
+        documents = self._events(recorder, 'B', 'document')
+        self.assertEqual(1, len(documents))
+        self.assertEqual(_id, documents[0]['args']['_id'])
+        names = set(e['name'] for e in self._events(recorder, 'B', 'process'))
+        self.assertIn('count_writer', names)
+
+    def test_records_complete_events_for_async_nodes(self):
+        class Doc(BaseModel, Settings):
+            stream = Feature(AsyncTextStream, store=True)
+
+        recorder = TraceRecorder()
+        asyncio.run(Doc.aprocess(stream='mary', trace=recorder))
+        complete = self._events(recorder, 'X', 'process')
+        self.assertEqual(17, len(complete))
+        self.assertTrue(all(e['dur'] >= 0 for e in complete))
+
+    def test_can_trace_unstored_feature_computation(self):
+        class Doc(BaseModel, Settings):
+            stream = Feature(TextStream, store=True)
+            words = Feature(Tokenizer, needs=stream, store=False)
+            count = JSONFeature(WordCount, needs=words, store=False)
+
+        _id = Doc.process(stream='mary')
+        recorder = TraceRecorder()
+        Doc.count(_id, persistence=Doc, trace=recorder)
+        names = set(e['name'] for e in self._events(recorder, 'B', 'process'))
+        self.assertIn('count', names)
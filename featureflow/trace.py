@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from .extractor import NotEnoughData, _iter_unwrapped
+
+
+class TraceRecorder(object):
+    """
+    Record the execution of one or more graphs as a timeline of events in the
+    Chrome trace-event format, which can be loaded by chrome://tracing or
+    https://ui.perfetto.dev.
+
+    Each node invocation (enqueuing, dequeuing, and producing each chunk of
+    output) is recorded as a pair of begin/end events, named after the node's
+    key in the graph, on a track for the thread that ran it.  Chunks produced
+    by asynchronous nodes are recorded as complete events.  Stalls, where a
+    node raises `NotEnoughData`, are recorded as instant events
+    """
+
+    def __init__(self):
+        super(TraceRecorder, self).__init__()
+        self.events = []
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    def _timestamp(self):
+        # trace-event timestamps are in microseconds
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def _event(self, phase, name, category, args=None):
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': phase,
+            'ts': self._timestamp(),
+            'pid': self._pid,
+            'tid': threading.get_ident()
+        }
+        if args:
+            event['args'] = args
+        if phase == 'i':
+            event['s'] = 't'
+        self.events.append(event)
+
+    def begin(self, name, category, **args):
+        self._event('B', name, category, args)
+
+    def end(self, name, category, **args):
+        self._event('E', name, category, args)
+
+    def instant(self, name, category, **args):
+        self._event('i', name, category, args)
+
+    def complete(self, name, category, start, **args):
+        """
+        Record a single event spanning from `start` (a timestamp returned by
+        `_timestamp()`) until now
+        """
+        self._event('X', name, category, args)
+        event = self.events[-1]
+        event['dur'] = event['ts'] - start
+        event['ts'] = start
+
+    @contextmanager
+    def span(self, name, category, **args):
+        self.begin(name, category, **args)
+        try:
+            yield
+        finally:
+            self.end(name, category)
+
+    def attach(self, graph):
+        """
+        Start recording events for every node in a graph.  This must be called
+        before the graph is compiled or processed
+        """
+        for key, node in graph.items():
+            self._wrap(key, node)
+        return graph
+
+    def _wrap(self, key, node):
+        recorder = self
+        name = key
+        cls = node.__class__.__name__
+        enqueue = node._enqueue
+        dequeue = node._dequeue
+        process = node._process
+        last_chunk = node._last_chunk
+
+        def _enqueue(data, pusher):
+            with recorder.span(name, 'enqueue', node=cls):
+                enqueue(data, pusher)
+
+        def _dequeue():
+            with recorder.span(name, 'dequeue', node=cls):
+                try:
+                    return dequeue()
+                except NotEnoughData:
+                    recorder.instant(name, 'stall', node=cls)
+                    raise
+
+        def _traced(generator, category):
+            chunk = 0
+            while True:
+                recorder.begin(name, category, node=cls, chunk=chunk)
+                try:
+                    d = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    recorder.end(name, category)
+                chunk += 1
+                yield d
+
+        async def _async_traced(generator, category):
+            # other coroutines may run on this thread while awaiting, so
+            # record complete events, rather than begin/end pairs, which would
+            # be improperly nested
+            chunk = 0
+            while True:
+                start = recorder._timestamp()
+                try:
+                    d = await generator.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    recorder.complete(
+                        name, category, start, node=cls, chunk=chunk)
+                chunk += 1
+                yield d
+
+        if node.is_async:
+            async def _process(data):
+                async for d in _async_traced(process(data), 'process'):
+                    yield d
+        else:
+            def _process(data):
+                for d in _traced(process(data), 'process'):
+                    yield d
+
+        def _last_chunk():
+            return _traced(
+                _iter_unwrapped(node, process, _process, last_chunk),
+                'last_chunk')
+
+        node._enqueue = _enqueue
+        node._dequeue = _dequeue
+        node._process = _process
+        node._last_chunk = _last_chunk
+
+    def to_dict(self):
+        return {'traceEvents': self.events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, flo):
+        json.dump(self.to_dict(), flo)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            self.dump(f)
@@ -1,5 +1,7 @@
 import time
 from collections import OrderedDict
+from queue import Queue, Full
+from threading import Thread, Event
 
 import requests
 
@@ -11,6 +13,92 @@ def chunked(f, chunksize=4096):
         data = f.read(chunksize)
 
 
+def chunked_into(f, chunksize=4096, allocate=bytearray):
+    """
+    Like `chunked`, but read each chunk directly into a freshly allocated,
+    mutable buffer using `f.readinto()`, avoiding the intermediate `bytes`
+    object, and copy.  Short reads are retried, so every chunk but the last is
+    exactly `chunksize` bytes long
+
+    Args:
+        f (file-like object): a file-like object implementing `readinto()`
+        chunksize (int): the size of each chunk, in bytes
+        allocate (callable): a callable taking a size in bytes, and returning
+            a new `bytearray` (or subclass) of that size
+    """
+    while True:
+        buf = allocate(chunksize)
+        view = memoryview(buf)
+        filled = 0
+        while filled < chunksize:
+            n = f.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+        view.release()
+
+        if not filled:
+            return
+
+        if filled < chunksize:
+            del buf[filled:]
+        yield buf
+
+
+def read_ahead(iterable, depth=4):
+    """
+    Iterate over `iterable` in a background thread, buffering up to `depth`
+    items in a bounded queue, so that producing the next item (e.g. reading
+    from disk or the network) overlaps with consuming the current one.
+
+    Exceptions raised while iterating are re-raised in the consuming thread.
+    If the consumer stops early, the background thread stops too, and closes
+    `iterable`, if it's a generator
+    """
+    items = Queue(maxsize=depth)
+    stop = Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    break
+        except BaseException as e:
+            put((done, e))
+            return
+        finally:
+            try:
+                iterator.close()
+            except AttributeError:
+                pass
+        put((done, None))
+
+    thread = Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
 def dictify(x, key_selector=lambda item: id(item)):
     if x is None:
         return OrderedDict()